@@ -1,24 +1,47 @@
 #!/usr/bin/env python3
+import asyncio
+import io
 import os
 import json
+import secrets
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Literal
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from pydantic import BaseModel, Field, field_validator
 
-from services.export_docx import export_docx
-from services.generate_pdf_from_html import html_to_pdf
+from services.template_registry import TemplateNotFound, registry as template_registry, render_html
+from services.exports import (
+    DOCX_MEDIA_TYPE, PDF_MEDIA_TYPE, export_filename, render_docx_async, render_pdf, render_pdf_batch,
+    render_priority,
+)
+from services.render_limiter import RenderQueueFull
+from services.input_limits import check_resume_data
+from services.preview_sections import preview_sessions
+from services.font_assets import FONTS_DIR, absolute_font_urls
+from services.browser_pool import RenderTimeout, shutdown_browser_pool
+from services.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, METRICS_ENABLED, METRICS_PUBLIC, METRICS_TOKEN, MetricsMiddleware, metrics,
+)
+from services.warmup import start_warmup
+from services.etags import cached_json, json_with_etag
+from services.artifact_store import ArtifactQuotaExceeded, artifact_store, owner_for
+from auth.auth import get_current_active_user, get_current_user_optional
+from auth.passwords import password_hasher
+from models.models import User
 from auth.routes_auth import router as auth_router
 from services.routes_resumes import router as resumes_router
 from services.routes_stripe import router as stripe_router
 from services.routes_fedapay import router as fedapay_router
 from services.routes_admin import router as admin_router
 from services.routes_templates_public import router as templates_public_router
+from services.routes_artifacts import router as artifacts_router
+from services.routes_exports import router as exports_router
+from services.export_jobs import EXPORT_MAX_BATCH, export_workers
 
 BASE_DIR = Path(__file__).parent.resolve()
 TEMPLATES_DIR = BASE_DIR / "templates"
@@ -34,6 +57,8 @@ app.include_router(stripe_router)
 app.include_router(fedapay_router)
 app.include_router(admin_router)
 app.include_router(templates_public_router)
+app.include_router(artifacts_router)
+app.include_router(exports_router)
 
 # === CORS ===
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:5000").split(",")
@@ -46,179 +71,238 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Curseur de GET /resumes/, version et ETag (If-Match) des CV
+    expose_headers=["X-Next-Cursor", "X-Resume-Version", "ETag"],
 )
 
+# === Metrics ===
+# Latence par route (gabarit de chemin), exposée avec les autres mesures sur /metrics
+app.add_middleware(MetricsMiddleware)
+
+# === Warm-up ===
+# Moteurs d'export, SDK de paiement et base sont chargés à la première
+# utilisation ; STARTUP_WARMUP les précharge (services/warmup.py)
+@app.on_event("startup")
+async def warm_up_dependencies():
+    await run_in_threadpool(start_warmup)
+
+# === PDF browser pool ===
+@app.on_event("shutdown")
+async def stop_browser_pool():
+    await run_in_threadpool(shutdown_browser_pool)
+
+# === Export artifacts ===
+@app.on_event("startup")
+def start_artifact_sweeper():
+    artifact_store.start_sweeper()
+
+@app.on_event("shutdown")
+def stop_artifact_sweeper():
+    artifact_store.stop_sweeper()
+
+# === Background export jobs ===
+# Leurs rendus passent par l'ordonnanceur, qui vit sur la boucle de l'application
+@app.on_event("startup")
+async def start_export_workers():
+    export_workers.start(loop=asyncio.get_running_loop())
+
+# Hors de la boucle : les workers y attendent la fin de leur rendu en cours
+@app.on_event("shutdown")
+async def stop_export_workers():
+    await run_in_threadpool(export_workers.stop)
+
+# === Password hashing ===
+# Workers de hachage démarrés à la première connexion (ou par STARTUP_WARMUP=auth)
+@app.on_event("shutdown")
+def stop_password_hasher():
+    password_hasher.shutdown()
+
 # === Static ===
-app.mount("/static", StaticFiles(directory=str(BASE_DIR)), name="static")
+# Seuls les jeux de données d'exemple sont publics (les exports passent par /artifacts)
+app.mount("/static/data", StaticFiles(directory=str(DATA_DIR)), name="static")
 app.mount("/uploads", StaticFiles(directory=str(UPLOADS_DIR)), name="uploads")
+# Polices vendorisées, référencées par les aperçus (FONTS_DELIVERY=link)
+app.mount("/fonts", StaticFiles(directory=str(FONTS_DIR), check_dir=False), name="fonts")
 
 # --- MODELS ---
 class PreviewRequest(BaseModel):
     template_name: str
     data: Dict[str, Any]
 
+    _check_data = field_validator("data")(check_resume_data)
+
+class PreviewSectionsRequest(PreviewRequest):
+    session_id: Optional[str] = None
+    revision: Optional[int] = None
+
 class ExportRequest(BaseModel):
     template_name: str
     data: Dict[str, Any]
     out: Optional[str] = None
 
+    _check_data = field_validator("data")(check_resume_data)
+
+class BatchExportRequest(BaseModel):
+    items: List[PreviewRequest] = Field(min_length=1, max_length=EXPORT_MAX_BATCH)
+    out: Optional[str] = None
+
 class GenerateRequest(BaseModel):
     prompt: Optional[str] = None
     data: Optional[Dict[str, Any]] = None
     role: Optional[str] = None
 
-# --- UTILS ---
-def load_template_env(template_name: str):
-    # Normalize to lowercase for folder lookup
-    template_folder = template_name.lower()
-    tpl_dir = TEMPLATES_DIR / template_folder
-    if not tpl_dir.exists():
-        raise HTTPException(status_code=404, detail=f"Template '{template_name}' introuvable")
-    return Environment(
-        loader=FileSystemLoader(str(tpl_dir)),
-        autoescape=select_autoescape(["html", "jinja2"])
-    )
-
-def render_html(template_name: str, data: Dict[str, Any]) -> str:
-    # Normalize template name to lowercase for folder lookup
-    template_folder = template_name.lower()
-    env = load_template_env(template_folder)
-    template_file = "template.jinja2"
-    template = env.get_template(template_file)
-
-    css_path = TEMPLATES_DIR / template_folder / "style.css"
-    css_content = css_path.read_text(encoding="utf-8") if css_path.exists() else ""
-
-    # Extract @import statements from CSS and convert to <link> tags
-    import re
-    font_links = []
-    css_without_imports = css_content
-    
-    # Find all @import url(...) statements
-    import_pattern = r"@import\s+url\(['\"]?([^'\"]+)['\"]?\);"
-    imports = re.findall(import_pattern, css_content)
-    for url in imports:
-        font_links.append(f'<link rel="stylesheet" href="{url}" />')
-    
-    # Remove @import statements from CSS
-    css_without_imports = re.sub(import_pattern, '', css_content)
-
-    # Load template metadata for rendering
-    template_json_path = TEMPLATES_DIR / template_folder / "template.json"
-    template_metadata = {}
-    if template_json_path.exists():
-        import json
-        template_metadata = json.loads(template_json_path.read_text(encoding="utf-8"))
-
-    html_body = template.render(data=data, template=template_metadata)
-    font_links_html = '\n  '.join(font_links)
-    html_full = f"""<!DOCTYPE html>
-<html lang="fr">
-<head>
-  <meta charset="UTF-8" />
-  <title>CV Preview</title>
-  {font_links_html}
-  <style>{css_without_imports}</style>
-</head>
-<body>
-{html_body}
-</body>
-</html>"""
-    return html_full
-
 # === ROUTES ===
 
-# Liste des modèles disponibles
+# Liste des modèles disponibles (ETag : 304 si la liste n'a pas changé)
 @app.get("/templates")
-def list_templates():
-    templates = []
-    for d in TEMPLATES_DIR.iterdir():
-        if d.is_dir() and (d / "template.json").exists():
-            templates.append(d.name)
-    return {"templates": templates}
-
-# Récupère le JSON d’un modèle
+def list_templates(request: Request):
+    body, etag = json_with_etag({"templates": template_registry.names()})
+    return cached_json(request, body, etag, "templates")
+
+# Récupère le JSON d’un modèle, sérialisé une fois par compilation
 @app.get("/templates/{name}")
-def get_template(name: str):
-    tpl_dir = TEMPLATES_DIR / name
-    json_file = tpl_dir / "template.json"
-    if not json_file.exists():
+def get_template(name: str, request: Request):
+    try:
+        compiled = template_registry.get(name)
+    except TemplateNotFound:
         raise HTTPException(status_code=404, detail=f"Template '{name}' not found")
-    return JSONResponse(json.loads(json_file.read_text(encoding="utf-8")))
+    body, etag = compiled.metadata_json()
+    return cached_json(request, body, etag, "template")
 
 @app.post("/preview/html")
-def preview_html(req: PreviewRequest):
+def preview_html(req: PreviewRequest, request: Request):
     try:
         html = render_html(req.template_name, req.data)
-        return {"html": html}
+        return {"html": absolute_font_urls(html, str(request.base_url))}
     except Exception as e:
         import traceback
         error_detail = f"{str(e)}\n{traceback.format_exc()}"
         print(f"Preview error: {error_detail}")
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.post("/export/pdf")
-def export_pdf(req: ExportRequest):
-    import uuid
-    import re
-    
+@app.post("/preview/sections")
+def preview_sections(req: PreviewSectionsRequest, request: Request):
+    # Aperçu incrémental : seules les sections dont les données ont changé sont rendues
     try:
-        # Générer un ID unique pour cette requête
-        request_id = str(uuid.uuid4())
-        
-        # Rendre le HTML
-        html = render_html(req.template_name, req.data)
-        
-        # Fichier HTML temp unique
-        tmp_html = BASE_DIR / f"_tmp_render_{request_id}.html"
-        tmp_html.write_text(html, encoding="utf-8")
+        preview = preview_sessions.render(req.template_name, req.data, req.session_id, req.revision)
+        if preview["full"]:
+            preview["html"] = absolute_font_urls(preview["html"], str(request.base_url))
+        return preview
+    except TemplateNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        print(f"Preview sections error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Toujours générer un nom de fichier unique (ignorer req.out pour la sécurité)
-        # Cela empêche les collisions et les fuites de données entre utilisateurs
-        safe_filename = f"CV_{request_id}.pdf"
-        
-        # Construire le chemin de sortie sécurisé (toujours dans BASE_DIR)
-        out_pdf = BASE_DIR / safe_filename
-        
-        # Générer le PDF
-        html_to_pdf(tmp_html, out_pdf)
-        
-        # Nettoyer le fichier temp
-        tmp_html.unlink(missing_ok=True)
+def export_response(content: bytes, media_type: str, filename: str, download: bool) -> StreamingResponse:
+    disposition = "attachment" if download else "inline"
+    return StreamingResponse(
+        io.BytesIO(content),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'{disposition}; filename="{filename}"',
+            "Content-Length": str(len(content)),
+        },
+    )
 
-        url = f"/static/{out_pdf.name}" if out_pdf.exists() else None
-        return {"file": str(out_pdf), "url": url}
+def export_link(content: bytes, filename: str, owner: str) -> Dict[str, Any]:
+    # Mode "link" : l'export est stocké et servi par une URL signée de courte durée
+    try:
+        artifact = artifact_store.put(owner, content, filename.rsplit(".", 1)[-1])
+    except ArtifactQuotaExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    url, expires = artifact_store.signed_url(artifact, filename)
+    return {"file": filename, "url": url, "expires_at": expires}
+
+def requester(request: Request, current_user: Optional[User]):
+    # Formule et identité du demandeur, pour l'ordonnanceur de rendus
+    return render_priority(current_user, request.client.host if request.client else None)
+
+def export_result(content: bytes, media_type: str, filename: str, download: bool,
+                  delivery: str, request: Request, current_user: Optional[User]):
+    if delivery == "link":
+        owner = owner_for(current_user.id if current_user else None, request.client.host if request.client else None)
+        return export_link(content, filename, owner)
+    return export_response(content, media_type, filename, download)
+
+@app.post("/export/pdf")
+async def export_pdf(
+    req: ExportRequest,
+    request: Request,
+    download: bool = False,
+    delivery: Literal["stream", "link"] = "stream",
+    current_user: Optional[User] = Depends(get_current_user_optional),
+):
+    try:
+        # Concurrence bornée, sans bloquer le threadpool ; un cache hit évite Chromium
+        pdf_bytes = await render_pdf(req.template_name, req.data, *requester(request, current_user))
+    except RenderQueueFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail="PDF renderer is busy, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except RenderTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         import traceback
         error_detail = f"{str(e)}\n{traceback.format_exc()}"
         print(f"PDF export error: {error_detail}")
-        # Nettoyer en cas d'erreur
-        if 'tmp_html' in locals():
-            tmp_html.unlink(missing_ok=True)
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.post("/export/docx")
-def export_docx_endpoint(req: ExportRequest):
-    import uuid
+    filename = export_filename(req.out, "pdf")
+    return export_result(pdf_bytes, PDF_MEDIA_TYPE, filename, download, delivery, request, current_user)
+
+@app.post("/export/pdf/batch")
+async def export_pdf_batch(
+    req: BatchExportRequest,
+    request: Request,
+    download: bool = False,
+    delivery: Literal["stream", "link"] = "stream",
+    current_user: User = Depends(get_current_active_user),
+):
     try:
-        # Generate unique filename to prevent path traversal
-        request_id = str(uuid.uuid4())
-        safe_filename = f"CV_{request_id}.docx"
-        out_path = BASE_DIR / safe_filename
-        
-        tmp_json = BASE_DIR / f"_tmp_data_{request_id}.json"
-        tmp_json.write_text(json.dumps(req.data, ensure_ascii=False, indent=2), encoding="utf-8")
+        # Un seul emprunt au pool pour tout le lot, un CV par page
+        pdf_bytes = await render_pdf_batch(
+            [(item.template_name, item.data) for item in req.items], *requester(request, current_user)
+        )
+    except RenderQueueFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail="PDF renderer is busy, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except RenderTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        print(f"PDF batch export error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
 
-        export_docx(tmp_json, out_path)
-        tmp_json.unlink(missing_ok=True)
+    filename = export_filename(req.out or "CVs", "pdf")
+    return export_result(pdf_bytes, PDF_MEDIA_TYPE, filename, download, delivery, request, current_user)
 
-        url = f"/static/{out_path.name}" if out_path.exists() else None
-        return {"file": str(out_path), "url": url}
+@app.post("/export/docx")
+async def export_docx_endpoint(
+    req: ExportRequest,
+    request: Request,
+    download: bool = False,
+    delivery: Literal["stream", "link"] = "stream",
+    current_user: Optional[User] = Depends(get_current_user_optional),
+):
+    try:
+        docx_bytes = await render_docx_async(req.data, *requester(request, current_user))
+    except RenderQueueFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail="DOCX renderer is busy, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
-        if 'tmp_json' in locals():
-            tmp_json.unlink(missing_ok=True)
         raise HTTPException(status_code=400, detail=str(e))
 
+    filename = export_filename(req.out, "docx")
+    return export_result(docx_bytes, DOCX_MEDIA_TYPE, filename, download, delivery, request, current_user)
+
 @app.post("/generate")
 async def generate_content(req: GenerateRequest):
     """
@@ -241,7 +325,12 @@ async def generate_content(req: GenerateRequest):
         
         # Utiliser l'API gratuite de Hugging Face avec le token
         hf_token = os.getenv("HF_TOKEN")
-        client = InferenceClient(token=hf_token) if hf_token else InferenceClient()
+        # HF_API_BASE : point d'accès compatible OpenAI (ex. le faux Hugging Face de loadtest/)
+        hf_base = os.getenv("HF_API_BASE")
+        if hf_base:
+            client = InferenceClient(base_url=hf_base, token=hf_token)
+        else:
+            client = InferenceClient(token=hf_token) if hf_token else InferenceClient()
         
         # Construire le prompt basé sur les données existantes
         user_description = req.prompt or f"Poste: {req.role or 'Candidat professionnel'}"
@@ -351,3 +440,15 @@ def root():
 @app.get("/healthz")
 def healthz():
     return JSONResponse({"status": "ok"})
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint(request: Request):
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # Latences, files et compteurs d'authentification : jamais publics par défaut
+    if not METRICS_TOKEN:
+        if not METRICS_PUBLIC:
+            raise HTTPException(status_code=403, detail="Metrics require METRICS_TOKEN (or METRICS_PUBLIC=1)")
+    elif not secrets.compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.exposition(), media_type=METRICS_CONTENT_TYPE)
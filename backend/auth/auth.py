@@ -1,14 +1,15 @@
 #!/usr/bin/env python3
 import os
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from database.database import get_db
-from models.models import User
+from auth.passwords import crypt_context
+from auth.user_cache import user_cache
+from database.database import get_session, run_db
+from models.models import SubscriptionPlan, User
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 if not SECRET_KEY:
@@ -17,49 +18,136 @@ if not SECRET_KEY:
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+# Colonnes gardées en cache (jamais le mot de passe haché)
+_CACHED_COLUMNS = [column.name for column in User.__table__.columns if column.name != "hashed_password"]
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
+# Versions synchrones (scripts) ; les routes passent par auth.passwords.password_hasher
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return crypt_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return crypt_context().hash(password)
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
+    from jose import jwt
+
     to_encode = data.copy()
     # Ensure subject claim exists for compatibility with get_current_user
     if "sub" not in to_encode and "email" in to_encode:
         to_encode["sub"] = to_encode["email"]
     expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": int(expire.timestamp())})
+    to_encode.update({"exp": int(expire.timestamp()), "iat": int(time.time())})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def user_claims(user: User) -> Dict[str, Any]:
+    """Claims signées qui permettent d'authentifier `user` sans requête (auth/user_cache.py)."""
+    plan = getattr(user.subscription_plan, "value", user.subscription_plan) or SubscriptionPlan.FREE.value
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "plan": plan,
+        "adm": bool(user.is_admin),
+        "act": user.is_active is not False,
+    }
+
+def create_user_token(user: User, expires_delta: Optional[timedelta] = None) -> str:
+    return create_access_token(user_claims(user), expires_delta)
+
+def invalidate_user(email: str) -> None:
+    """À appeler après toute modification d'un utilisateur (formule, drapeaux, client Stripe)."""
+    user_cache.invalidate(email)
+
+def _snapshot(user: User) -> Dict[str, Any]:
+    return {name: getattr(user, name) for name in _CACHED_COLUMNS}
+
+def _user_from_claims(payload: Dict[str, Any]) -> Optional[User]:
+    if not all(claim in payload for claim in ("uid", "plan", "adm", "act")):
+        return None  # jeton émis avant l'ajout des claims
+    if not user_cache.claims_usable(payload["sub"], payload.get("iat")):
+        return None
+    try:
+        plan = SubscriptionPlan(payload["plan"])
+    except ValueError:
+        return None
+    # Utilisateur transitoire : seules les colonnes portées par le jeton sont renseignées
+    return User(id=payload["uid"], email=payload["sub"], subscription_plan=plan,
+                is_admin=bool(payload["adm"]), is_active=bool(payload["act"]))
+
+def user_by_email(db: Session, email: str) -> Optional[User]:
+    return db.query(User).filter(User.email == email).first()
+
+def _token_payload(token: str) -> Dict[str, Any]:
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: Optional[str] = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
 
-    user = db.query(User).filter(User.email == email).first()
+async def _load_user(db, email: str) -> User:
+    # Hors de la boucle d'événements : threadpool ou moteur async (database/database.py)
+    user = await run_db(db, user_by_email, email)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    user_cache.put(email, _snapshot(user))
+    user_cache.count("db")
     return user
 
+async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_session)) -> User:
+    """Utilisateur du jeton, depuis ses claims ou le cache quand c'est possible.
+
+    L'objet renvoyé peut être transitoire (hors session) et ne porter que l'id,
+    l'email, la formule et les drapeaux : les routes qui modifient l'utilisateur
+    ou lisent d'autres colonnes prennent `get_current_db_user`.
+    """
+    payload = _token_payload(token)
+    email = payload["sub"]
+    user = _user_from_claims(payload)
+    if user is not None:
+        user_cache.count("claims")
+        return user
+    snapshot = user_cache.get(email)
+    if snapshot is not None:
+        user_cache.count("cache")
+        return User(**snapshot)
+    return await _load_user(db, email)
+
+async def get_current_db_user(token: str = Depends(oauth2_scheme), db=Depends(get_session)) -> User:
+    """Utilisateur du jeton relu en base, attaché à la session de la requête."""
+    return await _load_user(db, _token_payload(token)["sub"])
+
+async def get_current_user_optional(
+    token: Optional[str] = Depends(oauth2_scheme_optional), db=Depends(get_session)
+) -> Optional[User]:
+    if not token:
+        return None
+    try:
+        return await get_current_user(token, db)
+    except HTTPException:
+        return None
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     if not getattr(current_user, "is_active", True):
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+async def get_current_active_db_user(current_user: User = Depends(get_current_db_user)) -> User:
+    return await get_current_active_user(current_user)
+
 def check_quota(user: User, resume_count: int) -> bool:
     plan = getattr(user, "subscription_plan", None)
     plan_value = getattr(plan, "value", str(plan)).lower() if plan is not None else "free"
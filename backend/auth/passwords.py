@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Hachage des mots de passe (bcrypt) dans un exécuteur dédié et borné.
+
+bcrypt coûte volontairement des dizaines de millisecondes de CPU : une vague
+de connexions traitée dans le threadpool de FastAPI ralentirait toutes les
+routes. /auth/login et /auth/register passent donc par `password_hasher` :
+  - exécuteur "process" (défaut) : pool de processus, les hachages tournent
+    en parallèle sur plusieurs cœurs sans toucher au threadpool ni au GIL ;
+  - exécuteur "thread" : pool de threads dédié (pas de processus en plus).
+Au plus PASSWORD_HASH_WORKERS calculs tournent en même temps. Au-delà de
+PASSWORD_HASH_MAX_QUEUED demandes en attente, PasswordHashBusy est levée
+(503 avec Retry-After), comme pour les files de rendu.
+
+Le coût est PASSWORD_BCRYPT_ROUNDS : un hash d'un autre coût (ou d'un schéma
+déprécié) est recalculé à la connexion réussie suivante (`verify_and_update`).
+
+Ce module est importé par les processus de hachage : il ne dépend ni de la
+base ni de l'application.
+
+Configuration (variables d'environnement) :
+  PASSWORD_HASH_EXECUTOR    process | thread (défaut process)
+  PASSWORD_HASH_WORKERS     hachages simultanés (défaut : nombre de cœurs, 4 au plus)
+  PASSWORD_HASH_MAX_QUEUED  demandes en attente au-delà des workers (défaut 64)
+  PASSWORD_BCRYPT_ROUNDS    coût bcrypt (défaut 12)
+"""
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from services.metrics import metrics
+
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "process")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUED = int(os.getenv("PASSWORD_HASH_MAX_QUEUED", "64"))
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+
+hash_seconds = metrics.histogram(
+    "cvtor_password_hash_seconds", "CPU time of password hashing operations", ["operation"]
+)
+hash_wait_seconds = metrics.histogram(
+    "cvtor_password_hash_wait_seconds", "Time spent queued before a hashing worker was free", ["operation"]
+)
+hash_rejected = metrics.counter(
+    "cvtor_password_hash_rejected", "Hashing requests rejected because the queue was full", ["operation"]
+)
+
+
+class PasswordHashBusy(Exception):
+    """Trop de hachages en attente ; réessayer après `retry_after` secondes."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Password hashing queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+@lru_cache(maxsize=1)
+def crypt_context():
+    # min = max = défaut : tout hash d'un autre coût est signalé pour re-hachage
+    from passlib.context import CryptContext
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=PASSWORD_BCRYPT_ROUNDS,
+        bcrypt__min_rounds=PASSWORD_BCRYPT_ROUNDS,
+        bcrypt__max_rounds=PASSWORD_BCRYPT_ROUNDS,
+    )
+
+
+# --- Exécutées dans les workers (fonctions de module : sérialisables) ---
+def _hash(password: str) -> str:
+    return crypt_context().hash(password)
+
+
+def _verify_and_update(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    try:
+        return crypt_context().verify_and_update(password, hashed)
+    except ValueError:
+        # Hash illisible (colonne corrompue ou schéma inconnu) : échec d'authentification
+        return False, None
+
+
+def _warm() -> None:
+    crypt_context().hash("warm-up")
+
+
+def _timed(fn: Callable[..., Any], *args: Any) -> Tuple[float, Any]:
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+class PasswordHasher:
+    def __init__(self, kind: str = PASSWORD_HASH_EXECUTOR, workers: int = PASSWORD_HASH_WORKERS,
+                 max_queued: int = PASSWORD_HASH_MAX_QUEUED):
+        self.kind = kind if kind in ("process", "thread") else "process"
+        self.workers = max(1, workers)
+        self.max_queued = max(0, max_queued)
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._avg_seconds = 0.25  # estimation initiale pour Retry-After, affinée à chaque calcul
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    # spawn : pas de fork d'un processus qui a déjà des threads (uvicorn, pool PDF)
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            return self._executor
+
+    def _reset_executor(self, broken: Executor) -> None:
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self._inflight * self._avg_seconds / self.workers))
+
+    async def _run(self, operation: str, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._inflight >= self.workers + self.max_queued:
+                retry_after = self._retry_after()
+                hash_rejected.inc(operation=operation)
+                raise PasswordHashBusy(retry_after)
+            self._inflight += 1
+        submitted = time.perf_counter()
+        try:
+            executor = self._get_executor()
+            try:
+                seconds, result = await asyncio.wrap_future(executor.submit(_timed, fn, *args))
+            except BrokenProcessPool:
+                # Un worker est mort (OOM...) : nouveau pool pour les demandes suivantes
+                self._reset_executor(executor)
+                raise
+        finally:
+            with self._lock:
+                self._inflight -= 1
+        hash_seconds.observe(seconds, operation=operation)
+        hash_wait_seconds.observe(max(0.0, time.perf_counter() - submitted - seconds), operation=operation)
+        self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * seconds
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(mot de passe correct, nouveau hash si le coût ou le schéma a changé, sinon None)."""
+        return await self._run("verify", _verify_and_update, password, hashed)
+
+    def start(self) -> None:
+        """Démarre les workers et charge passlib/bcrypt dans chacun (préchargement au démarrage)."""
+        executor = self._get_executor()
+        for future in [executor.submit(_warm) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "max_queued": self.max_queued,
+                "inflight": self._inflight,
+                "queued": max(0, self._inflight - self.workers),
+                "bcrypt_rounds": PASSWORD_BCRYPT_ROUNDS,
+            }
+
+
+password_hasher = PasswordHasher()
+
+
+@metrics.collector
+def _hasher_metrics():
+    stats = password_hasher.stats()
+    return [
+        ("cvtor_password_hash_inflight", "gauge", "Hashing requests running or queued",
+         [("cvtor_password_hash_inflight", {}, stats["inflight"])]),
+        ("cvtor_password_hash_queued", "gauge", "Hashing requests waiting for a worker",
+         [("cvtor_password_hash_queued", {}, stats["queued"])]),
+    ]
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Limitation des tentatives de connexion et d'inscription.
+
+Chaque tentative coûte un hachage bcrypt (auth/passwords.py) : sans limite,
+une attaque par force brute occuperait toute la capacité de hachage. Les
+tentatives sont comptées sur une fenêtre glissante, avant tout hachage :
+  - par adresse IP du client (login et register) ;
+  - par email (login) ; une connexion réussie remet ce compteur à zéro.
+Au-delà, la route répond 429 avec Retry-After. Compteurs en mémoire,
+propres au processus, bornés en nombre de clés.
+
+Configuration (variables d'environnement) :
+  LOGIN_RATE_WINDOW             fenêtre en secondes (défaut 300)
+  LOGIN_MAX_ATTEMPTS_PER_IP     tentatives de connexion par IP et par fenêtre (défaut 30)
+  LOGIN_MAX_ATTEMPTS_PER_EMAIL  tentatives de connexion par email et par fenêtre (défaut 10)
+  REGISTER_MAX_PER_IP           inscriptions par IP et par fenêtre (défaut 10)
+  0 désactive la limite correspondante.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, Optional, Tuple
+
+from services.metrics import metrics
+
+LOGIN_RATE_WINDOW = float(os.getenv("LOGIN_RATE_WINDOW", "300"))
+LOGIN_MAX_ATTEMPTS_PER_IP = int(os.getenv("LOGIN_MAX_ATTEMPTS_PER_IP", "30"))
+LOGIN_MAX_ATTEMPTS_PER_EMAIL = int(os.getenv("LOGIN_MAX_ATTEMPTS_PER_EMAIL", "10"))
+REGISTER_MAX_PER_IP = int(os.getenv("REGISTER_MAX_PER_IP", "10"))
+
+# Nombre maximum de clés suivies (les plus anciennes sont oubliées)
+MAX_KEYS = 100_000
+
+Key = Tuple[str, str]
+
+rate_limited = metrics.counter(
+    "cvtor_auth_rate_limited", "Authentication attempts refused by the rate limiter", ["action", "scope"]
+)
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many attempts, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class SlidingWindowLimiter:
+    def __init__(self, window: float = LOGIN_RATE_WINDOW, max_keys: int = MAX_KEYS):
+        self.window = window
+        self.max_keys = max_keys
+        self._hits: "OrderedDict[Key, Deque[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, key: Key, now: float) -> Deque[float]:
+        hits = self._hits.get(key)
+        if hits is None:
+            return deque()
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        return hits
+
+    def hit(self, action: str, limits: Iterable[Tuple[Key, int]]) -> None:
+        """Compte une tentative pour chaque clé, ou lève RateLimited si l'une a atteint sa limite."""
+        limits = [(key, limit) for key, limit in limits if limit > 0]
+        now = time.monotonic()
+        with self._lock:
+            for key, limit in limits:
+                hits = self._recent(key, now)
+                if len(hits) >= limit:
+                    rate_limited.inc(action=action, scope=key[0])
+                    raise RateLimited(max(1, math.ceil(hits[0] + self.window - now)))
+            for key, _ in limits:
+                hits = self._hits.setdefault(key, deque())
+                hits.append(now)
+                self._hits.move_to_end(key)
+            while len(self._hits) > self.max_keys:
+                self._hits.popitem(last=False)
+
+    def reset(self, key: Key) -> None:
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"keys": len(self._hits)}
+
+
+auth_limiter = SlidingWindowLimiter()
+
+
+def _client(client_host: Optional[str]) -> str:
+    return client_host or "unknown"
+
+
+def check_login(client_host: Optional[str], email: str) -> None:
+    auth_limiter.hit("login", [
+        (("login-ip", _client(client_host)), LOGIN_MAX_ATTEMPTS_PER_IP),
+        (("login-email", email.strip().lower()), LOGIN_MAX_ATTEMPTS_PER_EMAIL),
+    ])
+
+
+def login_succeeded(email: str) -> None:
+    auth_limiter.reset(("login-email", email.strip().lower()))
+
+
+def check_register(client_host: Optional[str]) -> None:
+    auth_limiter.hit("register", [(("register-ip", _client(client_host)), REGISTER_MAX_PER_IP)])
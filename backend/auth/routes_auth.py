@@ -1,21 +1,23 @@
 #!/usr/bin/env python3
 from datetime import timedelta
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 
-from database.database import get_db
+from database.database import get_db, get_session, run_db
 from models.models import User, Resume, SubscriptionPlan
 from auth.auth import (
-    get_password_hash,
-    verify_password,
-    create_access_token,
-    get_current_active_user,
+    create_user_token,
+    get_current_active_db_user,
+    user_by_email,
     check_quota,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from auth.passwords import PasswordHashBusy, password_hasher
+from auth.rate_limit import RateLimited, check_login, check_register, login_succeeded
 import json
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -40,16 +42,26 @@ class Token(BaseModel):
     token_type: str
     user: UserResponse
 
-@router.post("/register", response_model=Token)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
+def _token_response(user: User) -> Dict[str, Any]:
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_user_token(user, expires_delta=access_token_expires)
     
-    hashed_password = get_password_hash(user_data.password)
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "user": {
+            "id": user.id,
+            "email": user.email,
+            "full_name": user.full_name,
+            "subscription_plan": user.subscription_plan.value,
+            "created_at": str(user.created_at)
+        }
+    }
+
+def _busy(e: Exception, status_code: int, detail: str) -> HTTPException:
+    return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(e.retry_after)})
+
+def _create_user(db: Session, user_data: UserCreate, hashed_password: str) -> Optional[User]:
     new_user = User(
         email=user_data.email,
         hashed_password=hashed_password,
@@ -57,55 +69,78 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
         subscription_plan=SubscriptionPlan.FREE
     )
     db.add(new_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Inscription concurrente avec le même email
+        db.rollback()
+        return None
     db.refresh(new_user)
+    return new_user
+
+def _save_password_hash(db: Session, user: User, hashed_password: str) -> None:
+    user.hashed_password = hashed_password
+    db.commit()
+
+# bcrypt tourne dans auth/passwords.py, les requêtes via run_db : la boucle
+# et le threadpool restent libres pendant une vague de connexions
+@router.post("/register", response_model=Token)
+async def register(user_data: UserCreate, request: Request, db=Depends(get_session)):
+    try:
+        check_register(request.client.host if request.client else None)
+    except RateLimited as e:
+        raise _busy(e, status.HTTP_429_TOO_MANY_REQUESTS, "Too many registrations, please retry later")
+
+    if await run_db(db, user_by_email, user_data.email) is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": new_user.email}, expires_delta=access_token_expires
-    )
+    try:
+        hashed_password = await password_hasher.hash(user_data.password)
+    except PasswordHashBusy as e:
+        raise _busy(e, status.HTTP_503_SERVICE_UNAVAILABLE, "Authentication is busy, please retry shortly")
+    new_user = await run_db(db, _create_user, user_data, hashed_password)
+    if new_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": {
-            "id": new_user.id,
-            "email": new_user.email,
-            "full_name": new_user.full_name,
-            "subscription_plan": new_user.subscription_plan.value,
-            "created_at": str(new_user.created_at)
-        }
-    }
+    return _token_response(new_user)
 
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db=Depends(get_session)):
+    try:
+        # Avant tout hachage : la force brute ne doit pas consommer la capacité bcrypt
+        check_login(request.client.host if request.client else None, form_data.username)
+    except RateLimited as e:
+        raise _busy(e, status.HTTP_429_TOO_MANY_REQUESTS, "Too many login attempts, please retry later")
+
+    user = await run_db(db, user_by_email, form_data.username)
+    verified, new_hash = False, None
+    if user is not None:
+        try:
+            verified, new_hash = await password_hasher.verify_and_update(form_data.password, user.hashed_password)
+        except PasswordHashBusy as e:
+            raise _busy(e, status.HTTP_503_SERVICE_UNAVAILABLE, "Authentication is busy, please retry shortly")
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
+    login_succeeded(form_data.username)
+    if new_hash is not None:
+        # Coût bcrypt (PASSWORD_BCRYPT_ROUNDS) ou schéma changé : hash recalculé
+        await run_db(db, _save_password_hash, user, new_hash)
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": {
-            "id": user.id,
-            "email": user.email,
-            "full_name": user.full_name,
-            "subscription_plan": user.subscription_plan.value,
-            "created_at": str(user.created_at)
-        }
-    }
+    return _token_response(user)
 
 @router.get("/me", response_model=UserResponse)
-def get_me(current_user: User = Depends(get_current_active_user)):
+def get_me(current_user: User = Depends(get_current_active_db_user)):
     return {
         "id": current_user.id,
         "email": current_user.email,
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Cache de l'utilisateur authentifié, pour éviter une requête SQL par appel.
+
+get_current_user (auth/auth.py) résout l'utilisateur dans cet ordre :
+  - claims du JWT : create_access_token y signe l'id, la formule et les
+    drapeaux admin/actif. Elles suffisent tant que le jeton a moins de
+    AUTH_CLAIMS_MAX_AGE secondes et que l'utilisateur n'a pas été modifié
+    depuis son émission ;
+  - ce cache : LRU borné des colonnes de l'utilisateur (sans le mot de passe
+    haché), clé = claim "sub", entrées valables AUTH_USER_CACHE_TTL secondes ;
+  - la base, dont le résultat alimente le cache.
+
+Toute modification d'un utilisateur (webhooks Stripe/FedaPay, client Stripe,
+désactivation) appelle `invalidate(email)` : l'entrée est retirée et les claims
+des jetons émis avant la modification ne sont plus utilisées. Cache et
+invalidations sont propres au processus : avec plusieurs workers, une
+modification faite ailleurs est vue au plus tard après AUTH_USER_CACHE_TTL
+(cache) ou AUTH_CLAIMS_MAX_AGE (claims).
+
+Configuration (variables d'environnement) :
+  AUTH_USER_CACHE_TTL   durée de vie d'une entrée en secondes (défaut 60, 0 = pas de cache)
+  AUTH_USER_CACHE_SIZE  nombre maximum d'utilisateurs en cache (défaut 10000)
+  AUTH_CLAIMS_MAX_AGE   âge maximum (secondes) d'un jeton dont les claims sont
+                        utilisées sans requête (défaut 300, 0 = toujours vérifier)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from services.metrics import metrics
+
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+AUTH_CLAIMS_MAX_AGE = float(os.getenv("AUTH_CLAIMS_MAX_AGE", "300"))
+
+SOURCES = ("claims", "cache", "db")
+
+
+class UserCache:
+    def __init__(self, ttl: float = AUTH_USER_CACHE_TTL, max_entries: int = AUTH_USER_CACHE_SIZE,
+                 claims_max_age: float = AUTH_CLAIMS_MAX_AGE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.claims_max_age = claims_max_age
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Dernière modification connue par utilisateur (horloge murale, comparée au claim iat)
+        self._changed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._counters = {source: 0 for source in SOURCES}
+
+    def get(self, sub: str) -> Optional[Dict[str, Any]]:
+        if self.ttl <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(sub)
+            if entry is None:
+                return None
+            expires_at, snapshot = entry
+            if expires_at <= now:
+                del self._entries[sub]
+                return None
+            self._entries.move_to_end(sub)
+            return snapshot
+
+    def put(self, sub: str, snapshot: Dict[str, Any]) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[sub] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(sub)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, sub: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._entries.pop(sub, None)
+            self._changed[sub] = now
+            # Au-delà de AUTH_CLAIMS_MAX_AGE les claims sont ignorées de toute façon
+            horizon = now - self.claims_max_age
+            for key in [key for key, changed in self._changed.items() if changed < horizon]:
+                del self._changed[key]
+
+    def claims_usable(self, sub: str, issued_at: Optional[float]) -> bool:
+        """Les claims d'un jeton émis à `issued_at` reflètent-elles encore l'utilisateur ?"""
+        if issued_at is None or self.claims_max_age <= 0:
+            return False
+        if time.time() - issued_at > self.claims_max_age:
+            return False
+        with self._lock:
+            changed = self._changed.get(sub)
+        # iat est à la seconde : une modification dans la même seconde invalide aussi
+        return changed is None or changed < issued_at
+
+    def count(self, source: str) -> None:
+        with self._lock:
+            self._counters[source] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._changed.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "claims_max_age": self.claims_max_age,
+                "resolutions": dict(self._counters),
+            }
+
+
+user_cache = UserCache()
+
+
+@metrics.collector
+def _user_cache_metrics():
+    stats = user_cache.stats()
+    return [
+        ("cvtor_auth_user_resolutions", "counter", "Authenticated user resolutions by source",
+         [("cvtor_auth_user_resolutions_total", {"source": source}, count)
+          for source, count in stats["resolutions"].items()]),
+        ("cvtor_auth_user_cache_entries", "gauge", "Users held by the authentication cache",
+         [("cvtor_auth_user_cache_entries", {}, stats["entries"])]),
+    ]
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Compare deux fichiers de résultats de benchmarks/run.py.
+
+Affiche, pour chaque mesure présente des deux côtés, l'évolution du p50,
+du p95 et du débit. Une mesure dont le p95 se dégrade de plus de
+--threshold % est signalée comme régression (code de sortie 1).
+
+Usage (depuis backend/) :
+  python -m benchmarks.compare benchmarks/results/avant.json benchmarks/results/apres.json
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+
+def _index(results: Dict[str, Any]) -> Dict[Tuple, Dict[str, Any]]:
+    rows = {}
+    for row in results.get("cases", []):
+        rows[("cases", row["path"], row["op"], f"{row['template']}/{row['resume']}")] = row
+    for row in results.get("sweep", []):
+        rows[("sweep", row["path"], row["op"], f"x{row['concurrency']}")] = row
+    return rows
+
+
+def _delta(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare deux résultats de benchmarks")
+    ap.add_argument("before")
+    ap.add_argument("after")
+    ap.add_argument("--threshold", type=float, default=10.0, help="Dégradation du p95 tolérée en %% (défaut 10)")
+    args = ap.parse_args()
+
+    before = json.loads(Path(args.before).read_text(encoding="utf-8"))
+    after = json.loads(Path(args.after).read_text(encoding="utf-8"))
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+
+    old, new = _index(before), _index(after)
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        a, b = old[key], new[key]
+        p95 = _delta(a["p95_ms"], b["p95_ms"])
+        flag = ""
+        if p95 > args.threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(
+            f"  {' '.join(key):<56} p50 {a['p50_ms']:>9.2f} -> {b['p50_ms']:>9.2f} ({_delta(a['p50_ms'], b['p50_ms']):+6.1f}%)  "
+            f"p95 {a['p95_ms']:>9.2f} -> {b['p95_ms']:>9.2f} ({p95:+6.1f}%)  "
+            f"débit {_delta(a['throughput_per_s'], b['throughput_per_s']):+6.1f}%{flag}"
+        )
+    missing = len(old.keys() ^ new.keys())
+    if missing:
+        print(f"[Benchmarks] {missing} measurement(s) present in only one file")
+    print(f"[Benchmarks] {regressions} regression(s) above {args.threshold:g}% on p95")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
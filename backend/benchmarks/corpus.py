@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Jeux de données des benchmarks : les CV d'exemple de data/ et des CV
+synthétiques (small, typical, huge) générés de façon déterministe.
+
+Les photos distantes sont retirées par défaut pour que les mesures ne
+dépendent pas du réseau (voir --network dans benchmarks/run.py).
+"""
+import copy
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+SEED = 20240601
+
+WORDS = (
+    "gestion projet équipe client développement application architecture données "
+    "performance qualité livraison analyse conception mise production suivi budget "
+    "amélioration processus automatisation déploiement formation support sécurité "
+    "migration intégration tests revue documentation planification coordination"
+).split()
+
+SIZES = {
+    # (expériences, tâches par expérience, formations, groupes de compétences, phrases du résumé)
+    "small": (1, 2, 1, 1, 1),
+    "typical": (3, 4, 2, 3, 3),
+    "huge": (40, 10, 10, 12, 60),
+}
+
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def synthetic_resume(size: str, seed: int = SEED) -> Dict[str, Any]:
+    """CV factice de taille `size` ; toujours identique pour une même graine."""
+    experiences, tasks, educations, groups, sentences = SIZES[size]
+    rng = random.Random(f"{seed}-{size}")
+    return {
+        "profile": {
+            "name": "Camille Bench",
+            "title": "Ingénieure logiciel",
+            "email": "camille.bench@example.com",
+            "phone": "+33 6 00 00 00 00",
+            "location": "Lyon, France",
+            "linkedin": "linkedin.com/in/camille-bench",
+        },
+        "summary": " ".join(_sentence(rng) for _ in range(sentences)),
+        "social": [{"name": name, "handle": "@camillebench"} for name in ("Twitter", "GitHub")],
+        "languages": [
+            {"name": "Français", "level": "Langue maternelle"},
+            {"name": "Anglais", "level": "Courant (C1)"},
+        ],
+        "experience": [
+            {
+                "company": f"Entreprise {i + 1}",
+                "position": _sentence(rng, 3).rstrip("."),
+                "location": "Lyon",
+                "dates": f"{2023 - 2 * i} - {2025 - 2 * i}",
+                "tasks": [_sentence(rng) for _ in range(tasks)],
+            }
+            for i in range(experiences)
+        ],
+        "education": [
+            {
+                "institution": f"Université {i + 1}",
+                "degree": _sentence(rng, 4).rstrip("."),
+                "location": "Lyon",
+                "dates": f"{2010 - 2 * i} - {2012 - 2 * i}",
+            }
+            for i in range(educations)
+        ],
+        "skills": {
+            "groups": [
+                {"label": rng.choice(WORDS).capitalize(), "items": [rng.choice(WORDS) for _ in range(6)]}
+                for _ in range(groups)
+            ]
+        },
+    }
+
+
+def _strip_remote_photos(data: Dict[str, Any]) -> Dict[str, Any]:
+    photo = (data.get("profile") or {}).get("photo")
+    if isinstance(photo, str) and photo.startswith(("http://", "https://")):
+        data = copy.deepcopy(data)
+        del data["profile"]["photo"]
+    return data
+
+
+def load_resumes(network: bool = False) -> List[Tuple[str, Dict[str, Any]]]:
+    """(nom, données) : les exemples de data/ puis les CV synthétiques."""
+    resumes = []
+    for path in sorted(DATA_DIR.glob("*.json")):
+        data = json.loads(path.read_text(encoding="utf-8"))
+        resumes.append((path.stem, data if network else _strip_remote_photos(data)))
+    for size in SIZES:
+        resumes.append((f"synthetic_{size}", synthetic_resume(size)))
+    return resumes
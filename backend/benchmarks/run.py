@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Benchmarks des chemins d'aperçu, PDF et DOCX.
+
+Chaque opération est mesurée de deux façons :
+  - direct : render_html, html_to_pdf_bytes, export_docx_bytes ;
+  - asgi   : POST /preview/html, /export/pdf, /export/docx sur l'application
+             FastAPI, via un client ASGI en mémoire (ni serveur, ni réseau).
+
+Deux phases :
+  cases  chaque modèle de templates/ × chaque CV (exemples de data/ et
+         synthétiques small/typical/huge), un par un ;
+  sweep  montée en concurrence (--concurrency) sur le CV "typical" de
+         chaque modèle.
+Pour chaque mesure : débit, p50/p95/p99 et pic de mémoire (RSS du
+processus et de ses enfants, donc Chromium, si psutil est installé).
+
+Tout tourne hors ligne : base SQLite temporaire, pas de Stripe, FedaPay ni
+Hugging Face, réseau des pages de rendu fermé, photos distantes retirées
+(sauf --network). Le cache de rendu est désactivé pour mesurer de vrais
+rendus (--cache pour le garder).
+
+Usage (depuis backend/) :
+  python -m benchmarks.run
+  python -m benchmarks.run --ops html,docx --paths direct --iterations 10
+  python -m benchmarks.run --concurrency 1,4,16 --out benchmarks/results/avant.json
+  python -m benchmarks.compare benchmarks/results/avant.json benchmarks/results/apres.json
+
+Les résultats sont écrits en JSON dans benchmarks/results/ (commit git,
+configuration et machine inclus) pour comparer deux versions.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BACKEND_DIR = Path(__file__).parent.parent
+RESULTS_DIR = Path(__file__).parent / "results"
+
+OPERATIONS = ("html", "pdf", "docx")
+PATHS = ("direct", "asgi")
+ENDPOINTS = {"html": "/preview/html", "pdf": "/export/pdf", "docx": "/export/docx"}
+
+
+def _offline_environment(cache: bool, network: bool) -> None:
+    # À appliquer avant d'importer l'application : la configuration est lue à l'import
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/cvtor-benchmarks.db")
+    os.environ.setdefault("EXPORT_WORKERS", "0")
+    os.environ.setdefault("PDF_POOL_WARM", "0")
+    os.environ.setdefault("METRICS_ENABLED", "0")
+    for key in ("STRIPE_SECRET_KEY", "FEDAPAY_SECRET_KEY", "HF_TOKEN"):
+        os.environ.pop(key, None)
+    if not cache:
+        os.environ["RENDER_CACHE_MAX_BYTES"] = "0"
+        os.environ["RENDER_CACHE_DIR"] = ""
+    if not network:
+        os.environ["RENDER_ALLOWED_HOSTS"] = ""
+    # Les sweeps ne doivent pas buter sur la file d'attente des rendus
+    os.environ.setdefault("PDF_MAX_QUEUED_RENDERS", "1024")
+    os.environ.setdefault("PDF_QUEUE_TIMEOUT", "600")
+
+
+# --- Mesures ---
+def percentile(values: List[float], p: float) -> float:
+    """Percentile au rang le plus proche (values triées)."""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def summarize(latencies: List[float], wall: float, errors: int = 0) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    ms = lambda s: round(s * 1000, 3)  # noqa: E731
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_per_s": round(len(latencies) / wall, 3) if wall > 0 else 0.0,
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p95_ms": ms(percentile(ordered, 95)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1]) if ordered else 0.0,
+    }
+
+
+class PeakRSS:
+    """Pic de mémoire résidente pendant le bloc : processus + enfants (Chromium) avec psutil."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        try:
+            import psutil
+            self._process = psutil.Process()
+        except ImportError:
+            self._process = None
+
+    def _sample(self) -> float:
+        total = self._process.memory_info().rss
+        for child in self._process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except Exception:
+                continue
+        return total / (1024 * 1024)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, self._sample())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "PeakRSS":
+        if self._process is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak_mb = max(self.peak_mb, self._sample())
+        else:
+            # Sans psutil : pic du processus seul depuis son démarrage (ko sous Linux)
+            self.peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.peak_mb = round(self.peak_mb, 1)
+
+
+# --- Exécution ---
+Case = Tuple[str, str, Dict[str, Any]]  # (modèle, nom du CV, données)
+
+
+def _direct_call(op: str) -> Callable[[Case], Any]:
+    from services.export_docx import export_docx_bytes
+    from services.generate_pdf_from_html import html_to_pdf_bytes
+    from services.template_registry import render_html
+
+    if op == "html":
+        return lambda case: render_html(case[0], case[2])
+    if op == "pdf":
+        # Seule la conversion est mesurée : le HTML d'impression est préparé à part
+        prepared: Dict[Tuple[str, str], str] = {}
+
+        def _pdf(case: Case):
+            html = prepared.get((case[0], case[1]))
+            if html is None:
+                html = prepared[(case[0], case[1])] = render_html(case[0], case[2], for_print=True)
+            return html_to_pdf_bytes(html)
+        return _pdf
+    return lambda case: export_docx_bytes(case[2])
+
+
+def run_direct(op: str, cases: List[Case], concurrency: int, total: int) -> Tuple[List[float], int, float]:
+    call = _direct_call(op)
+    for case in {(c[0], c[1]): c for c in cases}.values():
+        call(case)  # préparation (HTML d'impression) et échauffement, hors mesure
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def _one(i: int) -> None:
+        nonlocal errors
+        case = cases[i % len(cases)]
+        started = time.perf_counter()
+        try:
+            call(case)
+        except Exception as e:
+            with lock:
+                errors += 1
+            print(f"[Benchmarks] {op} {case[0]}/{case[1]}: {e}")
+            return
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(_one, range(total)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def _run_asgi(op: str, cases: List[Case], concurrency: int, total: int) -> Tuple[List[float], int, float]:
+    import httpx
+
+    from api import app
+
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmarks", timeout=None) as client:
+        async def _one(i: int, measured: bool = True) -> None:
+            nonlocal errors
+            template, name, data = cases[i % len(cases)]
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(ENDPOINTS[op], json={"template_name": template, "data": data})
+                elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                errors += measured
+                print(f"[Benchmarks] {op} {template}/{name}: HTTP {response.status_code} {response.text[:200]}")
+            elif measured:
+                latencies.append(elapsed)
+
+        for i in range(len(cases)):
+            await _one(i, measured=False)  # échauffement
+        started = time.perf_counter()
+        await asyncio.gather(*(_one(i) for i in range(total)))
+        return latencies, errors, time.perf_counter() - started
+
+
+def run_asgi(op: str, cases: List[Case], concurrency: int, total: int) -> Tuple[List[float], int, float]:
+    return asyncio.run(_run_asgi(op, cases, concurrency, total))
+
+
+RUNNERS = {"direct": run_direct, "asgi": run_asgi}
+
+
+def measure(path: str, op: str, cases: List[Case], concurrency: int, total: int) -> Dict[str, Any]:
+    with PeakRSS() as rss:
+        latencies, errors, wall = RUNNERS[path](op, cases, concurrency, total)
+    return {**summarize(latencies, wall, errors), "concurrency": concurrency, "peak_rss_mb": rss.peak_mb}
+
+
+def pdf_available() -> Optional[str]:
+    """None si Chromium démarre, sinon la raison de l'échec."""
+    try:
+        from services.browser_pool import get_browser_pool
+        get_browser_pool().start()
+        return None
+    except Exception as e:
+        return str(e).splitlines()[0] if str(e) else type(e).__name__
+
+
+# --- Rapport ---
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _print_row(label: str, result: Dict[str, Any]) -> None:
+    print(
+        f"  {label:<44} {result['throughput_per_s']:>9.2f}/s  p50 {result['p50_ms']:>9.2f}  "
+        f"p95 {result['p95_ms']:>9.2f}  p99 {result['p99_ms']:>9.2f} ms  "
+        f"rss {result['peak_rss_mb']:>7.1f} Mo" + (f"  errors {result['errors']}" if result["errors"] else "")
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmarks aperçu / PDF / DOCX")
+    ap.add_argument("--ops", default=",".join(OPERATIONS), help="Opérations : html,pdf,docx")
+    ap.add_argument("--paths", default=",".join(PATHS), help="Chemins : direct,asgi")
+    ap.add_argument("--templates", default="", help="Modèles (défaut : tous ceux de templates/)")
+    ap.add_argument("--iterations", type=int, default=3, help="Répétitions par cas en phase cases")
+    ap.add_argument("--concurrency", default="1,2,4,8", help="Niveaux de concurrence du sweep")
+    ap.add_argument("--sweep-requests", type=int, default=32, help="Requêtes par niveau de concurrence")
+    ap.add_argument("--no-cases", action="store_true", help="Sauter la phase cases")
+    ap.add_argument("--no-sweep", action="store_true", help="Sauter la phase sweep")
+    ap.add_argument("--cache", action="store_true", help="Garder le cache de rendu actif")
+    ap.add_argument("--network", action="store_true", help="Garder les photos distantes et le réseau des pages")
+    ap.add_argument("--out", help="Fichier JSON de résultats (défaut benchmarks/results/<date>-<commit>.json)")
+    args = ap.parse_args()
+
+    _offline_environment(args.cache, args.network)
+    sys.path.insert(0, str(BACKEND_DIR))
+    from database.database import Base, engine
+    from services.browser_pool import shutdown_browser_pool
+    from services.template_registry import registry
+
+    from benchmarks.corpus import load_resumes
+
+    Base.metadata.create_all(bind=engine)
+    ops = [op for op in args.ops.split(",") if op]
+    paths = [path for path in args.paths.split(",") if path]
+    templates = [t for t in args.templates.split(",") if t] or registry.names()
+    resumes = load_resumes(network=args.network)
+    levels = [int(level) for level in args.concurrency.split(",") if level]
+
+    skipped: Dict[str, str] = {}
+    if "pdf" in ops:
+        reason = pdf_available()
+        if reason is not None:
+            print(f"[Benchmarks] PDF skipped: {reason}")
+            skipped["pdf"] = reason
+            ops.remove("pdf")
+
+    results: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "templates": templates,
+            "resumes": [name for name, _ in resumes],
+            "iterations": args.iterations,
+            "concurrency": levels,
+            "sweep_requests": args.sweep_requests,
+            "cache": args.cache,
+            "network": args.network,
+        },
+        "skipped": skipped,
+        "cases": [],
+        "sweep": [],
+    }
+
+    try:
+        if not args.no_cases:
+            print(f"== cases ({args.iterations} iteration(s), concurrency 1)")
+            for path in paths:
+                for op in ops:
+                    for template in templates:
+                        for name, data in resumes:
+                            result = measure(path, op, [(template, name, data)], 1, args.iterations)
+                            results["cases"].append({"path": path, "op": op, "template": template, "resume": name, **result})
+                            _print_row(f"{path:<6} {op:<4} {template}/{name}", result)
+
+        if not args.no_sweep:
+            typical = dict(resumes)["synthetic_typical"]
+            sweep_cases = [(template, "synthetic_typical", typical) for template in templates]
+            print(f"== sweep ({args.sweep_requests} request(s) per level, synthetic_typical)")
+            for path in paths:
+                for op in ops:
+                    for level in levels:
+                        result = measure(path, op, sweep_cases, level, args.sweep_requests)
+                        results["sweep"].append({"path": path, "op": op, **result})
+                        _print_row(f"{path:<6} {op:<4} x{level}", result)
+    finally:
+        shutdown_browser_pool()
+
+    out = Path(args.out) if args.out else RESULTS_DIR / (
+        f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{results['commit'] or 'nogit'}.json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"[Benchmarks] Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark du démarrage : de `import api` à la première réponse de /healthz.
+
+Chaque mesure tourne dans un processus Python neuf (aucun module déjà
+importé) qui importe l'application, la sert avec uvicorn sur un port
+local, puis interroge /healthz jusqu'à la première réponse 200. Le
+processus renvoie :
+  import_ms   durée de `import api`
+  healthz_ms  de `import api` à la première réponse de /healthz (démarrage
+              d'uvicorn et événements startup compris)
+  loaded      dépendances lourdes déjà importées à ce moment-là
+
+Même environnement hors ligne que benchmarks/run.py. --warmup règle
+STARTUP_WARMUP (services/warmup.py) pour mesurer le coût d'un préchargement,
+--blocking le fait attendre avant de servir.
+
+Usage (depuis backend/) :
+  python -m benchmarks.startup
+  python -m benchmarks.startup --runs 10 --importtime 15
+  python -m benchmarks.startup --warmup all --blocking
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).parent.parent
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# Chargées à la demande depuis services/warmup.py : leur présence au premier /healthz est une régression
+HEAVY_MODULES = ("playwright", "docx", "stripe", "fedapay", "httpx", "jinja2", "jose", "passlib", "bcrypt",
+                 "psycopg2", "huggingface_hub")
+
+
+def _child() -> None:
+    # Mesuré dans le processus neuf : seuls des modules de la bibliothèque standard avant t0
+    import http.client
+    import socket
+    import threading
+
+    started = time.perf_counter()
+    import api
+    imported = time.perf_counter()
+
+    import uvicorn
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while True:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/healthz")
+            if conn.getresponse().status == 200:
+                break
+        except OSError:
+            pass
+        time.sleep(0.002)
+    ready = time.perf_counter()
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    server.should_exit = True
+    thread.join(timeout=30)
+    print(json.dumps({
+        "import_ms": round((imported - started) * 1000, 1),
+        "healthz_ms": round((ready - started) * 1000, 1),
+        "loaded": loaded,
+    }))
+
+
+def run_once(env: Dict[str, str]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=300,
+    )
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"startup run failed ({proc.returncode}):\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_ms"] = round(wall * 1000, 1)
+    return result
+
+
+def import_profile(env: Dict[str, str], top: int) -> List[Dict[str, Any]]:
+    """Modules les plus coûteux de `import api` (cumulé, -X importtime)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=300,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        try:
+            rows.append({
+                "module": module.strip(),
+                "self_ms": round(int(self_us) / 1000, 1),
+                "cumulative_ms": round(int(cumulative_us) / 1000, 1),
+            })
+        except ValueError:
+            continue  # ligne d'en-tête
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "min": min(values),
+        "median": round(statistics.median(values), 1),
+        "max": max(values),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Temps de démarrage : import api -> premier /healthz")
+    ap.add_argument("--runs", type=int, default=5, help="Nombre de démarrages mesurés")
+    ap.add_argument("--warmup", default="", help="STARTUP_WARMUP des processus mesurés (ex. all, pdf,docx)")
+    ap.add_argument("--blocking", action="store_true", help="STARTUP_WARMUP_BLOCKING=1")
+    ap.add_argument("--importtime", type=int, default=0, metavar="N",
+                    help="Ajoute les N modules les plus lents à importer")
+    ap.add_argument("--out", help="Fichier JSON de résultats (défaut benchmarks/results/startup-<date>-<commit>.json)")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        sys.path.insert(0, str(BACKEND_DIR))
+        _child()
+        return
+
+    from benchmarks.run import _git_commit, _offline_environment
+
+    _offline_environment(cache=True, network=False)
+    env = dict(os.environ)
+    env["STARTUP_WARMUP"] = args.warmup
+    env["STARTUP_WARMUP_BLOCKING"] = "1" if args.blocking else "0"
+
+    runs = []
+    for i in range(args.runs):
+        result = run_once(env)
+        runs.append(result)
+        print(f"run {i + 1:>2}  import {result['import_ms']:>7.1f} ms  healthz {result['healthz_ms']:>7.1f} ms"
+              f"  process {result['process_ms']:>7.1f} ms  loaded: {', '.join(result['loaded']) or '-'}")
+
+    results: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "config": {"runs": args.runs, "warmup": args.warmup, "blocking": args.blocking},
+        "import_ms": _summary([r["import_ms"] for r in runs]),
+        "healthz_ms": _summary([r["healthz_ms"] for r in runs]),
+        "runs": runs,
+    }
+    print(f"import api   median {results['import_ms']['median']} ms")
+    print(f"first /healthz median {results['healthz_ms']['median']} ms")
+    if args.importtime:
+        results["import_profile"] = import_profile(env, args.importtime)
+        for row in results["import_profile"]:
+            print(f"  {row['cumulative_ms']:>8.1f} ms  {row['module']}")
+
+    out = Path(args.out) if args.out else RESULTS_DIR / (
+        f"startup-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{results['commit'] or 'nogit'}.json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"[Benchmarks] Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,13 @@ import sys
 sys.path.insert(0, os.path.dirname(__file__))
 
 from database.database import engine, Base
-from models.models import User, Resume, Template, Category
+from models.models import User, Resume, Template, Category, ExportJob
 
 def create_tables():
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
     print("✅ Database tables created successfully!")
-    print("Tables: users, resumes, templates, categories")
+    print("Tables: users, resumes, templates, categories, export_jobs")
 
 if __name__ == "__main__":
     create_tables()
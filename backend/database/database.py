@@ -1,10 +1,46 @@
 #!/usr/bin/env python3
+"""
+Moteurs et sessions SQLAlchemy.
+
+Les routes synchrones (`def`) reçoivent une Session de `get_db` : FastAPI
+les exécute dans le threadpool, les requêtes ne bloquent pas la boucle.
+Les routes et dépendances `async def` prennent `get_session` et passent
+par `run_db(db, fn, ...)` : `fn(session, ...)` est du code ORM synchrone
+ordinaire, exécuté dans le threadpool, ou sur le moteur async (asyncpg,
+aiosqlite) sans thread quand DB_ASYNC=1. Dans une même requête, toutes
+les dépendances qui demandent `get_session` partagent la même session.
+
+Les moteurs ne sont créés qu'à la première session (l'import de
+l'application ne charge pas le pilote) ; la création du moteur applique
+les mises à niveau du schéma (database/migrations.py). `pool_stats()` décrit l'état des
+pools (GET /api/admin/db/pool et /metrics).
+
+Configuration (variables d'environnement) :
+  DATABASE_URL        URL SQLAlchemy (obligatoire)
+  DB_POOL_SIZE        connexions gardées ouvertes par moteur (défaut 5)
+  DB_MAX_OVERFLOW     connexions supplémentaires en pointe (défaut 10)
+  DB_POOL_TIMEOUT     attente maximum d'une connexion libre en secondes (défaut 30)
+  DB_POOL_RECYCLE     âge maximum d'une connexion en secondes, -1 = jamais (défaut 1800)
+  DB_POOL_PRE_PING    1 = vérifie la connexion avant usage, utile derrière un proxy
+                      ou après un redémarrage de la base (défaut 1)
+  DB_ASYNC            1 = les routes async utilisent le moteur async (défaut 0)
+  DATABASE_ASYNC_URL  URL du moteur async (défaut : DATABASE_URL avec le pilote
+                      asyncpg pour PostgreSQL, aiosqlite pour SQLite)
+Les options de taille (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT) ne
+s'appliquent pas à SQLite.
+"""
 import os
+import threading
+from typing import Any, Callable, Dict, Optional, TypeVar
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from dotenv import load_dotenv
 
+from database.migrations import upgrade_schema
+from services.metrics import instrument_engine, metrics
+
 # Charger les variables d'environnement depuis .env
 load_dotenv()
 
@@ -13,8 +49,94 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set in .env file")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
+
+# Pilote async correspondant au pilote synchrone de DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+T = TypeVar("T")
+
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)).render_as_string(
+        hide_password=False
+    )
+
+
+DATABASE_ASYNC_URL = os.getenv("DATABASE_ASYNC_URL") or async_database_url(DATABASE_URL)
+
+
+def pool_options(url: str) -> Dict[str, Any]:
+    options: Dict[str, Any] = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if make_url(url).get_backend_name() != "sqlite":
+        # SQLite : fichier local, pool propre au pilote (parfois sans taille)
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+
+# Le moteur (et le pilote, psycopg2...) n'est créé qu'à la première session :
+# importer l'application ne coûte pas la connexion à la base.
+_engine: Optional[Engine] = None
+_async_engine = None
+_async_sessionmaker = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
+                # Durée de chaque requête SQL, exposée sur /metrics
+                instrument_engine(engine)
+                # Colonnes ajoutées aux modèles depuis la création des tables
+                upgrade_schema(engine)
+                _engine = engine
+    return _engine
+
+
+def get_async_engine():
+    """Moteur async (DATABASE_ASYNC_URL) ; nécessite asyncpg ou aiosqlite."""
+    global _async_engine
+    if _async_engine is None:
+        # Le moteur synchrone applique les mises à niveau du schéma (une seule fois)
+        get_engine()
+        with _engine_lock:
+            if _async_engine is None:
+                from sqlalchemy.ext.asyncio import create_async_engine
+
+                engine = create_async_engine(DATABASE_ASYNC_URL, **pool_options(DATABASE_ASYNC_URL))
+                instrument_engine(engine.sync_engine)
+                _async_engine = engine
+    return _async_engine
+
+
+def __getattr__(name: str):
+    # `from database.database import engine` reste possible (scripts, init_db)
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _LazySession(Session):
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else get_engine(), **kwargs)
+
+
+SessionLocal = sessionmaker(class_=_LazySession, autocommit=False, autoflush=False)
 
 Base = declarative_base()
 
@@ -23,4 +145,74 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def AsyncSessionLocal():
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        # Objets encore lisibles après commit : les routes les renvoient telles quelles
+        _async_sessionmaker = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Session des routes et dépendances async (partagée dans la requête avec
+# les autres dépendances get_session, et avec get_db en mode synchrone)
+get_session = get_async_db if DB_ASYNC else get_db
+
+
+async def run_db(db, fn: Callable[..., T], *args: Any) -> T:
+    """Exécute `fn(session, *args)` (code ORM synchrone) sans bloquer la boucle."""
+    if isinstance(db, Session):
+        from fastapi.concurrency import run_in_threadpool
+
+        return await run_in_threadpool(fn, db, *args)
+    return await db.run_sync(fn, *args)
+
+
+# --- État des pools ---
+def _pool_status(engine: Engine) -> Dict[str, Any]:
+    pool = engine.pool
+    status: Dict[str, Any] = {"pool": type(pool).__name__}
+    for key, attr in (("size", "size"), ("checked_in", "checkedin"), ("checked_out", "checkedout"),
+                      ("overflow", "overflow")):
+        fn = getattr(pool, attr, None)
+        if callable(fn):
+            status[key] = fn()
+    return status
+
+
+def pool_stats() -> Dict[str, Any]:
+    """État des pools des moteurs déjà créés (None pour un moteur pas encore utilisé)."""
+    return {
+        "config": {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+            "async": DB_ASYNC,
+        },
+        "sync": _pool_status(_engine) if _engine is not None else None,
+        "async": _pool_status(_async_engine.sync_engine) if _async_engine is not None else None,
+    }
+
+
+@metrics.collector
+def _pool_metrics():
+    samples = []
+    for name, engine in (("sync", _engine), ("async", _async_engine and _async_engine.sync_engine)):
+        if engine is None:
+            continue
+        status = _pool_status(engine)
+        for state in ("checked_in", "checked_out", "overflow"):
+            if state in status:
+                samples.append(("cvtor_db_pool_connections", {"engine": name, "state": state}, status[state]))
+    yield ("cvtor_db_pool_connections", "gauge", "Database pool connections by state", samples)
@@ -5,7 +5,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from database.database import engine, Base
-from models.models import User, Resume, Template, Category
+from models.models import User, Resume, Template, Category, ExportJob
 
 def init_db():
     print("Creating database tables...")
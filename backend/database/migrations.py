@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Mises à niveau du schéma d'une base existante.
+
+`Base.metadata.create_all` crée les tables manquantes mais ne modifie pas
+une table existante. Les changements faits aux modèles après coup sont
+listés ici et `upgrade_schema(engine)` applique ceux qui manquent :
+  - COLUMNS : colonnes ajoutées (ALTER TABLE ... ADD COLUMN) ;
+  - JSON_COLUMNS : colonnes de texte JSON passées en JSONB (PostgreSQL
+    seulement ; SQLite stocke le type JSON en texte, rien à convertir) ;
+  - resumes.summary : calculé pour les CV enregistrés avant la colonne,
+    par un UPDATE Core qui ne touche pas `version` (les ETags des CV
+    restent valides).
+Idempotent ; appelé à la création du moteur (database.get_engine).
+"""
+from typing import List, Tuple
+
+from sqlalchemy import JSON, bindparam, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+from services.resume_summary import resume_summary
+
+# (table, colonne, définition SQL) : colonnes ajoutées après la création de la table
+COLUMNS: List[Tuple[str, str, str]] = [
+    ("resumes", "summary", "TEXT"),
+    ("resumes", "version", "INTEGER NOT NULL DEFAULT 1"),
+    ("export_jobs", "heartbeat_at", "TIMESTAMP WITH TIME ZONE"),
+]
+
+# Lignes lues et mises à jour par lot lors du calcul des résumés manquants
+BACKFILL_BATCH = 500
+
+# (table, colonne) : anciennes colonnes TEXT contenant du JSON
+JSON_COLUMNS: List[Tuple[str, str]] = [
+    ("resumes", "data"),
+    ("resumes", "summary"),
+]
+
+
+def upgrade_schema(engine: Engine) -> List[str]:
+    """Applique les changements manquants ; renvoie la liste de ceux qui ont été faits."""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    done: List[str] = []
+    with engine.begin() as conn:
+        for table, column, definition in COLUMNS:
+            if table not in tables:
+                # Table absente : create_all la créera avec toutes ses colonnes
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column in existing:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+            done.append(f"added {table}.{column}")
+        if engine.dialect.name == "postgresql":
+            for table, column in JSON_COLUMNS:
+                if table not in tables:
+                    continue
+                types = {c["name"]: c["type"] for c in inspect(conn).get_columns(table)}
+                if column not in types or isinstance(types[column], JSON):
+                    continue
+                conn.execute(text(
+                    f"ALTER TABLE {table} ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb"
+                ))
+                done.append(f"converted {table}.{column} to JSONB")
+        if "resumes" in tables:
+            count = _backfill_summaries(conn)
+            if count:
+                done.append(f"computed {count} resumes.summary")
+    if done:
+        print(f"[DB] Schema upgraded: {', '.join(done)}")
+    return done
+
+
+def _backfill_summaries(conn: Connection) -> int:
+    # Import différé : models.models importe database.database, qui importe ce module
+    from models.models import Resume
+    table = Resume.__table__
+    statement = update(table).where(table.c.id == bindparam("row_id")).values(summary=bindparam("row_summary"))
+    count, last_id = 0, 0
+    while True:
+        rows = conn.execute(
+            select(table.c.id, table.c.data)
+            .where(table.c.summary.is_(None), table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            return count
+        conn.execute(statement, [{"row_id": row.id, "row_summary": resume_summary(row.data)} for row in rows])
+        count += len(rows)
+        last_id = rows[-1].id
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Faux Stripe, FedaPay et Hugging Face pour les tests de charge.
+
+Un seul serveur HTTP local (uvicorn, dans un thread) imite les appels que
+fait l'application :
+  /stripe   POST /v1/customers, /v1/checkout/sessions, /v1/billing_portal/sessions
+  /fedapay  POST /v1/transactions, /v1/transactions/{id}/token, GET /v1/transactions/{id}
+  /hf       POST /v1/chat/completions (API compatible OpenAI d'InferenceClient)
+Chaque fournisseur a sa latence (moyenne ± gigue) et son taux d'erreur.
+`stripe_webhook()` et `fedapay_webhook()` produisent les événements que
+les fournisseurs enverraient après paiement, signés avec le secret de
+webhook Stripe de l'application.
+
+L'application est branchée dessus par variables d'environnement
+(`FakeProviders.env()`) : STRIPE_API_BASE, FEDAPAY_API_BASE, HF_API_BASE…
+
+Usage autonome (depuis backend/), pour une application lancée à part :
+  python -m loadtest.fakes --port 8900 --webhook-secret whsec_test --print-env
+  python -m loadtest.fakes --port 8900 --webhook-secret whsec_test --latency-ms 150 --error-rate 0.01
+(loadtest/run.py --base-url démarre lui-même ces faux fournisseurs.)
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import secrets
+import socket
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+PROVIDERS = ("stripe", "fedapay", "hf")
+
+
+class ProviderBehaviour:
+    """Latence et pannes simulées d'un fournisseur."""
+
+    def __init__(self, latency_ms: float = 100, jitter: float = 0.3, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+
+class FakeProviders:
+    def __init__(self, behaviours: Optional[Dict[str, ProviderBehaviour]] = None,
+                 webhook_secret: Optional[str] = None, seed: int = 0):
+        self.behaviours = {name: ProviderBehaviour() for name in PROVIDERS}
+        self.behaviours.update(behaviours or {})
+        self.webhook_secret = webhook_secret or f"whsec_{secrets.token_hex(16)}"
+        self.price_id = "price_fake_premium"
+        self.base_url: Optional[str] = None
+        self.calls = {name: 0 for name in PROVIDERS}
+        self.failures = {name: 0 for name in PROVIDERS}
+        self._rng = random.Random(seed)
+        self._checkout_sessions: Dict[str, Dict[str, Any]] = {}
+        self._transactions: Dict[str, Dict[str, Any]] = {}
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self.app = self._build_app()
+
+    # --- Comportement simulé ---
+    async def _behave(self, provider: str) -> Optional[JSONResponse]:
+        behaviour = self.behaviours[provider]
+        self.calls[provider] += 1
+        spread = behaviour.latency_ms * behaviour.jitter
+        await asyncio.sleep(max(0.0, self._rng.uniform(behaviour.latency_ms - spread, behaviour.latency_ms + spread)) / 1000)
+        if self._rng.random() < behaviour.error_rate:
+            self.failures[provider] += 1
+            if provider == "stripe":
+                return JSONResponse({"error": {"type": "api_error", "message": "Fake Stripe outage"}}, status_code=500)
+            return JSONResponse({"message": f"Fake {provider} outage"}, status_code=503)
+        return None
+
+    @staticmethod
+    def _stripe_form(form) -> Dict[str, Any]:
+        # Encodage Stripe : metadata[user_id]=1, line_items[0][price]=…
+        fields: Dict[str, Any] = {"metadata": {}}
+        for key, value in form.multi_items():
+            if key.startswith("metadata[") and key.endswith("]"):
+                fields["metadata"][key[len("metadata["):-1]] = value
+            else:
+                fields[key] = value
+        return fields
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="Fake providers")
+        created = lambda: int(time.time())  # noqa: E731
+
+        @app.post("/stripe/v1/customers")
+        async def stripe_customer(request: Request):
+            if (error := await self._behave("stripe")) is not None:
+                return error
+            fields = self._stripe_form(await request.form())
+            return {"id": f"cus_{secrets.token_hex(8)}", "object": "customer", "created": created(),
+                    "email": fields.get("email"), "metadata": fields["metadata"]}
+
+        @app.post("/stripe/v1/checkout/sessions")
+        async def stripe_checkout(request: Request):
+            if (error := await self._behave("stripe")) is not None:
+                return error
+            fields = self._stripe_form(await request.form())
+            session_id = f"cs_test_{secrets.token_hex(12)}"
+            session = {
+                "id": session_id, "object": "checkout.session", "created": created(),
+                "url": f"{self.base_url}/checkout/{session_id}", "mode": fields.get("mode"),
+                "customer": fields.get("customer"), "metadata": fields["metadata"],
+                "subscription": None, "status": "open",
+            }
+            self._checkout_sessions[session_id] = session
+            return session
+
+        @app.post("/stripe/v1/billing_portal/sessions")
+        async def stripe_portal(request: Request):
+            if (error := await self._behave("stripe")) is not None:
+                return error
+            return {"id": f"bps_{secrets.token_hex(8)}", "object": "billing_portal.session",
+                    "created": created(), "url": f"{self.base_url}/portal"}
+
+        @app.post("/fedapay/v1/transactions")
+        async def fedapay_transaction(request: Request):
+            if (error := await self._behave("fedapay")) is not None:
+                return error
+            body = await request.json()
+            transaction = {
+                "id": self._rng.randint(100000, 999999), "status": "pending",
+                "amount": body.get("amount"), "description": body.get("description"),
+                "metadata": body.get("metadata", {}),
+            }
+            self._transactions[str(transaction["id"])] = transaction
+            return {"v1/transaction": transaction}
+
+        @app.post("/fedapay/v1/transactions/{transaction_id}/token")
+        async def fedapay_token(transaction_id: str):
+            if (error := await self._behave("fedapay")) is not None:
+                return error
+            token = secrets.token_hex(16)
+            return {"token": token, "url": f"{self.base_url}/fedapay/pay/{token}"}
+
+        @app.get("/fedapay/v1/transactions/{transaction_id}")
+        async def fedapay_retrieve(transaction_id: str):
+            if (error := await self._behave("fedapay")) is not None:
+                return error
+            transaction = self._transactions.get(transaction_id)
+            if transaction is None:
+                return JSONResponse({"message": "Transaction not found"}, status_code=404)
+            return {"v1/transaction": transaction}
+
+        @app.post("/hf/v1/chat/completions")
+        @app.post("/hf/models/{model:path}/v1/chat/completions")
+        async def hf_chat(request: Request):
+            if (error := await self._behave("hf")) is not None:
+                return error
+            body = await request.json()
+            resume = {
+                "profile": {"name": "Alex Charge", "title": "Candidat généré"},
+                "summary": "Professionnel orienté résultats, généré pour le test de charge.",
+                "experience": [{"company": "Fake Corp", "role": "Ingénieur", "start": "Jan 2020",
+                                "end": "Déc 2023", "bullets": ["Livraison de projets mesurables"]}],
+                "education": [{"school": "Université Fictive", "degree": "Master", "year": "2019"}],
+                "skills": {"groups": [{"label": "Outils", "items": ["Git", "Docker"]}]},
+            }
+            return {
+                "id": f"chatcmpl-{secrets.token_hex(8)}", "object": "chat.completion", "created": created(),
+                "model": body.get("model") or "fake",
+                "choices": [{"index": 0, "finish_reason": "stop", "logprobs": None,
+                             "message": {"role": "assistant", "content": json.dumps(resume, ensure_ascii=False)}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                "system_fingerprint": "fake",
+            }
+
+        return app
+
+    # --- Webhooks générés ---
+    def stripe_webhook(self, session_id: str) -> Tuple[bytes, Dict[str, str]]:
+        """checkout.session.completed pour une session créée, signé comme le ferait Stripe."""
+        session = dict(self._checkout_sessions[session_id])
+        session.update(status="complete", subscription=f"sub_{secrets.token_hex(8)}")
+        event = {
+            "id": f"evt_{secrets.token_hex(12)}", "object": "event", "api_version": "2023-10-16",
+            "created": int(time.time()), "type": "checkout.session.completed",
+            "data": {"object": session}, "livemode": False, "pending_webhooks": 1,
+        }
+        payload = json.dumps(event).encode("utf-8")
+        timestamp = int(time.time())
+        signature = hmac.new(
+            self.webhook_secret.encode("utf-8"), f"{timestamp}.".encode("utf-8") + payload, hashlib.sha256
+        ).hexdigest()
+        return payload, {"Stripe-Signature": f"t={timestamp},v1={signature}", "Content-Type": "application/json"}
+
+    def fedapay_webhook(self, transaction_id: Any) -> Dict[str, Any]:
+        transaction = dict(self._transactions[str(transaction_id)], status="approved")
+        return {"name": "transaction.approved", "type": "transaction.approved", "data": transaction}
+
+    # --- Serveur ---
+    def env(self) -> Dict[str, str]:
+        """Variables d'environnement qui branchent l'application sur ces faux fournisseurs (et lèvent les limites par IP)."""
+        return {
+            "STRIPE_SECRET_KEY": "sk_test_fake",
+            "STRIPE_API_BASE": f"{self.base_url}/stripe",
+            "STRIPE_WEBHOOK_SECRET": self.webhook_secret,
+            "STRIPE_PREMIUM_PRICE_ID": self.price_id,
+            "FEDAPAY_SECRET_KEY": "sk_sandbox_fake",
+            "FEDAPAY_API_BASE": f"{self.base_url}/fedapay",
+            "HF_API_BASE": f"{self.base_url}/hf",
+            "HF_TOKEN": "hf_fake",
+            # Tous les utilisateurs virtuels arrivent de la même IP (auth/rate_limit.py)
+            "LOGIN_MAX_ATTEMPTS_PER_IP": "0",
+            "REGISTER_MAX_PER_IP": "0",
+        }
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        import uvicorn
+
+        if not port:
+            with socket.socket() as probe:
+                probe.bind((host, 0))
+                port = probe.getsockname()[1]
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, name="fake-providers", daemon=True)
+        self._thread.start()
+        deadline = time.time() + 10
+        while not self._server.started:
+            if time.time() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Fake providers failed to start")
+            time.sleep(0.02)
+        self.base_url = f"http://{host}:{port}"
+        print(f"[Fake providers] Listening on {self.base_url}")
+        return self.base_url
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=10)
+            self._server = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: {"calls": self.calls[name], "failures": self.failures[name]} for name in PROVIDERS}
+
+
+def add_behaviour_arguments(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--latency-ms", type=float, default=100, help="Latence moyenne des fournisseurs")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Taux d'erreur des fournisseurs (0-1)")
+    for name in PROVIDERS:
+        ap.add_argument(f"--{name}-latency-ms", type=float, help=f"Latence de {name} (défaut --latency-ms)")
+        ap.add_argument(f"--{name}-error-rate", type=float, help=f"Taux d'erreur de {name} (défaut --error-rate)")
+
+
+def behaviours_from(args: argparse.Namespace) -> Dict[str, ProviderBehaviour]:
+    behaviours = {}
+    for name in PROVIDERS:
+        latency = getattr(args, f"{name}_latency_ms")
+        error_rate = getattr(args, f"{name}_error_rate")
+        behaviours[name] = ProviderBehaviour(
+            latency_ms=args.latency_ms if latency is None else latency,
+            error_rate=args.error_rate if error_rate is None else error_rate,
+        )
+    return behaviours
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Faux Stripe / FedaPay / Hugging Face")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8900)
+    ap.add_argument("--webhook-secret", help="Secret de webhook Stripe (défaut : généré)")
+    ap.add_argument("--print-env", action="store_true", help="Afficher les variables sans démarrer le serveur")
+    add_behaviour_arguments(ap)
+    args = ap.parse_args()
+
+    fakes = FakeProviders(behaviours_from(args), webhook_secret=args.webhook_secret)
+    if args.print_env:
+        fakes.base_url = f"http://{args.host}:{args.port}"
+    else:
+        fakes.start(args.host, args.port)
+    print("# Variables à donner à l'application :")
+    for key, value in fakes.env().items():
+        print(f"export {key}={value}")
+    if args.print_env:
+        return
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fakes.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Test de charge : des utilisateurs virtuels rejouent des sessions réalistes.
+
+Une session : inscription, connexion, création d'un CV, rafale d'aperçus
+incrémentaux (/preview/sections) pendant l'édition, sauvegarde, génération
+IA, exports DOCX et PDF, puis passage premium (Stripe avec webhook signé,
+ou FedaPay) et vérification du plan via /auth/me.
+
+Le nombre d'utilisateurs virtuels monte par paliers (--stages) ; chaque
+palier dure --stage-duration secondes. Pour chaque palier : latence par
+endpoint (p50/p95/p99), débit et taux d'erreur. Le point de saturation est
+le premier palier où le p95 dépasse --slo-p95-ms, où les erreurs dépassent
+--max-error-rate, ou où le débit cesse de croître avec la charge.
+
+Stripe, FedaPay et Hugging Face sont remplacés par loadtest/fakes.py
+(latence et taux d'erreur réglables). Par défaut l'application tourne dans
+le processus (client ASGI, base SQLite temporaire) ; avec --base-url on
+vise un serveur lancé à part, démarré avec les variables de
+`python -m loadtest.fakes --print-env` (même --fakes-port et --webhook-secret).
+
+Usage (depuis backend/) :
+  python -m loadtest.run
+  python -m loadtest.run --stages 1,5,10,25,50 --stage-duration 30 --latency-ms 300
+  python -m loadtest.run --base-url http://localhost:8000 --fakes-port 8900 --webhook-secret whsec_test
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+BACKEND_DIR = Path(__file__).parent.parent
+RESULTS_DIR = Path(__file__).parent / "results"
+
+sys.path.insert(0, str(BACKEND_DIR))
+from benchmarks.corpus import synthetic_resume  # noqa: E402
+from benchmarks.run import summarize  # noqa: E402
+from loadtest.fakes import FakeProviders, add_behaviour_arguments, behaviours_from  # noqa: E402
+
+TEMPLATES = ("classique", "moderne", "professional", "tokyo")
+
+
+class Recorder:
+    """Latences par endpoint (gabarit de route) pour le palier en cours."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.sessions = 0
+        self.failed_sessions = 0
+
+    def record(self, endpoint: str, elapsed: float, ok: bool) -> None:
+        self.latencies.setdefault(endpoint, [])
+        self.errors.setdefault(endpoint, 0)
+        if ok:
+            self.latencies[endpoint].append(elapsed)
+        else:
+            self.errors[endpoint] += 1
+
+    def report(self, wall: float) -> Dict[str, Any]:
+        everything = [value for values in self.latencies.values() for value in values]
+        errors = sum(self.errors.values())
+        total = len(everything) + errors
+        return {
+            "overall": {
+                **summarize(everything, wall, errors),
+                "error_rate": round(errors / total, 4) if total else 0.0,
+                "sessions": self.sessions,
+                "failed_sessions": self.failed_sessions,
+            },
+            "endpoints": {
+                endpoint: summarize(self.latencies[endpoint], wall, self.errors[endpoint])
+                for endpoint in sorted(self.latencies)
+            },
+        }
+
+
+class SessionFailed(Exception):
+    pass
+
+
+class VirtualUser:
+    def __init__(self, client, fakes: FakeProviders, recorder: Recorder, args, rng: random.Random):
+        self.client = client
+        self.fakes = fakes
+        self.recorder = recorder
+        self.args = args
+        self.rng = rng
+        self.headers: Dict[str, str] = {}
+
+    async def call(self, method: str, endpoint: str, path: Optional[str] = None,
+                   expected: Tuple[int, ...] = (200,), headers: Optional[Dict[str, str]] = None, **kwargs):
+        started = time.perf_counter()
+        try:
+            # Les webhooks portent leurs propres en-têtes (signature), sans le jeton de l'utilisateur
+            response = await self.client.request(
+                method, path or endpoint, headers=self.headers if headers is None else headers, **kwargs
+            )
+        except Exception as e:
+            self.recorder.record(f"{method} {endpoint}", time.perf_counter() - started, False)
+            raise SessionFailed(f"{method} {endpoint}: {e}")
+        ok = response.status_code in expected
+        self.recorder.record(f"{method} {endpoint}", time.perf_counter() - started, ok)
+        if not ok:
+            raise SessionFailed(f"{method} {endpoint}: HTTP {response.status_code} {response.text[:200]}")
+        return response
+
+    async def think(self) -> None:
+        if self.args.think_ms:
+            await asyncio.sleep(self.rng.uniform(0.5, 1.5) * self.args.think_ms / 1000)
+
+    async def session(self) -> None:
+        email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+        password = "load-test-password"
+        template = self.rng.choice(TEMPLATES)
+        data = synthetic_resume("typical")
+
+        await self.call("POST", "/auth/register", json={"email": email, "password": password, "full_name": "Load Test"})
+        login = await self.call("POST", "/auth/login", data={"username": email, "password": password})
+        self.headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        await self.think()
+
+        resume = await self.call("POST", "/resumes/", expected=(201,),
+                                 json={"title": "CV test de charge", "template_name": template, "data": data})
+        resume_id = resume.json()["id"]
+
+        # Rafale d'aperçus : une modification par frappe, sections seulement après la première
+        session_id, revision = None, None
+        for i in range(self.args.preview_storm):
+            data["summary"] = f"{data['summary'][:400]} {i}"
+            preview = await self.call("POST", "/preview/sections", json={
+                "template_name": template, "data": data, "session_id": session_id, "revision": revision,
+            })
+            body = preview.json()
+            session_id, revision = body["session_id"], body["revision"]
+            if self.args.typing_ms:
+                await asyncio.sleep(self.args.typing_ms / 1000)
+
+        # Sauvegarde automatique : seul le champ modifié (merge patch), à la version lue
+        await self.call("PATCH", "/resumes/{id}", f"/resumes/{resume_id}?version={resume.json()['version']}",
+                        headers={**self.headers, "Content-Type": "application/merge-patch+json"},
+                        content=json.dumps({"summary": data["summary"]}))
+        await self.call("POST", "/generate", json={"role": "Ingénieur logiciel", "data": data})
+        await self.think()
+
+        export = {"template_name": template, "data": data}
+        await self.call("POST", "/export/docx", json=export)
+        if self.args.pdf:
+            await self.call("POST", "/export/pdf", json=export)
+        await self.think()
+
+        if self.rng.random() < self.args.fedapay_share:
+            await self.upgrade_fedapay()
+        else:
+            await self.upgrade_stripe()
+        me = await self.call("GET", "/auth/me")
+        if me.json()["subscription_plan"] != "premium":
+            raise SessionFailed("Upgrade webhook did not switch the plan to premium")
+
+    async def upgrade_stripe(self) -> None:
+        checkout = await self.call("POST", "/stripe/create-checkout-session", json={"plan": "premium"})
+        payload, headers = self.fakes.stripe_webhook(checkout.json()["session_id"])
+        await self.call("POST", "/stripe/webhook", content=payload, headers=headers)
+
+    async def upgrade_fedapay(self) -> None:
+        checkout = await self.call("POST", "/fedapay/create-checkout-session", json={"plan": "premium"})
+        event = self.fakes.fedapay_webhook(checkout.json()["transaction_id"])
+        await self.call("POST", "/fedapay/webhook", json=event)
+
+    async def run(self, deadline: float) -> None:
+        while time.perf_counter() < deadline:
+            self.headers = {}
+            try:
+                await self.session()
+                self.recorder.sessions += 1
+            except SessionFailed as e:
+                self.recorder.failed_sessions += 1
+                if self.args.verbose:
+                    print(f"[Load test] Session failed: {e}")
+
+
+async def run_stage(client, fakes: FakeProviders, args, users: int, seed: int) -> Dict[str, Any]:
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + args.stage_duration
+    await asyncio.gather(*(
+        VirtualUser(client, fakes, recorder, args, random.Random(f"{seed}-{i}")).run(deadline)
+        for i in range(users)
+    ))
+    return {"virtual_users": users, "duration_s": round(time.perf_counter() - started, 2),
+            **recorder.report(time.perf_counter() - started)}
+
+
+def saturation_point(stages: List[Dict[str, Any]], slo_p95_ms: float, max_error_rate: float,
+                     min_gain: float = 0.1) -> Optional[Dict[str, Any]]:
+    """Premier palier qui dépasse le SLO, le taux d'erreur, ou n'apporte plus de débit."""
+    previous = None
+    for stage in stages:
+        overall = stage["overall"]
+        if overall["p95_ms"] > slo_p95_ms:
+            return {"virtual_users": stage["virtual_users"], "reason": f"p95 {overall['p95_ms']} ms > {slo_p95_ms:g} ms"}
+        if overall["error_rate"] > max_error_rate:
+            return {"virtual_users": stage["virtual_users"], "reason": f"error rate {overall['error_rate']:.2%}"}
+        if previous is not None and stage["virtual_users"] > previous["virtual_users"]:
+            before, after = previous["overall"]["throughput_per_s"], overall["throughput_per_s"]
+            if before and after < before * (1 + min_gain):
+                return {"virtual_users": stage["virtual_users"],
+                        "reason": f"throughput flat ({before:.1f}/s -> {after:.1f}/s)"}
+        previous = stage
+    return None
+
+
+def _in_process_app(fakes: FakeProviders, args):
+    # Configuration lue à l'import de l'application : l'environnement d'abord
+    os.environ.update(fakes.env())
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='cvtor-load-')}/load.db")
+    os.environ.setdefault("EXPORT_WORKERS", "0")
+    os.environ.setdefault("PDF_POOL_WARM", "0")
+    os.environ.setdefault("RENDER_ALLOWED_HOSTS", "")
+    from database.database import Base, engine
+    from api import app
+
+    Base.metadata.create_all(bind=engine)
+    if args.pdf:
+        from benchmarks.run import pdf_available
+        reason = pdf_available()
+        if reason is not None:
+            print(f"[Load test] PDF exports skipped: {reason}")
+            args.pdf = False
+    return app
+
+
+async def main_async(args) -> Dict[str, Any]:
+    import httpx
+
+    fakes = FakeProviders(behaviours_from(args), webhook_secret=args.webhook_secret, seed=args.seed)
+    fakes.start(port=args.fakes_port)
+    try:
+        if args.base_url:
+            client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+        else:
+            app = _in_process_app(fakes, args)
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest",
+                                       timeout=args.timeout)
+        stages = []
+        async with client:
+            for users in [int(u) for u in args.stages.split(",") if u]:
+                print(f"== {users} virtual user(s), {args.stage_duration:g}s")
+                stage = await run_stage(client, fakes, args, users, args.seed)
+                stages.append(stage)
+                overall = stage["overall"]
+                print(
+                    f"  {overall['throughput_per_s']:>8.1f} req/s  p50 {overall['p50_ms']:>8.1f}  "
+                    f"p95 {overall['p95_ms']:>8.1f}  p99 {overall['p99_ms']:>8.1f} ms  "
+                    f"errors {overall['error_rate']:.2%}  sessions {overall['sessions']} "
+                    f"(+{overall['failed_sessions']} failed)"
+                )
+                for endpoint, result in stage["endpoints"].items():
+                    print(f"    {endpoint:<40} n={result['requests']:<5} p50 {result['p50_ms']:>8.1f}  "
+                          f"p95 {result['p95_ms']:>8.1f}  p99 {result['p99_ms']:>8.1f} ms"
+                          + (f"  errors {result['errors']}" if result["errors"] else ""))
+    finally:
+        fakes.stop()
+        if not args.base_url:
+            from services.browser_pool import shutdown_browser_pool
+            shutdown_browser_pool()
+
+    saturation = saturation_point(stages, args.slo_p95_ms, args.max_error_rate)
+    print(f"[Load test] Saturation: {saturation or 'not reached'}")
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "target": args.base_url or "in-process",
+        "config": {key: value for key, value in vars(args).items() if key != "out"},
+        "providers": fakes.stats(),
+        "stages": stages,
+        "saturation": saturation,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Test de charge par sessions d'utilisateurs virtuels")
+    ap.add_argument("--base-url", help="Serveur à tester (défaut : application dans le processus)")
+    ap.add_argument("--stages", default="1,2,5,10,20", help="Utilisateurs virtuels par palier")
+    ap.add_argument("--stage-duration", type=float, default=20, help="Durée d'un palier en secondes")
+    ap.add_argument("--preview-storm", type=int, default=15, help="Aperçus par session")
+    ap.add_argument("--typing-ms", type=float, default=0, help="Pause entre deux aperçus")
+    ap.add_argument("--think-ms", type=float, default=0, help="Pause moyenne entre deux étapes")
+    ap.add_argument("--fedapay-share", type=float, default=0.3, help="Part des passages premium via FedaPay")
+    ap.add_argument("--no-pdf", dest="pdf", action="store_false", help="Ne pas exporter en PDF")
+    ap.add_argument("--slo-p95-ms", type=float, default=2000, help="p95 global au-delà duquel on sature")
+    ap.add_argument("--max-error-rate", type=float, default=0.01, help="Taux d'erreur au-delà duquel on sature")
+    ap.add_argument("--timeout", type=float, default=120, help="Délai d'une requête en secondes")
+    ap.add_argument("--fakes-port", type=int, default=0, help="Port des faux fournisseurs (défaut : libre)")
+    ap.add_argument("--webhook-secret", help="Secret de webhook Stripe partagé avec l'application")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--verbose", action="store_true", help="Afficher chaque session en échec")
+    ap.add_argument("--out", help="Fichier JSON de résultats (défaut loadtest/results/<date>.json)")
+    add_behaviour_arguments(ap)
+    args = ap.parse_args()
+
+    results = asyncio.run(main_async(args))
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"[Load test] Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
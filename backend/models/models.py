@@ -1,14 +1,24 @@
 #!/usr/bin/env python3
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Enum, Float
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Enum, Float, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database.database import Base
 import enum
 
+# JSONB sur PostgreSQL, JSON (texte) ailleurs (SQLite)
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
 class SubscriptionPlan(str, enum.Enum):
     FREE = "free"
     PREMIUM = "premium"
 
+class ExportJobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
 class User(Base):
     __tablename__ = "users"
     
@@ -62,9 +72,38 @@ class Resume(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=False)
     template_name = Column(String, nullable=False)
-    data = Column(Text, nullable=False)
+    data = Column(JSONDocument, nullable=False)
+    # Résumé dérivé de data (nom, intitulé, taille des sections) pour la liste
+    summary = Column(JSONDocument, nullable=True)
     is_public = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Incrémentée à chaque UPDATE (WHERE version = ...) : une écriture concurrente lève StaleDataError
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     user = relationship("User", back_populates="resumes")
+    
+    __mapper_args__ = {"version_id_col": version}
+
+class ExportJob(Base):
+    __tablename__ = "export_jobs"
+    
+    id = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    format = Column(String, nullable=False)
+    resume_ids = Column(Text, nullable=False)
+    status = Column(Enum(ExportJobStatus), default=ExportJobStatus.QUEUED, nullable=False, index=True)
+    progress = Column(Integer, default=0)
+    total = Column(Integer, default=0)
+    attempts = Column(Integer, default=0)
+    artifact_owner = Column(String, nullable=True)
+    artifact_name = Column(String, nullable=True)
+    filename = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    # Signe de vie du worker, à chaque CV rendu : un job sans nouvelles est remis en file
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    
+    user = relationship("User")
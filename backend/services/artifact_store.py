@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Stockage des fichiers exportés (PDF, DOCX, ZIP) avec expiration.
+
+Chaque artefact est rangé sous ARTIFACTS_DIR/<propriétaire>/<id>.<ext> et
+n'est accessible que par une URL signée (HMAC) de courte durée. Un thread
+de nettoyage supprime les artefacts trop vieux et, au-delà de la taille
+globale, les plus anciens. Chaque propriétaire a un quota : un nouvel
+export évince d'abord ses propres artefacts les plus anciens.
+
+Le dossier n'est créé et parcouru (calcul de l'occupation par propriétaire)
+qu'au premier besoin : démarrage du nettoyage ou premier dépôt, pas à l'import.
+
+Configuration (variables d'environnement) :
+  ARTIFACTS_DIR               dossier de stockage (défaut backend/artifacts)
+  ARTIFACTS_MAX_BYTES         taille totale maximum (défaut 1 Go)
+  ARTIFACTS_MAX_AGE           durée de vie en secondes (défaut 86400)
+  ARTIFACTS_USER_QUOTA_BYTES  quota par propriétaire (défaut 50 Mo)
+  ARTIFACTS_URL_TTL           validité d'une URL signée en secondes (défaut 900)
+  ARTIFACTS_SWEEP_INTERVAL    période du nettoyage en secondes (défaut 300)
+  ARTIFACTS_SIGNING_KEY       clé HMAC (défaut : SECRET_KEY)
+"""
+import base64
+import hashlib
+import hmac
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+ARTIFACTS_DIR = Path(os.getenv("ARTIFACTS_DIR", str(Path(__file__).parent.parent / "artifacts")))
+ARTIFACTS_MAX_BYTES = int(os.getenv("ARTIFACTS_MAX_BYTES", str(1024 * 1024 * 1024)))
+ARTIFACTS_MAX_AGE = int(os.getenv("ARTIFACTS_MAX_AGE", "86400"))
+ARTIFACTS_USER_QUOTA_BYTES = int(os.getenv("ARTIFACTS_USER_QUOTA_BYTES", str(50 * 1024 * 1024)))
+ARTIFACTS_URL_TTL = int(os.getenv("ARTIFACTS_URL_TTL", "900"))
+ARTIFACTS_SWEEP_INTERVAL = int(os.getenv("ARTIFACTS_SWEEP_INTERVAL", "300"))
+ARTIFACTS_SIGNING_KEY = os.getenv("ARTIFACTS_SIGNING_KEY") or os.getenv("SECRET_KEY") or "dev-secret-key-change-me"
+
+_SAFE_SEGMENT = re.compile(r"^[A-Za-z0-9_-]+$")
+_SAFE_NAME = re.compile(r"^[0-9a-f]{32}\.[a-z0-9]+$")
+
+
+class ArtifactQuotaExceeded(Exception):
+    pass
+
+
+def owner_for(user_id: Optional[int], client_host: Optional[str] = None) -> str:
+    """Propriétaire d'un artefact : l'utilisateur connecté, sinon l'IP (hachée) du client."""
+    if user_id is not None:
+        return f"user-{user_id}"
+    digest = hashlib.sha256((client_host or "unknown").encode("utf-8")).hexdigest()
+    return f"anon-{digest[:16]}"
+
+
+class Artifact:
+    def __init__(self, owner: str, name: str, path: Path, size: int, created_at: float):
+        self.owner = owner
+        self.name = name
+        self.path = path
+        self.size = size
+        self.created_at = created_at
+
+
+class ArtifactStore:
+    def __init__(
+        self,
+        directory: Path = ARTIFACTS_DIR,
+        max_bytes: int = ARTIFACTS_MAX_BYTES,
+        max_age: int = ARTIFACTS_MAX_AGE,
+        user_quota_bytes: int = ARTIFACTS_USER_QUOTA_BYTES,
+        url_ttl: int = ARTIFACTS_URL_TTL,
+        signing_key: str = ARTIFACTS_SIGNING_KEY,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.user_quota_bytes = user_quota_bytes
+        self.url_ttl = url_ttl
+        self._key = signing_key.encode("utf-8")
+        self._lock = threading.Lock()
+        self._usage: Dict[str, int] = {}
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._ready = False
+
+    def _ensure_ready(self) -> None:
+        # Appelé sous self._lock
+        if self._ready:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for artifact in self._scan():
+            self._usage[artifact.owner] = self._usage.get(artifact.owner, 0) + artifact.size
+        self._ready = True
+
+    # --- Écriture ---
+    def put(self, owner: str, content: bytes, extension: str) -> Artifact:
+        if not _SAFE_SEGMENT.match(owner):
+            raise ValueError(f"Invalid artifact owner: {owner}")
+        if len(content) > self.user_quota_bytes:
+            raise ArtifactQuotaExceeded("Export exceeds the per-user storage quota")
+
+        with self._lock:
+            self._ensure_ready()
+            self._enforce_quota(owner, len(content))
+            owner_dir = self.directory / owner
+            owner_dir.mkdir(exist_ok=True)
+            name = f"{uuid.uuid4().hex}.{extension}"
+            path = owner_dir / name
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(content)
+            os.replace(tmp, path)
+            self._usage[owner] = self._usage.get(owner, 0) + len(content)
+        return Artifact(owner, name, path, len(content), time.time())
+
+    def delete(self, artifact: Artifact) -> None:
+        with self._lock:
+            self._delete(artifact)
+
+    def _enforce_quota(self, owner: str, incoming: int) -> None:
+        used = self._usage.get(owner, 0)
+        if used + incoming <= self.user_quota_bytes:
+            return
+        for artifact in sorted(self._scan(owner), key=lambda a: a.created_at):
+            self._delete(artifact)
+            used -= artifact.size
+            if used + incoming <= self.user_quota_bytes:
+                break
+
+    # --- Lecture / URLs signées ---
+    def get(self, owner: str, name: str) -> Optional[Artifact]:
+        if not _SAFE_SEGMENT.match(owner) or not _SAFE_NAME.match(name):
+            return None
+        path = self.directory / owner / name
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return Artifact(owner, name, path, stat.st_size, stat.st_mtime)
+
+    def _signature(self, owner: str, name: str, expires: int, filename: str) -> str:
+        message = f"{owner}/{name}:{expires}:{filename}".encode("utf-8")
+        digest = hmac.new(self._key, message, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+    def signed_url(self, artifact: Artifact, filename: str, ttl: Optional[int] = None) -> Tuple[str, int]:
+        expires = int(time.time()) + (ttl if ttl is not None else self.url_ttl)
+        query = urlencode({
+            "expires": expires,
+            "filename": filename,
+            "sig": self._signature(artifact.owner, artifact.name, expires, filename),
+        })
+        return f"/artifacts/{artifact.owner}/{artifact.name}?{query}", expires
+
+    def resolve(self, owner: str, name: str, expires: int, filename: str, sig: str) -> Optional[Path]:
+        """Renvoie le chemin de l'artefact si la signature est valide et non expirée."""
+        if not _SAFE_SEGMENT.match(owner) or not _SAFE_NAME.match(name):
+            return None
+        if expires < time.time():
+            return None
+        expected = self._signature(owner, name, expires, filename)
+        if not hmac.compare_digest(expected, sig):
+            return None
+        path = self.directory / owner / name
+        return path if path.exists() else None
+
+    # --- Nettoyage ---
+    def _scan(self, owner: Optional[str] = None) -> List[Artifact]:
+        pattern = f"{owner}/*.*" if owner else "*/*.*"
+        artifacts = []
+        for path in self.directory.glob(pattern):
+            if path.suffix == ".tmp":
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            artifacts.append(Artifact(path.parent.name, path.name, path, stat.st_size, stat.st_mtime))
+        return artifacts
+
+    def _delete(self, artifact: Artifact) -> None:
+        try:
+            artifact.path.unlink()
+        except FileNotFoundError:
+            return
+        self._usage[artifact.owner] = max(0, self._usage.get(artifact.owner, 0) - artifact.size)
+
+    def sweep(self) -> int:
+        """Supprime les artefacts expirés puis les plus anciens au-delà de max_bytes."""
+        removed = 0
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            self._ensure_ready()
+            artifacts = sorted(self._scan(), key=lambda a: a.created_at)
+            total = sum(a.size for a in artifacts)
+            for artifact in artifacts:
+                if artifact.created_at >= cutoff and total <= self.max_bytes:
+                    break
+                self._delete(artifact)
+                total -= artifact.size
+                removed += 1
+            for owner_dir in self.directory.iterdir():
+                if owner_dir.is_dir() and not any(owner_dir.iterdir()):
+                    owner_dir.rmdir()
+                    self._usage.pop(owner_dir.name, None)
+        if removed:
+            print(f"[Artifacts] Swept {removed} artifact(s)")
+        return removed
+
+    def start_sweeper(self, interval: int = ARTIFACTS_SWEEP_INTERVAL) -> None:
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            self._ensure_ready()
+        self._stop.clear()
+
+        def _loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"[Artifacts] Sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=_loop, name="artifact-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self) -> None:
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join(timeout=5)
+            self._sweeper = None
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            self._ensure_ready()
+            return {
+                "bytes": sum(self._usage.values()),
+                "max_bytes": self.max_bytes,
+                "owners": len(self._usage),
+                "user_quota_bytes": self.user_quota_bytes,
+            }
+
+
+artifact_store = ArtifactStore()
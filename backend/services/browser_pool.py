@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Pool de navigateurs Chromium persistants pour la génération PDF.
+
+Les navigateurs sont lancés une seule fois puis réutilisés : chaque export
+emprunte une page (slot) au lieu de démarrer un Chromium complet.
+Playwright (API async) tourne dans un thread dédié avec sa propre boucle
+asyncio, ce qui permet de l'utiliser depuis les routes async FastAPI
+(`run_async`) comme depuis du code synchrone ou le CLI (`run`). Les
+requêtes réseau des pages passent par services/render_network.py.
+
+Configuration (variables d'environnement) :
+  PDF_POOL_BROWSERS           nombre de processus Chromium (défaut 2)
+  PDF_POOL_PAGES_PER_BROWSER  pages simultanées par navigateur (défaut 2)
+  PDF_POOL_MAX_RENDERS        rendus avant recyclage d'un navigateur (défaut 200)
+  PDF_RENDER_TIMEOUT          durée maximum d'un rendu en secondes (défaut 30) ; au-delà
+                              la page est fermée, ou le navigateur tué s'il ne répond plus
+  PDF_BROWSER_MAX_RSS_MB      mémoire (RSS, processus enfants compris) au-delà de laquelle
+                              un navigateur est recyclé (défaut 1024, 0 = pas de limite ;
+                              nécessite psutil)
+"""
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional, TypeVar
+
+if TYPE_CHECKING:
+    from playwright.async_api import Browser, Page
+
+from services.metrics import render_stage_seconds
+from services.render_network import render_network
+
+PDF_POOL_BROWSERS = int(os.getenv("PDF_POOL_BROWSERS", "2"))
+PDF_POOL_PAGES_PER_BROWSER = int(os.getenv("PDF_POOL_PAGES_PER_BROWSER", "2"))
+PDF_POOL_MAX_RENDERS = int(os.getenv("PDF_POOL_MAX_RENDERS", "200"))
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", "30"))
+PDF_BROWSER_MAX_RSS_MB = int(os.getenv("PDF_BROWSER_MAX_RSS_MB", "1024"))
+
+# Délai accordé à une page bloquée pour se fermer avant de tuer son navigateur
+PAGE_CLOSE_TIMEOUT = 5
+
+T = TypeVar("T")
+
+
+class RenderTimeout(TimeoutError):
+    pass
+
+
+def _playwright_error() -> type:
+    # Playwright n'est importé qu'au démarrage du pool (premier export PDF ou préchargement)
+    from playwright.async_api import Error
+    return Error
+
+
+def _psutil():
+    try:
+        import psutil
+        return psutil
+    except ImportError:
+        return None
+
+
+class _PooledBrowser:
+    """Un processus Chromium du pool et ses compteurs."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.browser: Optional["Browser"] = None
+        self.generation = 0
+        self.renders = 0
+        self.active = 0
+        self.recycle = False
+        self.tag = ""
+        self.process = None
+        self.lock = asyncio.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        return self.browser is not None and self.browser.is_connected()
+
+
+class _PageSlot:
+    """Une page réutilisable rattachée à un navigateur du pool."""
+
+    def __init__(self, owner: _PooledBrowser):
+        self.owner = owner
+        self.page: Optional["Page"] = None
+        self.generation = -1
+
+
+class BrowserPool:
+    def __init__(
+        self,
+        browsers: int = PDF_POOL_BROWSERS,
+        pages_per_browser: int = PDF_POOL_PAGES_PER_BROWSER,
+        max_renders: int = PDF_POOL_MAX_RENDERS,
+        render_timeout: float = PDF_RENDER_TIMEOUT,
+        max_rss_mb: int = PDF_BROWSER_MAX_RSS_MB,
+    ):
+        self.browsers = max(1, browsers)
+        self.pages_per_browser = max(1, pages_per_browser)
+        self.max_renders = max(1, max_renders)
+        self.render_timeout = render_timeout
+        self.max_rss_mb = max_rss_mb if _psutil() is not None else 0
+        if max_rss_mb and not self.max_rss_mb:
+            print("[PDF Pool] psutil is not installed; browser memory ceiling disabled")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._playwright = None
+        self._pool: List[_PooledBrowser] = []
+        self._free: Optional[asyncio.Queue] = None
+        self._start_lock = threading.Lock()
+        self._started = False
+
+    # --- Cycle de vie ---
+    def start(self) -> None:
+        """Démarre le thread Playwright et lance les navigateurs (idempotent)."""
+        with self._start_lock:
+            if self._started:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run_loop, name="pdf-browser-pool", daemon=True)
+            self._thread.start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._astart(), self._loop).result()
+            except Exception:
+                asyncio.run_coroutine_threadsafe(self._astop(), self._loop).result(timeout=30)
+                self._stop_loop()
+                raise
+            self._started = True
+
+    def stop(self) -> None:
+        with self._start_lock:
+            if not self._started:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._astop(), self._loop).result(timeout=30)
+            finally:
+                self._stop_loop()
+                self._started = False
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _stop_loop(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+
+    async def _astart(self) -> None:
+        from playwright.async_api import async_playwright
+
+        self._playwright = await async_playwright().start()
+        self._pool = [_PooledBrowser(i) for i in range(self.browsers)]
+        self._free = asyncio.Queue()
+        for pooled in self._pool:
+            await self._launch(pooled)
+            for _ in range(self.pages_per_browser):
+                self._free.put_nowait(_PageSlot(pooled))
+        print(f"[PDF Pool] Ready: {self.browsers} browser(s) x {self.pages_per_browser} page(s)")
+
+    async def _astop(self) -> None:
+        for pooled in self._pool:
+            await self._close_browser(pooled)
+        await render_network.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        print("[PDF Pool] Stopped")
+
+    async def _launch(self, pooled: _PooledBrowser) -> None:
+        await self._close_browser(pooled)
+        # Option inerte pour Chromium, qui permet de retrouver le processus avec psutil
+        pooled.tag = f"--cvtor-pool={os.getpid()}-{pooled.index}-{pooled.generation + 1}"
+        pooled.browser = await self._playwright.chromium.launch(args=[pooled.tag])
+        pooled.generation += 1
+        pooled.renders = 0
+        pooled.recycle = False
+        pooled.process = None
+        print(f"[PDF Pool] Browser #{pooled.index} launched (generation {pooled.generation})")
+
+    async def _close_browser(self, pooled: _PooledBrowser) -> None:
+        if pooled.browser is None:
+            return
+        try:
+            await asyncio.wait_for(pooled.browser.close(), PAGE_CLOSE_TIMEOUT)
+        except (_playwright_error(), asyncio.TimeoutError):
+            self._kill_process(pooled)
+        pooled.browser = None
+        pooled.process = None
+
+    # --- Surveillance des processus ---
+    def _browser_process(self, pooled: _PooledBrowser):
+        psutil = _psutil()
+        if psutil is None or not pooled.tag:
+            return None
+        if pooled.process is not None and pooled.process.is_running():
+            return pooled.process
+        try:
+            for child in psutil.Process().children(recursive=True):
+                cmdline = child.cmdline()
+                if pooled.tag in cmdline and "--type=renderer" not in " ".join(cmdline):
+                    pooled.process = child
+                    return child
+        except psutil.Error:
+            pass
+        return None
+
+    def _rss_mb(self, pooled: _PooledBrowser) -> float:
+        psutil = _psutil()
+        root = self._browser_process(pooled)
+        if root is None:
+            return 0.0
+        total = 0
+        try:
+            for proc in [root] + root.children(recursive=True):
+                try:
+                    total += proc.memory_info().rss
+                except psutil.Error:
+                    continue
+        except psutil.Error:
+            return 0.0
+        return total / (1024 * 1024)
+
+    def _kill_process(self, pooled: _PooledBrowser) -> None:
+        psutil = _psutil()
+        root = self._browser_process(pooled)
+        if root is None:
+            return
+        print(f"[PDF Pool] Killing browser #{pooled.index} (pid {root.pid})")
+        try:
+            for proc in root.children(recursive=True) + [root]:
+                try:
+                    proc.kill()
+                except psutil.Error:
+                    continue
+        except psutil.Error:
+            pass
+
+    async def _kill_browser(self, pooled: _PooledBrowser) -> None:
+        """Navigateur qui ne répond plus : processus tué, relancé au prochain emprunt."""
+        self._kill_process(pooled)
+        await self._close_browser(pooled)
+
+    def _check_memory(self, pooled: _PooledBrowser) -> None:
+        if not self.max_rss_mb or pooled.recycle or not pooled.healthy:
+            return
+        rss = self._rss_mb(pooled)
+        if rss > self.max_rss_mb:
+            print(f"[PDF Pool] Browser #{pooled.index} uses {rss:.0f} MB (> {self.max_rss_mb} MB), recycling")
+            pooled.recycle = True
+
+    # --- Emprunt de pages ---
+    @asynccontextmanager
+    async def lease(self):
+        """Emprunte une page du pool ; à utiliser dans la boucle du pool."""
+        started = time.perf_counter()
+        slot: _PageSlot = await self._free.get()
+        pooled = slot.owner
+        try:
+            async with pooled.lock:
+                recycle = (pooled.renders >= self.max_renders or pooled.recycle) and pooled.active == 0
+                if not pooled.healthy or recycle:
+                    if recycle:
+                        print(f"[PDF Pool] Recycling browser #{pooled.index} after {pooled.renders} renders")
+                    await self._launch(pooled)
+                if slot.page is None or slot.generation != pooled.generation or slot.page.is_closed():
+                    slot.page = await pooled.browser.new_page()
+                    slot.generation = pooled.generation
+                    await render_network.install(slot.page)
+                pooled.active += 1
+            # Attente d'un slot, relance éventuelle du navigateur et ouverture de la page
+            render_stage_seconds.observe(time.perf_counter() - started, stage="browser_acquire")
+            try:
+                yield slot.page
+                pooled.renders += 1
+            except (_playwright_error(), RenderTimeout, asyncio.CancelledError):
+                # Page (ou navigateur) dans un état inconnu, rendu trop long ou
+                # abandonné : on la jette, le navigateur est relancé au prochain
+                # emprunt s'il a planté ou a dû être tué.
+                await self._discard_page(slot)
+                raise
+            finally:
+                pooled.active -= 1
+                self._check_memory(pooled)
+        finally:
+            self._free.put_nowait(slot)
+
+    async def _discard_page(self, slot: _PageSlot) -> None:
+        page, slot.page = slot.page, None
+        if page is not None and not page.is_closed():
+            try:
+                await asyncio.wait_for(page.close(), PAGE_CLOSE_TIMEOUT)
+            except _playwright_error():
+                pass
+            except asyncio.TimeoutError:
+                await self._kill_browser(slot.owner)
+
+    def _submit(self, fn: Callable[["Page"], Awaitable[T]], timeout: Optional[float] = None):
+        timeout = self.render_timeout if timeout is None else timeout
+
+        async def _job():
+            async with self.lease() as page:
+                if not timeout:
+                    return await fn(page)
+                try:
+                    return await asyncio.wait_for(fn(page), timeout)
+                except asyncio.TimeoutError:
+                    raise RenderTimeout(f"PDF rendering exceeded {timeout:g}s")
+
+        return asyncio.run_coroutine_threadsafe(_job(), self._loop)
+
+    def run(self, fn: Callable[["Page"], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        """Exécute `fn(page)` sur une page empruntée et renvoie son résultat (bloquant).
+
+        `timeout` remplace PDF_RENDER_TIMEOUT pour ce rendu (0 = sans limite).
+        """
+        self.start()
+        return self._submit(fn, timeout).result()
+
+    async def run_async(self, fn: Callable[["Page"], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        """Variante awaitable de `run` ; annuler l'appelant annule aussi le rendu."""
+        if not self._started:
+            await asyncio.to_thread(self.start)
+        return await asyncio.wrap_future(self._submit(fn, timeout))
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+        return _pool
+
+
+def shutdown_browser_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.stop()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+ETags et requêtes conditionnelles (RFC 9110).
+
+Les routes de lecture (CV, modèles, catalogue) renvoient un ETag fort :
+  - CV : identifiant + colonne version, incrémentée à chaque UPDATE ;
+  - modèles et catalogue : empreinte des octets JSON renvoyés, calculée
+    une fois et gardée avec la réponse sérialisée.
+Un GET avec If-None-Match égal reçoit 304 sans corps : le document n'est ni
+relu en entier ni resérialisé. Les écritures (PUT, PATCH, DELETE d'un CV)
+acceptent If-Match : si le CV a changé depuis la lecture, 412 au lieu
+d'écraser la modification d'un autre onglet ou appareil.
+"""
+import hashlib
+import json
+from typing import Any, Iterable, List, Tuple
+
+from fastapi import HTTPException, Request, Response, status
+
+from services.metrics import metrics
+
+# Révalidation à chaque usage : le client garde sa copie et envoie If-None-Match
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+PUBLIC_CACHE_CONTROL = "public, no-cache"
+
+conditional_requests = metrics.counter(
+    "cvtor_conditional_requests", "Conditional requests by route and outcome", ["route", "result"]
+)
+
+
+def strong_etag(content: bytes) -> str:
+    return '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+
+
+def json_bytes(content: Any) -> bytes:
+    # Même encodage que JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def json_with_etag(content: Any) -> Tuple[bytes, str]:
+    """Corps JSON sérialisé une fois et son ETag, à garder ensemble."""
+    body = json_bytes(content)
+    return body, strong_etag(body)
+
+
+def _tags(header: str) -> List[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def none_match(request: Request, etag: str, route: str) -> bool:
+    """Vrai si If-None-Match désigne `etag` (comparaison faible) : répondre 304."""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    matched = any(tag == "*" or _opaque(tag) == _opaque(etag) for tag in _tags(header))
+    conditional_requests.inc(route=route, result="not_modified" if matched else "modified")
+    return matched
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def cached_json(request: Request, body: bytes, etag: str, route: str,
+                cache_control: str = PUBLIC_CACHE_CONTROL) -> Response:
+    """304 si le client a déjà ce corps, sinon le corps déjà sérialisé."""
+    if none_match(request, etag, route):
+        return not_modified(etag, cache_control)
+    return Response(content=body, media_type="application/json",
+                    headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def check_if_match(request: Request, etag: str, route: str) -> None:
+    """412 si If-Match est présent et ne désigne pas `etag` (comparaison forte)."""
+    header = request.headers.get("if-match")
+    if header is None:
+        return
+    tags = _tags(header)
+    if "*" in tags or etag in tags:
+        return
+    conditional_requests.inc(route=route, result="precondition_failed")
+    raise HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail="Resource was modified since it was read",
+        headers={"ETag": etag},
+    )
+
+
+def etag_of(parts: Iterable[Any]) -> str:
+    """ETag fort dérivé de valeurs qui changent avec la représentation (id, version...)."""
+    return strong_etag("|".join(str(part) for part in parts).encode("utf-8"))
@@ -4,8 +4,10 @@ Export DOCX à partir du JSON de contenu du CV
 Utilise python-docx. Entrée: fichier JSON (même structure que data/*.json)
 """
 import argparse
+import io
 import json
 from pathlib import Path
+from typing import Any, Dict
 from docx import Document
 from docx.shared import Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
@@ -36,8 +38,7 @@ def add_bullets(doc: Document, items):
         doc.add_paragraph(str(it), style="List Bullet")
 
 
-def export_docx(data_json_path: Path, out_docx_path: Path):
-    data = load_json(data_json_path)
+def build_docx(data: Dict[str, Any]) -> Document:
     d_profile = data.get("profile", {})
     d_contacts = (d_profile or {}).get("contacts", {})
 
@@ -107,7 +108,18 @@ def export_docx(data_json_path: Path, out_docx_path: Path):
             if year:
                 doc.add_paragraph(str(year))
 
-    doc.save(str(out_docx_path))
+    return doc
+
+
+def export_docx_bytes(data: Dict[str, Any]) -> bytes:
+    """Construit le DOCX en mémoire et renvoie son contenu"""
+    buffer = io.BytesIO()
+    build_docx(data).save(buffer)
+    return buffer.getvalue()
+
+
+def export_docx(data_json_path: Path, out_docx_path: Path):
+    out_docx_path.write_bytes(export_docx_bytes(load_json(data_json_path)))
     return out_docx_path
 
 
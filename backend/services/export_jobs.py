@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+File d'attente des exports en arrière-plan.
+
+Les jobs sont stockés dans la table export_jobs (SQLite ou Postgres, pas de
+broker externe). Un pool de threads les réclame un par un (UPDATE
+conditionnel sur le statut, sûr entre plusieurs processus) — ceux des
+comptes premium d'abord, puis par ancienneté — rend chaque CV
+via le pool de navigateurs et dépose le résultat (fichier unique ou ZIP)
+dans l'artifact store.
+
+Les rendus passent par l'ordonnanceur (services/render_limiter.py), dans la
+lane et sous l'identité du propriétaire du job : ils partagent les pages du
+pool avec les requêtes HTTP et apparaissent dans GET /exports/queue. Comme
+l'ordonnanceur n'est pas thread-safe, les workers lui soumettent leurs
+rendus sur la boucle de l'application (celle passée à start()) ; le worker
+autonome démarre sa propre boucle.
+
+Chaque réclamation incrémente `attempts` : le worker n'écrit dans le job
+(progression, résultat) que si `attempts` vaut toujours sa tentative. Un
+job remis en file puis réclamé ailleurs n'est donc jamais terminé deux
+fois ; l'ancien worker abandonne et supprime son artefact.
+
+Configuration (variables d'environnement) :
+  EXPORT_WORKERS        threads de travail par processus (défaut 2, 0 = aucun)
+  EXPORT_POLL_INTERVAL  période de scrutation de la table en secondes (défaut 2)
+  EXPORT_JOB_TIMEOUT    un job "running" sans signe de vie depuis plus longtemps est
+                        remis en file (défaut 600) ; le worker met à jour
+                        heartbeat_at à chaque CV rendu
+  EXPORT_MAX_ATTEMPTS   tentatives maximum par job (défaut 3) : un échec (délai de
+                        rendu dépassé, navigateur planté) remet le job en file
+                        tant qu'il en reste ; un job abandonné compte aussi
+  EXPORT_MAX_BATCH      CV maximum par job (défaut 50)
+
+Usage (worker autonome, depuis backend/) :
+  python -m services.export_jobs
+"""
+import asyncio
+import io
+import json
+import os
+import threading
+import traceback
+import uuid
+import zipfile
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from models.models import ExportJob, ExportJobStatus, Resume, SubscriptionPlan, User
+from services.artifact_store import ArtifactQuotaExceeded, artifact_store, owner_for
+from services.exports import render_docx_patiently, render_pdf_patiently, render_priority, safe_stem
+from services.template_registry import TemplateNotFound
+
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_POLL_INTERVAL = float(os.getenv("EXPORT_POLL_INTERVAL", "2"))
+EXPORT_JOB_TIMEOUT = int(os.getenv("EXPORT_JOB_TIMEOUT", "600"))
+EXPORT_MAX_ATTEMPTS = int(os.getenv("EXPORT_MAX_ATTEMPTS", "3"))
+EXPORT_MAX_BATCH = int(os.getenv("EXPORT_MAX_BATCH", "50"))
+
+# Échecs qui se reproduiraient à l'identique : pas de nouvelle tentative
+PERMANENT_ERRORS = (ValueError, ArtifactQuotaExceeded, TemplateNotFound)
+
+
+class JobLost(Exception):
+    """Le job a été remis en file, ou réclamé par un autre worker, pendant son exécution."""
+
+
+def enqueue_export(db: Session, user_id: int, fmt: str, resume_ids: List[int]) -> ExportJob:
+    job = ExportJob(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        format=fmt,
+        resume_ids=json.dumps(resume_ids),
+        status=ExportJobStatus.QUEUED,
+        total=len(resume_ids),
+        progress=0,
+        attempts=0,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    export_workers.notify()
+    return job
+
+
+def _claim_order():
+    # Jobs premium d'abord, puis du plus ancien au plus récent
+    premium_first = case((User.subscription_plan == SubscriptionPlan.PREMIUM, 0), else_=1)
+    return premium_first, ExportJob.created_at
+
+
+def queue_position(db: Session, job: ExportJob) -> Optional[int]:
+    """Rang (1 = prochain réclamé) d'un job en file, dans l'ordre utilisé par les workers."""
+    if job.status != ExportJobStatus.QUEUED:
+        return None
+    premium = db.query(User.subscription_plan).filter(User.id == job.user_id).scalar() == SubscriptionPlan.PREMIUM
+    ahead = (
+        db.query(ExportJob.id)
+        .join(User, User.id == ExportJob.user_id)
+        .filter(ExportJob.status == ExportJobStatus.QUEUED, ExportJob.id != job.id)
+    )
+    if premium:
+        ahead = ahead.filter(User.subscription_plan == SubscriptionPlan.PREMIUM, ExportJob.created_at <= job.created_at)
+    else:
+        ahead = ahead.filter(
+            (User.subscription_plan == SubscriptionPlan.PREMIUM) | (ExportJob.created_at <= job.created_at)
+        )
+    return ahead.count() + 1
+
+
+def job_status(job: ExportJob, db: Optional[Session] = None) -> Dict[str, Any]:
+    status: Dict[str, Any] = {
+        "id": job.id,
+        "status": job.status.value,
+        "format": job.format,
+        "progress": job.progress,
+        "total": job.total,
+        "error": job.error,
+        "created_at": str(job.created_at),
+        "finished_at": str(job.finished_at) if job.finished_at else None,
+        "url": None,
+        "expires_at": None,
+        "queue_position": queue_position(db, job) if db is not None else None,
+    }
+    if job.status == ExportJobStatus.DONE and job.artifact_name:
+        artifact = artifact_store.get(job.artifact_owner, job.artifact_name)
+        if artifact is None:
+            status["error"] = "Export expired"
+        else:
+            status["url"], status["expires_at"] = artifact_store.signed_url(artifact, job.filename)
+    return status
+
+
+def render_resume(resume: Resume, fmt: str, loop: asyncio.AbstractEventLoop,
+                  plan: Optional[str] = None, user: Optional[str] = None) -> bytes:
+    """Rend un CV depuis un thread de worker : le rendu est ordonnancé sur `loop`, qui l'attend à son tour."""
+    if fmt == "pdf":
+        rendering = render_pdf_patiently(resume.template_name, resume.data, plan, user)
+    else:
+        rendering = render_docx_patiently(resume.data, plan, user)
+    return asyncio.run_coroutine_threadsafe(rendering, loop).result()
+
+
+def resume_entry_name(resume: Resume, fmt: str) -> str:
+    return f"{resume.id}_{safe_stem(resume.title)}.{fmt}"
+
+
+class ExportWorkerPool:
+    def __init__(self, workers: int = EXPORT_WORKERS, poll_interval: float = EXPORT_POLL_INTERVAL):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """`loop` : boucle où vit l'ordonnanceur des rendus ; sans elle, une boucle dédiée est démarrée."""
+        if self._threads or self.workers <= 0:
+            return
+        self._stop.clear()
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(target=loop.run_forever, name="export-render-loop", daemon=True)
+            self._loop_thread.start()
+        self._loop = loop
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"export-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"[Export jobs] {self.workers} worker(s) started")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=30)
+        self._threads = []
+        if self._loop_thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(timeout=5)
+            self._loop.close()
+            self._loop_thread = None
+        self._loop = None
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                claimed = self._claim()
+            except Exception as e:
+                print(f"[Export jobs] Claim failed: {e}")
+                claimed = None
+            if claimed is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._execute(*claimed)
+
+    def _claim(self) -> Optional[Tuple[str, int]]:
+        db = SessionLocal()
+        try:
+            self._requeue_stale(db)
+            candidates = (
+                db.query(ExportJob.id)
+                .join(User, User.id == ExportJob.user_id)
+                .filter(ExportJob.status == ExportJobStatus.QUEUED)
+                .order_by(*_claim_order())
+                .limit(5)
+                .all()
+            )
+            for (job_id,) in candidates:
+                # UPDATE conditionnel : un seul worker (même dans un autre processus) gagne
+                claimed = (
+                    db.query(ExportJob)
+                    .filter(ExportJob.id == job_id, ExportJob.status == ExportJobStatus.QUEUED)
+                    .update(
+                        {
+                            ExportJob.status: ExportJobStatus.RUNNING,
+                            ExportJob.started_at: datetime.utcnow(),
+                            ExportJob.heartbeat_at: datetime.utcnow(),
+                            ExportJob.attempts: ExportJob.attempts + 1,
+                        },
+                        synchronize_session=False,
+                    )
+                )
+                db.commit()
+                if claimed:
+                    attempt = db.query(ExportJob.attempts).filter(ExportJob.id == job_id).scalar()
+                    return job_id, attempt
+            return None
+        finally:
+            db.close()
+
+    def _requeue_stale(self, db: Session) -> None:
+        cutoff = datetime.utcnow() - timedelta(seconds=EXPORT_JOB_TIMEOUT)
+        last_seen = func.coalesce(ExportJob.heartbeat_at, ExportJob.started_at)
+        stale = db.query(ExportJob.id, ExportJob.attempts).filter(
+            ExportJob.status == ExportJobStatus.RUNNING,
+            last_seen < cutoff,
+        )
+        for job_id, attempts in stale.all():
+            if attempts >= EXPORT_MAX_ATTEMPTS:
+                values = {
+                    ExportJob.status: ExportJobStatus.FAILED,
+                    ExportJob.error: "Export timed out",
+                    ExportJob.finished_at: datetime.utcnow(),
+                }
+            else:
+                values = {ExportJob.status: ExportJobStatus.QUEUED, ExportJob.progress: 0}
+            # Conditionnel : un worker qui vient de donner signe de vie garde son job
+            requeued = (
+                db.query(ExportJob)
+                .filter(
+                    ExportJob.id == job_id,
+                    ExportJob.status == ExportJobStatus.RUNNING,
+                    ExportJob.attempts == attempts,
+                    last_seen < cutoff,
+                )
+                .update(values, synchronize_session=False)
+            )
+            if requeued:
+                print(f"[Export jobs] Job {job_id} stale, now {values[ExportJob.status].value}")
+        db.commit()
+
+    def _write(self, db: Session, job_id: str, attempt: int, values: Dict[Any, Any]) -> None:
+        # N'écrit que si le job est toujours à nous (même tentative, toujours "running")
+        updated = (
+            db.query(ExportJob)
+            .filter(
+                ExportJob.id == job_id,
+                ExportJob.status == ExportJobStatus.RUNNING,
+                ExportJob.attempts == attempt,
+            )
+            .update({ExportJob.heartbeat_at: datetime.utcnow(), **values}, synchronize_session=False)
+        )
+        db.commit()
+        if not updated:
+            raise JobLost(job_id)
+
+    def _execute(self, job_id: str, attempt: int) -> None:
+        db = SessionLocal()
+        artifact = None
+        try:
+            job = db.query(ExportJob).filter(ExportJob.id == job_id).first()
+            resume_ids = json.loads(job.resume_ids)
+            resumes = db.query(Resume).filter(
+                Resume.user_id == job.user_id,
+                Resume.id.in_(resume_ids),
+            ).all()
+            if not resumes:
+                raise ValueError("No resumes to export")
+            resumes.sort(key=lambda r: resume_ids.index(r.id))
+            self._write(db, job_id, attempt, {ExportJob.total: len(resumes)})
+            plan, user = render_priority(db.query(User).filter(User.id == job.user_id).first())
+
+            files = []
+            for resume in resumes:
+                content = render_resume(resume, job.format, self._loop, plan, user)
+                files.append((resume_entry_name(resume, job.format), content))
+                self._write(db, job_id, attempt, {ExportJob.progress: len(files)})
+
+            if len(files) == 1:
+                filename, content = files[0]
+                extension = job.format
+            else:
+                buffer = io.BytesIO()
+                with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+                    for name, data in files:
+                        archive.writestr(name, data)
+                filename, content, extension = f"CVs_{job.id[:8]}.zip", buffer.getvalue(), "zip"
+
+            artifact = artifact_store.put(owner_for(job.user_id), content, extension)
+            self._write(db, job_id, attempt, {
+                ExportJob.artifact_owner: artifact.owner,
+                ExportJob.artifact_name: artifact.name,
+                ExportJob.filename: filename,
+                ExportJob.status: ExportJobStatus.DONE,
+                ExportJob.finished_at: datetime.utcnow(),
+            })
+            print(f"[Export jobs] Job {job_id} done ({len(files)} file(s))")
+        except JobLost:
+            # Un autre worker a repris le job : son résultat seul compte
+            if artifact is not None:
+                artifact_store.delete(artifact)
+            print(f"[Export jobs] Job {job_id} attempt {attempt} no longer owned, result dropped")
+        except Exception as e:
+            db.rollback()
+            traceback.print_exc()
+            if attempt < EXPORT_MAX_ATTEMPTS and not isinstance(e, PERMANENT_ERRORS):
+                values = {ExportJob.status: ExportJobStatus.QUEUED, ExportJob.progress: 0}
+                print(f"[Export jobs] Job {job_id} attempt {attempt} failed, requeued: {e}")
+            else:
+                values = {
+                    ExportJob.status: ExportJobStatus.FAILED,
+                    ExportJob.error: str(e)[:500],
+                    ExportJob.finished_at: datetime.utcnow(),
+                }
+            try:
+                self._write(db, job_id, attempt, values)
+            except JobLost:
+                pass
+        finally:
+            db.close()
+
+
+export_workers = ExportWorkerPool()
+
+
+def main():
+    import signal
+
+    pool = ExportWorkerPool(workers=max(1, EXPORT_WORKERS))
+    pool.start()
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    try:
+        stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+        from services.browser_pool import shutdown_browser_pool
+        shutdown_browser_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Rendu des exports PDF/DOCX partagé par les routes HTTP et les workers.
+
+Chaque fonction consulte d'abord le cache de rendu : un export déjà
+produit pour le même modèle et les mêmes données est renvoyé sans
+repasser par Chromium ni python-docx. Les rendus PDF et DOCX passent par
+l'ordonnanceur (services/render_limiter.py) avec la formule et l'identité
+du demandeur, y compris ceux des jobs d'export (services/export_jobs.py).
+"""
+import asyncio
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from services.artifact_store import owner_for
+from services.browser_pool import RenderTimeout
+from services.generate_pdf_from_html import (
+    html_batch_to_pdf_bytes_async, html_to_pdf_bytes_async, is_degraded,
+)
+from services.metrics import render_failures, stage
+from services.render_cache import cache_key, render_cache
+from services.render_limiter import PDF_MAX_CONCURRENT_RENDERS, RenderQueueFull, get_render_limiter
+from services.template_registry import registry as template_registry, render_batch_html, render_html_checked
+
+PDF_MEDIA_TYPE = "application/pdf"
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+ZIP_MEDIA_TYPE = "application/zip"
+
+MEDIA_TYPES = {"pdf": PDF_MEDIA_TYPE, "docx": DOCX_MEDIA_TYPE, "zip": ZIP_MEDIA_TYPE}
+
+
+def safe_stem(name: Optional[str]) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]", "_", name or "").strip("._") or "CV"
+
+
+def export_filename(out: Optional[str], extension: str) -> str:
+    # Le nom demandé ne sert qu'au Content-Disposition : on n'en garde que le nom de base
+    return f"{safe_stem(Path(out).stem if out else '')}.{extension}"
+
+
+def render_priority(user: Optional[Any], client_host: Optional[str] = None) -> Tuple[str, str]:
+    """(formule, identité) d'un demandeur pour l'ordonnanceur ; les anonymes sont en lane free."""
+    plan = getattr(getattr(user, "subscription_plan", None), "value", None) or "free"
+    return plan, owner_for(getattr(user, "id", None), client_host)
+
+
+@contextmanager
+def _counting_failures(fmt: str):
+    try:
+        yield
+    except RenderQueueFull:
+        render_failures.inc(format=fmt, reason="queue_full")
+        raise
+    except RenderTimeout:
+        render_failures.inc(format=fmt, reason="timeout")
+        raise
+    except asyncio.CancelledError:
+        render_failures.inc(format=fmt, reason="cancelled")
+        raise
+    except Exception:
+        render_failures.inc(format=fmt, reason="error")
+        raise
+
+
+def _store(key: str, content: bytes, degraded: bool) -> None:
+    # Image manquante (non mise en cache, ou pixel vide dans la page) : ce rendu
+    # n'est pas gardé, le suivant retentera l'image (IMAGES_RETRY_AFTER)
+    if degraded or is_degraded(content):
+        print("[Exports] Render with missing images not cached")
+        return
+    render_cache.put(key, content)
+
+
+def _pdf_key(template_name: str, data: Dict[str, Any]) -> str:
+    version = template_registry.get(template_name).version
+    return cache_key("pdf", data, template_name, version)
+
+
+async def render_pdf(template_name: str, data: Dict[str, Any],
+                     plan: Optional[str] = None, user: Optional[str] = None) -> bytes:
+    """PDF depuis une route async : ordonnancé par formule et par utilisateur (peut lever RenderQueueFull)."""
+    key = _pdf_key(template_name, data)
+    pdf_bytes = render_cache.get(key)
+    if pdf_bytes is None:
+        with _counting_failures("pdf"):
+            # Le premier rendu peut télécharger des images : hors de la boucle d'événements
+            html, degraded = await run_in_threadpool(render_html_checked, template_name, data, True)
+            async with get_render_limiter().slot(plan, user):
+                pdf_bytes = await html_to_pdf_bytes_async(html)
+        _store(key, pdf_bytes, degraded)
+    return pdf_bytes
+
+
+async def render_pdf_batch(items: List[Tuple[str, Dict[str, Any]]],
+                           plan: Optional[str] = None, user: Optional[str] = None) -> bytes:
+    """Plusieurs CV en un seul PDF (un par page), pour un seul passage dans Chromium."""
+    versions = "|".join(template_registry.get(name).version for name, _ in items)
+    key = cache_key("batch", {"items": [[name.lower(), data] for name, data in items]}, "", versions)
+    pdf_bytes = render_cache.get(key)
+    if pdf_bytes is None:
+        with _counting_failures("pdf_batch"):
+            documents, degraded = await run_in_threadpool(render_batch_html, items)
+            async with get_render_limiter().slot(plan, user):
+                pdf_bytes = await html_batch_to_pdf_bytes_async(documents)
+        _store(key, pdf_bytes, degraded)
+    return pdf_bytes
+
+
+async def render_pdf_patiently(template_name: str, data: Dict[str, Any],
+                               plan: Optional[str] = None, user: Optional[str] = None) -> bytes:
+    """Comme render_pdf, mais attend son tour au lieu d'échouer quand la file est pleine."""
+    return await _patiently(render_pdf, template_name, data, plan, user)
+
+
+async def render_docx_patiently(data: Dict[str, Any], plan: Optional[str] = None,
+                                user: Optional[str] = None) -> bytes:
+    """Comme render_docx_async, mais attend son tour au lieu d'échouer quand la file est pleine."""
+    return await _patiently(render_docx_async, data, plan, user)
+
+
+async def _patiently(render, *args):
+    while True:
+        try:
+            return await render(*args)
+        except RenderQueueFull as e:
+            await asyncio.sleep(e.retry_after)
+
+
+def _build_docx(key: str, data: Dict[str, Any]) -> bytes:
+    # python-docx n'est chargé qu'au premier export DOCX (ou par le préchargement)
+    from services.export_docx import export_docx_bytes
+
+    with stage("docx_build"):
+        docx_bytes = export_docx_bytes(data)
+    render_cache.put(key, docx_bytes)
+    return docx_bytes
+
+
+def render_docx(data: Dict[str, Any]) -> bytes:
+    key = cache_key("docx", data)
+    docx_bytes = render_cache.get(key)
+    if docx_bytes is None:
+        with _counting_failures("docx"):
+            docx_bytes = _build_docx(key, data)
+    return docx_bytes
+
+
+async def render_docx_async(data: Dict[str, Any], plan: Optional[str] = None, user: Optional[str] = None) -> bytes:
+    """DOCX depuis une route async : python-docx dans le threadpool, ordonnancé comme les PDF."""
+    key = cache_key("docx", data)
+    docx_bytes = render_cache.get(key)
+    if docx_bytes is None:
+        with _counting_failures("docx"):
+            async with get_render_limiter("docx").slot(plan, user):
+                docx_bytes = await run_in_threadpool(_build_docx, key, data)
+    return docx_bytes
+
+
+async def render_resume_entries(
+    resumes: List[Tuple[int, str, str, Dict[str, Any]]],
+    formats: List[str],
+    concurrency: int = max(1, PDF_MAX_CONCURRENT_RENDERS // 2),
+    plan: Optional[str] = None,
+    user: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, bytes]]:
+    """Rend (id, titre, modèle, données) dans chaque format en parallèle ; produit les entrées dans l'ordre de fin."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _render(resume_id: int, title: str, template_name: str, data: Dict[str, Any], fmt: str):
+        name = f"{resume_id}_{safe_stem(title)}.{fmt}"
+        async with semaphore:
+            try:
+                if fmt == "pdf":
+                    return name, await render_pdf_patiently(template_name, data, plan, user)
+                return name, await render_docx_patiently(data, plan, user)
+            except Exception as e:
+                print(f"[Exports] {name} failed: {e}")
+                return f"{name}.error.txt", f"Export failed: {e}".encode("utf-8")
+
+    tasks = [
+        asyncio.ensure_future(_render(*resume, fmt))
+        for resume in resumes
+        for fmt in formats
+    ]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # Client déconnecté : inutile de finir les rendus restants
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Polices des modèles hébergées localement.
+
+Les familles utilisées par les modèles (les @import Google Fonts de
+style.css et `fonts.heading` / `fonts.body` de template.json) sont
+téléchargées une fois dans FONTS_DIR/<famille>/ avec un manifeste
+faces.json. Au rendu, le registre des modèles remplace le lien Google Fonts
+par des règles @font-face locales : le PDF ne dépend plus du réseau. Une
+famille absente de FONTS_DIR garde son lien distant (comportement
+d'origine).
+
+Configuration (variables d'environnement) :
+  FONTS_DIR           dossier des polices (défaut backend/fonts)
+  FONTS_DELIVERY      polices des aperçus HTML : "link" (défaut, fichiers servis sous
+                      FONTS_URL_PREFIX, mis en cache par le navigateur) ou "inline"
+                      (data: URI) ; les PDF les embarquent toujours
+  FONTS_URL_PREFIX    préfixe des URLs en mode link (défaut /fonts) ; un préfixe relatif
+                      est complété par l'adresse de l'API dans les réponses d'aperçu,
+                      affichées dans une iframe du frontend (donner une URL absolue
+                      derrière un proxy)
+  FONTS_SUBSET        1 = sous-ensemble des glyphes utilisés dans chaque PDF (nécessite fonttools)
+  FONTS_SUBSET_CACHE  sous-ensembles gardés en mémoire (défaut 256)
+  FONTS_SUBSETS       plages Google Fonts vendorisées (défaut latin,latin-ext)
+
+Usage (vendoriser les polices de tous les modèles, depuis backend/) :
+  python -m services.font_assets
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+FONTS_DIR = Path(os.getenv("FONTS_DIR", str(Path(__file__).parent.parent / "fonts")))
+FONTS_DELIVERY = os.getenv("FONTS_DELIVERY", "link")
+FONTS_URL_PREFIX = os.getenv("FONTS_URL_PREFIX", "/fonts").rstrip("/")
+FONTS_SUBSET = os.getenv("FONTS_SUBSET", "0") == "1"
+FONTS_SUBSET_CACHE = int(os.getenv("FONTS_SUBSET_CACHE", "256"))
+FONTS_SUBSETS = [s.strip() for s in os.getenv("FONTS_SUBSETS", "latin,latin-ext").split(",") if s.strip()]
+
+GOOGLE_FONTS_HOST = "fonts.googleapis.com"
+MANIFEST_FILE = "faces.json"
+DEFAULT_WEIGHTS = "400;600;700"
+# Google ne sert du woff2 qu'aux navigateurs récents
+VENDOR_USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+)
+
+FONT_FORMATS = {".woff2": ("font/woff2", "woff2"), ".woff": ("font/woff", "woff"), ".ttf": ("font/ttf", "truetype")}
+
+
+def family_slug(family: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", family.lower()).strip("-")
+
+
+def google_font_families(url: str) -> Dict[str, str]:
+    """Familles d'une URL Google Fonts css2 : {"Inter": "wght@400;700", ...}."""
+    parsed = urlparse(url)
+    if parsed.netloc != GOOGLE_FONTS_HOST:
+        return {}
+    families = {}
+    for value in parse_qs(parsed.query).get("family", []):
+        name, _, axes = value.partition(":")
+        families[name.replace("+", " ").strip()] = axes
+    return families
+
+
+def parse_unicode_range(value: str) -> List[Tuple[int, int]]:
+    ranges = []
+    for part in value.split(","):
+        part = part.strip().upper().replace("U+", "")
+        if not part:
+            continue
+        if "?" in part:
+            ranges.append((int(part.replace("?", "0"), 16), int(part.replace("?", "F"), 16)))
+        elif "-" in part:
+            lo, hi = part.split("-", 1)
+            ranges.append((int(lo, 16), int(hi, 16)))
+        else:
+            ranges.append((int(part, 16), int(part, 16)))
+    return ranges
+
+
+def absolute_font_urls(html: str, base_url: str) -> str:
+    """Rend absolues les URLs /fonts/... d'un aperçu affiché hors de l'origine de l'API."""
+    if not FONTS_URL_PREFIX.startswith("/"):
+        return html
+    return html.replace(f"url({FONTS_URL_PREFIX}/", f"url({base_url.rstrip('/')}{FONTS_URL_PREFIX}/")
+
+
+_subsetting: Optional[bool] = None
+
+
+def subsetting_available() -> bool:
+    global _subsetting
+    if _subsetting is None:
+        _subsetting = False
+        if FONTS_SUBSET:
+            try:
+                import fontTools.subset  # noqa: F401
+                _subsetting = True
+            except ImportError:
+                print("[Fonts] FONTS_SUBSET=1 but fonttools is not installed; embedding full fonts")
+    return _subsetting
+
+
+class FontFace:
+    def __init__(self, family: str, style: str, weight: str, file: Path, unicode_range: str = ""):
+        self.family = family
+        self.style = style
+        self.weight = weight
+        self.file = file
+        self.unicode_range = unicode_range
+        self.ranges = parse_unicode_range(unicode_range) if unicode_range else [(0, 0x10FFFF)]
+
+    def covers(self, codepoints: Set[int]) -> Set[int]:
+        return {cp for cp in codepoints if any(lo <= cp <= hi for lo, hi in self.ranges)}
+
+    def rule(self, src: str, fmt: str) -> str:
+        unicode_range = f"unicode-range:{self.unicode_range};" if self.unicode_range else ""
+        return (
+            f"@font-face{{font-family:'{self.family}';font-style:{self.style};"
+            f"font-weight:{self.weight};font-display:block;"
+            f"src:url({src}) format('{fmt}');{unicode_range}}}"
+        )
+
+
+class FontLibrary:
+    def __init__(self, directory: Path = FONTS_DIR, subset_cache: int = FONTS_SUBSET_CACHE):
+        self.directory = directory
+        self.subset_cache = subset_cache
+        self._faces: Dict[str, List[FontFace]] = {}
+        self._data: Dict[Path, str] = {}
+        self._css: Dict[Tuple[Tuple[str, ...], bool], str] = {}
+        self._subsets: "OrderedDict[Tuple[Path, str], Optional[Tuple[str, str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- Catalogue ---
+    def faces(self, family: str) -> List[FontFace]:
+        slug = family_slug(family)
+        faces = self._faces.get(slug)
+        if faces is None:
+            faces = []
+            manifest = self.directory / slug / MANIFEST_FILE
+            if manifest.exists():
+                for entry in json.loads(manifest.read_text(encoding="utf-8")):
+                    faces.append(FontFace(
+                        entry["family"], entry.get("style", "normal"), str(entry.get("weight", "400")),
+                        manifest.parent / entry["file"], entry.get("unicode_range", ""),
+                    ))
+            self._faces[slug] = faces
+        return faces
+
+    def has(self, family: str) -> bool:
+        return bool(self.faces(family))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._faces.clear()
+            self._data.clear()
+            self._css.clear()
+            self._subsets.clear()
+
+    # --- @font-face ---
+    def _inline(self, face: FontFace) -> Tuple[str, str]:
+        mime, fmt = FONT_FORMATS.get(face.file.suffix, ("font/woff2", "woff2"))
+        data = self._data.get(face.file)
+        if data is None:
+            data = base64.b64encode(face.file.read_bytes()).decode("ascii")
+            self._data[face.file] = data
+        return f"data:{mime};base64,{data}", fmt
+
+    def _linked(self, face: FontFace) -> Tuple[str, str]:
+        _, fmt = FONT_FORMATS.get(face.file.suffix, ("font/woff2", "woff2"))
+        relative = face.file.relative_to(self.directory).as_posix()
+        return f"{FONTS_URL_PREFIX}/{relative}", fmt
+
+    def _subset(self, face: FontFace, codepoints: Set[int]) -> Optional[Tuple[str, str]]:
+        """Police réduite aux glyphes utilisés, mise en cache par (fichier, jeu de caractères)."""
+        wanted = face.covers(codepoints)
+        if not wanted:
+            return None
+        key = (face.file, hashlib.sha256(",".join(map(str, sorted(wanted))).encode("ascii")).hexdigest())
+        with self._lock:
+            if key in self._subsets:
+                self._subsets.move_to_end(key)
+                return self._subsets[key]
+
+        from fontTools import subset as ft_subset
+        from fontTools.ttLib import TTFont
+
+        font = TTFont(str(face.file))
+        subsetter = ft_subset.Subsetter(ft_subset.Options())
+        subsetter.populate(unicodes=wanted)
+        subsetter.subset(font)
+        try:
+            import brotli  # noqa: F401  (requis par fontTools pour écrire du woff2)
+            font.flavor, mime, fmt = "woff2", "font/woff2", "woff2"
+        except ImportError:
+            font.flavor, mime, fmt = None, "font/ttf", "truetype"
+        out = io.BytesIO()
+        font.save(out)
+        result = (f"data:{mime};base64,{base64.b64encode(out.getvalue()).decode('ascii')}", fmt)
+
+        with self._lock:
+            self._subsets[key] = result
+            while len(self._subsets) > self.subset_cache:
+                self._subsets.popitem(last=False)
+        return result
+
+    def font_face_css(self, families: Iterable[str], inline: bool = True, text: Optional[str] = None) -> str:
+        """Règles @font-face des familles vendorisées ; avec `text`, seuls les glyphes utilisés sont gardés."""
+        families = tuple(sorted(set(families)))
+        if not families:
+            return ""
+        if text is not None and inline and subsetting_available():
+            # text-transform peut demander l'autre casse des lettres présentes
+            codepoints = {ord(c) for c in text + text.upper() + text.lower()}
+            rules = []
+            for family in families:
+                for face in self.faces(family):
+                    src = self._subset(face, codepoints)
+                    if src is not None:
+                        rules.append(face.rule(*src))
+            return "\n".join(rules)
+
+        key = (families, inline)
+        css = self._css.get(key)
+        if css is None:
+            css = "\n".join(
+                face.rule(*(self._inline(face) if inline else self._linked(face)))
+                for family in families
+                for face in self.faces(family)
+            )
+            self._css[key] = css
+        return css
+
+    # --- Vendorisation ---
+    def vendor(self, family: str, axes: str = "", subsets: List[str] = FONTS_SUBSETS) -> int:
+        """Télécharge une famille depuis Google Fonts ; renvoie le nombre de faces enregistrées."""
+        import httpx
+
+        spec = family.replace(" ", "+") + (f":{axes}" if axes else f":wght@{DEFAULT_WEIGHTS}")
+        headers = {"User-Agent": VENDOR_USER_AGENT}
+        with httpx.Client(timeout=30, follow_redirects=True) as client:
+            response = client.get(f"https://{GOOGLE_FONTS_HOST}/css2", params={"family": spec, "display": "swap"},
+                                  headers=headers)
+            if response.status_code == 400 and axes:
+                # Axes non proposés par Google : on reprend les graisses par défaut
+                return self.vendor(family, "", subsets)
+            response.raise_for_status()
+
+            family_dir = self.directory / family_slug(family)
+            family_dir.mkdir(parents=True, exist_ok=True)
+            manifest = []
+            blocks = re.findall(r"/\*\s*([\w-]+)\s*\*/\s*@font-face\s*{([^}]*)}", response.text)
+            for subset_name, body in blocks:
+                if subsets and subset_name not in subsets:
+                    continue
+                props = dict(
+                    (k.strip(), v.strip()) for k, v in
+                    (line.split(":", 1) for line in body.split(";") if ":" in line)
+                )
+                src = re.search(r"url\(([^)]+)\)", props.get("src", ""))
+                if not src:
+                    continue
+                style = props.get("font-style", "normal")
+                weight = props.get("font-weight", "400")
+                filename = f"{family_slug(family)}-{weight}-{style}-{subset_name}.woff2"
+                font_file = client.get(src.group(1), headers=headers)
+                font_file.raise_for_status()
+                (family_dir / filename).write_bytes(font_file.content)
+                manifest.append({
+                    "family": family, "style": style, "weight": weight,
+                    "unicode_range": props.get("unicode-range", ""), "file": filename,
+                })
+        (family_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        with self._lock:
+            self._faces.pop(family_slug(family), None)
+            self._css.clear()
+        return len(manifest)
+
+
+font_library = FontLibrary()
+
+
+def main():
+    import argparse
+
+    from services.template_registry import IMPORT_PATTERN, STYLE_FILE, registry
+
+    ap = argparse.ArgumentParser(description="Vendorise les polices Google Fonts des modèles")
+    ap.add_argument("--template", help="Un seul modèle (défaut : tous)")
+    ap.add_argument("--force", action="store_true", help="Retélécharger les familles déjà présentes")
+    args = ap.parse_args()
+
+    wanted: Dict[str, str] = {}
+    for name in [args.template] if args.template else registry.names():
+        compiled = registry.get(name)
+        css = (registry.templates_dir / compiled.folder / STYLE_FILE).read_text(encoding="utf-8")
+        for url in IMPORT_PATTERN.findall(css):
+            for family, axes in google_font_families(url).items():
+                wanted.setdefault(family, axes)
+        for family in (compiled.metadata.get("fonts") or {}).values():
+            wanted.setdefault(family, "")
+
+    for family, axes in sorted(wanted.items()):
+        if font_library.has(family) and not args.force:
+            print(f"[Fonts] {family}: already vendored")
+            continue
+        try:
+            count = font_library.vendor(family, axes)
+            print(f"[Fonts] {family}: {count} face(s) saved")
+        except Exception as e:
+            # Polices système (Times New Roman...) : rien à télécharger
+            print(f"[Fonts] {family}: skipped ({e})")
+    registry.reload(args.template)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,128 @@
 #!/usr/bin/env python3
 """
 Convertit un fichier HTML en PDF via Playwright.
-Usage:
-  python generate_pdf_from_html.py --html cv.html --out CV.pdf
+Usage (depuis backend/):
+  python -m services.generate_pdf_from_html --html cv.html --out CV.pdf
+  python -m services.generate_pdf_from_html --template moderne --data data/ --out CVs.pdf
 """
 import argparse
+import io
+import json
+import os
 from pathlib import Path
-from playwright.sync_api import sync_playwright
+from typing import List
+
+from services.browser_pool import PDF_RENDER_TIMEOUT, get_browser_pool, shutdown_browser_pool
+from services.metrics import stage
+from services.render_network import READY_SCRIPT, render_network
+
+# Attente maximale des feuilles de style, images et polices après domcontentloaded (ms)
+PDF_READY_TIMEOUT_MS = int(os.getenv("PDF_READY_TIMEOUT_MS", "5000"))
+
+
+def _prepare_html(html_content: str) -> str:
+    # Cacher le bouton PDF dans le HTML avant de générer
+    return html_content.replace(
+        '<div class="pdf-button-container">',
+        '<div class="pdf-button-container" style="display: none !important;">'
+    )
+
+
+async def _load(page, html_content: str) -> None:
+    # Attente explicite plutôt que l'événement load : toutes les requêtes sont
+    # résolues par render_network, puis on attend styles, images et polices.
+    with stage("set_content"):
+        await page.set_content(html_content, wait_until="domcontentloaded")
+    with stage("assets_ready"):
+        await page.evaluate(READY_SCRIPT, PDF_READY_TIMEOUT_MS)
+
+
+class RenderedPdf(bytes):
+    """Octets d'un PDF ; `degraded` : une image y a été remplacée par un pixel vide."""
+    degraded = False
+
+
+def _rendered(content: bytes, degraded: bool) -> bytes:
+    if not degraded:
+        return content
+    pdf = RenderedPdf(content)
+    pdf.degraded = True
+    return pdf
+
+
+def is_degraded(content: bytes) -> bool:
+    return getattr(content, "degraded", False)
+
+
+async def _pdf(page) -> bytes:
+    with stage("page_pdf"):
+        return await page.pdf(format='A4', print_background=True)
+
+
+def _printer(html_content: str):
+    async def _print(page):
+        render_network.take_stubbed(page)
+        await _load(page, html_content)
+        pdf = await _pdf(page)
+        return _rendered(pdf, render_network.take_stubbed(page) > 0)
+    return _print
+
+
+def html_to_pdf_bytes(html_content: str) -> bytes:
+    """Rend une chaîne HTML en PDF (bytes) sur une page du pool, sans fichier intermédiaire"""
+    return get_browser_pool().run(_printer(_prepare_html(html_content)))
+
+
+async def html_to_pdf_bytes_async(html_content: str) -> bytes:
+    """Variante async de html_to_pdf_bytes : n'occupe aucun thread pendant le rendu"""
+    return await get_browser_pool().run_async(_printer(_prepare_html(html_content)))
+
+
+def _batch_printer(html_documents: List[str]):
+    # Tous les documents passent par la même page : un seul emprunt au pool
+    async def _print(page):
+        render_network.take_stubbed(page)
+        parts = []
+        for html_content in html_documents:
+            await _load(page, html_content)
+            parts.append(await _pdf(page))
+        return parts, render_network.take_stubbed(page) > 0
+    return _print
+
+
+def _batch_timeout(html_documents: List[str]) -> float:
+    # Le budget d'un lot croît avec le nombre de CV qu'il imprime
+    pages = sum(max(1, html.count('<section class="cv-batch-page">')) for html in html_documents)
+    return PDF_RENDER_TIMEOUT * pages
+
+
+def merge_pdfs(parts: List[bytes]) -> bytes:
+    """Fusionne plusieurs PDF (nécessite pypdf quand il y a plus d'un document)"""
+    if len(parts) == 1:
+        return parts[0]
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        raise RuntimeError("pypdf is required to merge PDFs rendered from different templates")
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(io.BytesIO(part))
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def html_batch_to_pdf_bytes(html_documents: List[str]) -> bytes:
+    """Rend plusieurs documents HTML en un seul PDF, en une session navigateur"""
+    prepared = [_prepare_html(html) for html in html_documents]
+    parts, degraded = get_browser_pool().run(_batch_printer(prepared), _batch_timeout(prepared))
+    return _rendered(merge_pdfs(parts), degraded)
+
+
+async def html_batch_to_pdf_bytes_async(html_documents: List[str]) -> bytes:
+    prepared = [_prepare_html(html) for html in html_documents]
+    parts, degraded = await get_browser_pool().run_async(_batch_printer(prepared), _batch_timeout(prepared))
+    return _rendered(merge_pdfs(parts), degraded)
 
 
 def html_to_pdf(html_path: Path, out_pdf: Path) -> Path:
@@ -15,39 +131,52 @@ def html_to_pdf(html_path: Path, out_pdf: Path) -> Path:
     print(f"[PDF Generator] Input: {html_path}")
     print(f"[PDF Generator] Output: {out_pdf}")
     
-    # Lire le HTML
-    html_content = html_path.read_text(encoding='utf-8')
-    
-    # Cacher le bouton PDF dans le HTML avant de générer
-    html_content = html_content.replace(
-        '<div class="pdf-button-container">',
-        '<div class="pdf-button-container" style="display: none !important;">'
-    )
-    
-    # Générer le PDF avec Playwright
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page()
-        page.set_content(html_content)
-        page.pdf(path=str(out_pdf), format='A4', print_background=True)
-        browser.close()
+    pdf_bytes = html_to_pdf_bytes(html_path.read_text(encoding='utf-8'))
+    out_pdf.write_bytes(pdf_bytes)
     
     print(f"[PDF Generator] PDF created successfully: {out_pdf}")
     return out_pdf
 
 
+def _data_files(paths: List[str]) -> List[Path]:
+    files = []
+    for raw in paths:
+        path = Path(raw)
+        if path.is_dir():
+            files.extend(sorted(path.glob("*.json")))
+        elif path.exists():
+            files.append(path)
+        else:
+            raise FileNotFoundError(f"Données introuvables: {path}")
+    return files
+
+
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--html", required=True)
+    source = ap.add_mutually_exclusive_group(required=True)
+    source.add_argument("--html", help="Fichier HTML déjà rendu")
+    source.add_argument("--data", nargs="+", help="Fichiers JSON ou dossiers (mode batch : un CV par page)")
+    ap.add_argument("--template", default="moderne", help="Modèle utilisé en mode batch")
     ap.add_argument("--out", required=True)
     args = ap.parse_args()
 
-    html = Path(args.html)
     out = Path(args.out)
-    if not html.exists():
-        raise FileNotFoundError(f"HTML introuvable: {html}")
+    try:
+        if args.html:
+            html = Path(args.html)
+            if not html.exists():
+                raise FileNotFoundError(f"HTML introuvable: {html}")
+            pdf_path = html_to_pdf(html, out)
+        else:
+            from services.template_registry import render_batch_html
 
-    pdf_path = html_to_pdf(html, out)
+            files = _data_files(args.data)
+            items = [(args.template, json.loads(f.read_text(encoding="utf-8"))) for f in files]
+            out.write_bytes(html_batch_to_pdf_bytes(render_batch_html(items)[0]))
+            print(f"[PDF Generator] {len(items)} CV(s) rendered in one batch")
+            pdf_path = out
+    finally:
+        shutdown_browser_pool()
     print(f"PDF généré: {pdf_path}")
 
 
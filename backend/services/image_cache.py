@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Cache des images distantes (photos de profil) utilisées dans les rendus.
+
+Chaque URL est téléchargée une seule fois : l'original est rangé par
+empreinte de contenu dans IMAGES_CACHE_DIR, puis réduit aux dimensions
+affichées par le modèle (`images` de template.json, × IMAGES_SCALE pour
+l'impression) et servi en data: URI. Les rendus suivants — aperçu ou PDF —
+ne font plus aucun appel réseau, et le PDF n'embarque plus l'image en
+pleine résolution. Une image impossible à récupérer garde son URL
+d'origine : `localize` le signale (rendu dégradé, à ne pas mettre en cache)
+et une nouvelle tentative a lieu après IMAGES_RETRY_AFTER.
+
+Configuration (variables d'environnement) :
+  IMAGES_CACHE_DIR        dossier du cache (défaut backend/image_cache)
+  IMAGES_CACHE_MAX_BYTES  taille totale du cache disque (défaut 256 Mo)
+  IMAGES_MAX_BYTES        taille maximum d'une image téléchargée (défaut 5 Mo)
+  IMAGES_FETCH_TIMEOUT    délai de téléchargement en secondes (défaut 10)
+  IMAGES_RETRY_AFTER      délai avant de retenter une URL en échec (défaut 300)
+  IMAGES_SCALE            facteur appliqué aux dimensions affichées (défaut 2)
+  IMAGES_ALLOW_PRIVATE    1 = autoriser les adresses privées/locales (défaut 0)
+"""
+import base64
+import copy
+import hashlib
+import io
+import ipaddress
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+from services.metrics import missing_images
+
+IMAGES_CACHE_DIR = Path(os.getenv("IMAGES_CACHE_DIR", str(Path(__file__).parent.parent / "image_cache")))
+IMAGES_CACHE_MAX_BYTES = int(os.getenv("IMAGES_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+IMAGES_MAX_BYTES = int(os.getenv("IMAGES_MAX_BYTES", str(5 * 1024 * 1024)))
+IMAGES_FETCH_TIMEOUT = float(os.getenv("IMAGES_FETCH_TIMEOUT", "10"))
+IMAGES_RETRY_AFTER = int(os.getenv("IMAGES_RETRY_AFTER", "300"))
+IMAGES_SCALE = float(os.getenv("IMAGES_SCALE", "2"))
+IMAGES_ALLOW_PRIVATE = os.getenv("IMAGES_ALLOW_PRIVATE", "0") == "1"
+
+# data: URIs gardées en mémoire (une par image et par taille)
+MEMORY_ENTRIES = 512
+MAX_REDIRECTS = 3
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+def _digest(value: bytes) -> str:
+    return hashlib.sha256(value).hexdigest()
+
+
+def _sniff_mime(content: bytes) -> Optional[str]:
+    if content.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if content.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if content[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if content[:4] == b"RIFF" and content[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+class ImageCache:
+    def __init__(
+        self,
+        directory: Path = IMAGES_CACHE_DIR,
+        max_bytes: int = IMAGES_CACHE_MAX_BYTES,
+        max_image_bytes: int = IMAGES_MAX_BYTES,
+        timeout: float = IMAGES_FETCH_TIMEOUT,
+        scale: float = IMAGES_SCALE,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_image_bytes = max_image_bytes
+        self.timeout = timeout
+        self.scale = scale
+        self._memory: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._failures: Dict[str, float] = {}
+        self._url_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._warned_no_pillow = False
+        self.fetches = 0
+        self.hits = 0
+
+    # --- Téléchargement ---
+    def _pin(self, url: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Résout l'hôte une seule fois : (URL vers l'adresse vérifiée, en-têtes, extensions httpx).
+
+        La connexion se fait à l'adresse contrôlée, pas à une seconde résolution
+        DNS (qui pourrait désigner le réseau interne : DNS rebinding). Host et
+        SNI gardent le nom d'origine, le certificat est vérifié pour ce nom.
+        """
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise ImageFetchError(f"Unsupported image URL: {url}")
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        try:
+            infos = socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP)
+        except socket.gaierror as e:
+            raise ImageFetchError(f"Cannot resolve {parsed.hostname}: {e}")
+        addresses = [ipaddress.ip_address(info[4][0]) for info in infos]
+        if not addresses:
+            raise ImageFetchError(f"Cannot resolve {parsed.hostname}")
+        if not IMAGES_ALLOW_PRIVATE:
+            # Pas de requêtes vers le réseau interne à partir des données d'un CV
+            for address in addresses:
+                if not address.is_global:
+                    raise ImageFetchError(f"Refusing to fetch image from non-public address {address}")
+        address = addresses[0]
+        host = f"[{address}]" if address.version == 6 else str(address)
+        suffix = f":{parsed.port}" if parsed.port else ""
+        pinned = parsed._replace(netloc=host + suffix).geturl()
+        headers = {"Host": parsed.netloc.rsplit("@", 1)[-1]}
+        extensions = {"sni_hostname": parsed.hostname} if parsed.scheme == "https" else {}
+        return pinned, headers, extensions
+
+    def _fetch(self, url: str) -> bytes:
+        import httpx
+
+        chunks = []
+        with httpx.Client(timeout=self.timeout, follow_redirects=False) as client:
+            # Redirections suivies à la main pour revérifier chaque hôte
+            for _ in range(MAX_REDIRECTS + 1):
+                pinned, headers, extensions = self._pin(url)
+                with client.stream("GET", pinned, headers={"Accept": "image/*", **headers},
+                                   extensions=extensions) as response:
+                    if response.is_redirect:
+                        url = urljoin(url, response.headers["location"])
+                        continue
+                    if response.status_code != 200:
+                        raise ImageFetchError(f"HTTP {response.status_code} for {url}")
+                    size = 0
+                    for chunk in response.iter_bytes():
+                        size += len(chunk)
+                        if size > self.max_image_bytes:
+                            raise ImageFetchError(f"Image larger than {self.max_image_bytes} bytes: {url}")
+                        chunks.append(chunk)
+                    break
+            else:
+                raise ImageFetchError(f"Too many redirects for {url}")
+        content = b"".join(chunks)
+        if _sniff_mime(content) is None:
+            raise ImageFetchError(f"Not an image: {url}")
+        self.fetches += 1
+        return content
+
+    def _original(self, url: str) -> bytes:
+        """Octets de l'image d'origine : depuis le disque si déjà vue, sinon téléchargés une fois."""
+        url_key = _digest(url.encode("utf-8"))
+        ref = self.directory / "urls" / url_key
+        if ref.exists():
+            path = self.directory / "originals" / ref.read_text().strip()
+            if path.exists():
+                return path.read_bytes()
+
+        with self._lock:
+            url_lock = self._url_locks.setdefault(url_key, threading.Lock())
+        with url_lock:
+            # Un autre thread a pu la télécharger pendant l'attente
+            if ref.exists():
+                path = self.directory / "originals" / ref.read_text().strip()
+                if path.exists():
+                    return path.read_bytes()
+            content = self._fetch(url)
+            name = _digest(content)
+            self._write(self.directory / "originals" / name, content)
+            self._write(ref, name.encode("ascii"))
+        with self._lock:
+            self._url_locks.pop(url_key, None)
+        self.sweep()
+        return content
+
+    @staticmethod
+    def _write(path: Path, content: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(content)
+        os.replace(tmp, path)
+
+    # --- Redimensionnement ---
+    def _resize(self, content: bytes, width: int, height: int) -> Tuple[bytes, str]:
+        mime = _sniff_mime(content) or "image/jpeg"
+        try:
+            from PIL import Image, ImageOps
+        except ImportError:
+            if not self._warned_no_pillow:
+                print("[Images] Pillow is not installed; embedding images at full resolution")
+                self._warned_no_pillow = True
+            return content, mime
+
+        target = (max(1, int(width * self.scale)), max(1, int(height * self.scale)))
+        with Image.open(io.BytesIO(content)) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.width <= target[0] and image.height <= target[1]:
+                return content, mime
+            # Même rendu qu'object-fit: cover
+            image = ImageOps.fit(image, target, Image.LANCZOS)
+            out = io.BytesIO()
+            if image.mode in ("RGBA", "LA", "P"):
+                image.save(out, "PNG", optimize=True)
+                return out.getvalue(), "image/png"
+            image.convert("RGB").save(out, "JPEG", quality=85, optimize=True, progressive=True)
+            return out.getvalue(), "image/jpeg"
+
+    def _variant(self, url: str, width: int, height: int) -> Tuple[bytes, str]:
+        original = self._original(url)
+        name = f"{_digest(original)}-{width}x{height}@{self.scale:g}"
+        for ext, mime in (("jpg", "image/jpeg"), ("png", "image/png")):
+            path = self.directory / "variants" / f"{name}.{ext}"
+            if path.exists():
+                return path.read_bytes(), mime
+        content, mime = self._resize(original, width, height)
+        ext = "png" if mime == "image/png" else "jpg"
+        if mime in ("image/jpeg", "image/png"):
+            self._write(self.directory / "variants" / f"{name}.{ext}", content)
+        return content, mime
+
+    # --- API ---
+    def cached(self, url: str) -> Optional[Tuple[bytes, str]]:
+        """Image d'origine si elle est déjà sur disque (jamais de téléchargement)."""
+        if not url.startswith(("http://", "https://")):
+            return None
+        ref = self.directory / "urls" / _digest(url.encode("utf-8"))
+        try:
+            content = (self.directory / "originals" / ref.read_text().strip()).read_bytes()
+        except FileNotFoundError:
+            return None
+        return content, _sniff_mime(content) or "application/octet-stream"
+
+    def data_uri(self, url: str, width: int, height: int) -> Optional[str]:
+        """data: URI de l'image réduite à width×height (px CSS), ou None si elle est indisponible."""
+        key = (url, width, height)
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return cached
+            failed_at = self._failures.get(url)
+            if failed_at is not None and time.time() - failed_at < IMAGES_RETRY_AFTER:
+                return None
+
+        try:
+            content, mime = self._variant(url, width, height)
+        except Exception as e:
+            print(f"[Images] {url}: {e}")
+            with self._lock:
+                self._failures[url] = time.time()
+            return None
+
+        uri = f"data:{mime};base64,{base64.b64encode(content).decode('ascii')}"
+        with self._lock:
+            self._failures.pop(url, None)
+            self._memory[key] = uri
+            while len(self._memory) > MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+        return uri
+
+    def localize(self, data: Dict[str, Any], images: Dict[str, Dict[str, int]]) -> Tuple[Dict[str, Any], bool]:
+        """(copie de `data` où chaque image déclarée — chemin pointé, ex. "profile.photo" — est
+        une data: URI, dégradé) ; dégradé = une image est restée à son URL d'origine."""
+        localized = data
+        degraded = False
+        for path, size in images.items():
+            *parents, leaf = path.split(".")
+            node = data
+            for part in parents:
+                node = node.get(part) if isinstance(node, dict) else None
+            url = node.get(leaf) if isinstance(node, dict) else None
+            if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+                continue
+            uri = self.data_uri(url, int(size.get("width", 200)), int(size.get("height", 200)))
+            if uri is None:
+                degraded = True
+                missing_images.inc(stage="localize")
+                continue
+            if localized is data:
+                localized = copy.deepcopy(data)
+            target = localized
+            for part in parents:
+                target = target[part]
+            target[leaf] = uri
+        return localized, degraded
+
+    def sweep(self) -> int:
+        """Supprime les fichiers les plus anciens au-delà de max_bytes."""
+        files = [p for p in self.directory.glob("*/*") if p.is_file() and p.suffix != ".tmp"]
+        files.sort(key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in files)
+        removed = 0
+        for path in files:
+            if total <= self.max_bytes:
+                break
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+            removed += 1
+        if removed:
+            print(f"[Images] Swept {removed} cached file(s)")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "fetches": self.fetches,
+                "hits": self.hits,
+                "failing_urls": len(self._failures),
+            }
+
+
+image_cache = ImageCache()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Limites sur les données de CV reçues par les routes de rendu et
+d'enregistrement (POST, PUT et PATCH /resumes/).
+
+Un CV pathologique (des milliers de puces, une image énorme en ligne) peut
+occuper Chromium très longtemps : ces bornes le refusent avant le rendu ou
+l'enregistrement (erreur 422 via la validation Pydantic).
+
+Configuration (variables d'environnement) :
+  RESUME_MAX_DATA_BYTES     taille JSON maximum des données (défaut 256 Ko)
+  RESUME_MAX_STRING_LENGTH  longueur maximum d'une chaîne (défaut 20000)
+  RESUME_MAX_LIST_ITEMS     éléments maximum d'une liste (défaut 200)
+  RESUME_MAX_DEPTH          profondeur d'imbrication maximum (défaut 8)
+"""
+import json
+import os
+from typing import Any, Dict
+
+RESUME_MAX_DATA_BYTES = int(os.getenv("RESUME_MAX_DATA_BYTES", str(256 * 1024)))
+RESUME_MAX_STRING_LENGTH = int(os.getenv("RESUME_MAX_STRING_LENGTH", "20000"))
+RESUME_MAX_LIST_ITEMS = int(os.getenv("RESUME_MAX_LIST_ITEMS", "200"))
+RESUME_MAX_DEPTH = int(os.getenv("RESUME_MAX_DEPTH", "8"))
+
+
+def _check(value: Any, path: str, depth: int) -> None:
+    if depth > RESUME_MAX_DEPTH:
+        raise ValueError(f"{path}: nested deeper than {RESUME_MAX_DEPTH} levels")
+    if isinstance(value, str):
+        if len(value) > RESUME_MAX_STRING_LENGTH:
+            raise ValueError(f"{path}: text longer than {RESUME_MAX_STRING_LENGTH} characters")
+    elif isinstance(value, list):
+        if len(value) > RESUME_MAX_LIST_ITEMS:
+            raise ValueError(f"{path}: more than {RESUME_MAX_LIST_ITEMS} items")
+        for i, item in enumerate(value):
+            _check(item, f"{path}[{i}]", depth + 1)
+    elif isinstance(value, dict):
+        if len(value) > RESUME_MAX_LIST_ITEMS:
+            raise ValueError(f"{path}: more than {RESUME_MAX_LIST_ITEMS} fields")
+        for key, item in value.items():
+            _check(item, f"{path}.{key}", depth + 1)
+
+
+def check_resume_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Renvoie `data` inchangé, ou lève ValueError s'il dépasse une des limites."""
+    size = len(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    if size > RESUME_MAX_DATA_BYTES:
+        raise ValueError(f"resume data is {size} bytes (limit {RESUME_MAX_DATA_BYTES})")
+    _check(data, "data", 0)
+    return data
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Application côté serveur des modifications partielles d'un document JSON.
+
+Deux formats, selon le Content-Type de PATCH /resumes/{id} :
+  - application/json-patch+json (RFC 6902) : liste d'opérations add,
+    remove, replace, move, copy, test sur des chemins JSON Pointer
+    (RFC 6901, ex. "/experience/0/bullets/-") ;
+  - application/merge-patch+json (RFC 7396) : objet fusionné dans le
+    document, une valeur null supprime la clé.
+Le document d'origine n'est jamais modifié : les fonctions renvoient une
+copie. Une opération invalide lève JsonPatchError, un "test" qui échoue
+JsonPatchConflict.
+"""
+import copy
+from typing import Any, Dict, List, Tuple
+
+JSON_PATCH_MEDIA_TYPE = "application/json-patch+json"
+MERGE_PATCH_MEDIA_TYPE = "application/merge-patch+json"
+
+# Au-delà, le client renvoie le document complet (PUT)
+MAX_OPERATIONS = 500
+
+
+class JsonPatchError(ValueError):
+    pass
+
+
+class JsonPatchConflict(JsonPatchError):
+    pass
+
+
+def _tokens(pointer: str) -> List[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _index(container: list, token: str, pointer: str, allow_end: bool = False) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise JsonPatchError(f"Invalid array index in {pointer!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"Array index out of range in {pointer!r}")
+    return index
+
+
+def _resolve(doc: Any, pointer: str) -> Any:
+    value = doc
+    for token in _tokens(pointer):
+        if isinstance(value, dict):
+            if token not in value:
+                raise JsonPatchError(f"Path not found: {pointer!r}")
+            value = value[token]
+        elif isinstance(value, list):
+            value = value[_index(value, token, pointer)]
+        else:
+            raise JsonPatchError(f"Path not found: {pointer!r}")
+    return value
+
+
+def _parent(doc: Any, pointer: str) -> Tuple[Any, str]:
+    tokens = _tokens(pointer)
+    if not tokens:
+        raise JsonPatchError("The document root cannot be added, removed or moved")
+    parent_pointer = "".join("/" + t.replace("~", "~0").replace("/", "~1") for t in tokens[:-1])
+    parent = _resolve(doc, parent_pointer)
+    if not isinstance(parent, (dict, list)):
+        raise JsonPatchError(f"Path not found: {pointer!r}")
+    return parent, tokens[-1]
+
+
+def _add(doc: Any, pointer: str, value: Any) -> Any:
+    if pointer == "":
+        return value
+    parent, token = _parent(doc, pointer)
+    if isinstance(parent, dict):
+        parent[token] = value
+    else:
+        parent.insert(_index(parent, token, pointer, allow_end=True), value)
+    return doc
+
+
+def _remove(doc: Any, pointer: str) -> Tuple[Any, Any]:
+    parent, token = _parent(doc, pointer)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise JsonPatchError(f"Path not found: {pointer!r}")
+        return doc, parent.pop(token)
+    return doc, parent.pop(_index(parent, token, pointer))
+
+
+def _json_equal(left: Any, right: Any) -> bool:
+    # Égalité JSON stricte (RFC 6902 §4.6) : même type, récursivement.
+    # `==` de Python confondrait True et 1, ou 1 et 1.0.
+    if type(left) is not type(right):
+        return False
+    if isinstance(left, dict):
+        return left.keys() == right.keys() and all(_json_equal(left[key], right[key]) for key in left)
+    if isinstance(left, list):
+        return len(left) == len(right) and all(_json_equal(a, b) for a, b in zip(left, right))
+    return left == right
+
+
+def apply_json_patch(doc: Any, operations: List[Dict[str, Any]]) -> Any:
+    """Applique les opérations RFC 6902 dans l'ordre ; tout ou rien."""
+    if not isinstance(operations, list):
+        raise JsonPatchError("A JSON Patch must be an array of operations")
+    if len(operations) > MAX_OPERATIONS:
+        raise JsonPatchError(f"More than {MAX_OPERATIONS} operations")
+    doc = copy.deepcopy(doc)
+    for operation in operations:
+        if not isinstance(operation, dict) or not isinstance(operation.get("path"), str):
+            raise JsonPatchError(f"Invalid operation: {operation!r}")
+        op, path = operation.get("op"), operation["path"]
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise JsonPatchError(f"'{op}' requires a value")
+        if op in ("move", "copy") and not isinstance(operation.get("from"), str):
+            raise JsonPatchError(f"'{op}' requires a 'from' pointer")
+        if op == "add":
+            doc = _add(doc, path, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            doc, _ = _remove(doc, path)
+        elif op == "replace":
+            _resolve(doc, path)
+            if path == "":
+                doc = copy.deepcopy(operation["value"])
+            else:
+                doc, _ = _remove(doc, path)
+                doc = _add(doc, path, copy.deepcopy(operation["value"]))
+        elif op == "move":
+            source = operation["from"]
+            if path != source and path.startswith(source + "/"):
+                raise JsonPatchError(f"Cannot move {source!r} into one of its children")
+            doc, value = _remove(doc, source)
+            doc = _add(doc, path, value)
+        elif op == "copy":
+            doc = _add(doc, path, copy.deepcopy(_resolve(doc, operation["from"])))
+        elif op == "test":
+            if not _json_equal(_resolve(doc, path), operation["value"]):
+                raise JsonPatchConflict(f"Test failed at {path!r}")
+        else:
+            raise JsonPatchError(f"Unknown operation: {op!r}")
+    return doc
+
+
+def _merge(target: Any, patch: Any) -> Any:
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = _merge(result.get(key), value)
+    return result
+
+
+def apply_merge_patch(doc: Any, patch: Any) -> Any:
+    """Fusion RFC 7396 de `patch` dans `doc`."""
+    return _merge(doc, patch)
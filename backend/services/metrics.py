@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Métriques du processus au format d'exposition texte Prometheus (/metrics).
+
+Pas de dépendance externe : compteurs et histogrammes tenus en mémoire,
+protégés par un verrou (les rendus tournent dans le threadpool, le pool
+de navigateurs et les workers d'export). Les valeurs déjà tenues ailleurs
+(cache de rendu, files d'attente, réseau des pages) sont lues au moment
+de l'export par des collecteurs enregistrés avec `collector()`.
+
+Mesures principales :
+  cvtor_render_stage_seconds{stage}          durée de chaque étape du rendu
+                                             (template_load, jinja_render, css,
+                                             browser_acquire, set_content,
+                                             assets_ready, page_pdf, docx_build)
+  cvtor_render_failures_total{format,reason} rendus en échec
+  cvtor_render_missing_images_total{stage}   images absentes d'un rendu (non mises
+                                             en cache, ou pixel vide dans la page) ;
+                                             ces rendus ne sont jamais mis en cache
+  cvtor_render_cache_requests_total          consultations du cache de rendu
+  cvtor_render_queue_*                       profondeur des files de rendu
+  cvtor_db_query_seconds{operation}          requêtes SQL (database/database.py)
+  cvtor_http_request_seconds{method,route,status}  latence par route
+
+Configuration (variables d'environnement) :
+  METRICS_ENABLED  0 = /metrics désactivé et rien n'est mesuré (défaut 1)
+  METRICS_TOKEN    /metrics exige "Authorization: Bearer <token>"
+  METRICS_PUBLIC   1 = /metrics servi sans jeton quand METRICS_TOKEN n'est pas défini,
+                   par exemple derrière un proxy qui en restreint l'accès (défaut 0 :
+                   sans jeton, /metrics est refusé)
+"""
+import abc
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from starlette.routing import Mount
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "0") == "1"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Secondes : de la milliseconde (cache, Jinja) à la minute (lots PDF)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> List[Sample]:
+        """Échantillons à exporter : (nom, labels, valeur)."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(f"{self.name}_total", dict(zip(self.labelnames, key)), value)
+                    for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Par jeu de labels : [compte par bucket (non cumulé)..., +Inf], somme
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[Sample]:
+        out: List[Sample] = []
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                out.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            out.append((f"{self.name}_sum", labels, total))
+            out.append((f"{self.name}_count", labels, cumulative))
+        return out
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, fn: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+        """Enregistre `fn` qui renvoie des familles (nom, type, aide, échantillons) lues à chaque export."""
+        self._collectors.append(fn)
+        return fn
+
+    def exposition(self) -> str:
+        families = [(m.name, m.kind, m.documentation, m.samples()) for m in list(self._metrics.values())]
+        for fn in self._collectors:
+            try:
+                families.extend(fn())
+            except Exception as e:
+                print(f"[Metrics] Collector {getattr(fn, '__name__', fn)} failed: {e}")
+        lines = []
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+render_stage_seconds = metrics.histogram(
+    "cvtor_render_stage_seconds", "Duration of each render pipeline stage", ["stage"]
+)
+render_failures = metrics.counter(
+    "cvtor_render_failures", "Failed renders by output format and reason", ["format", "reason"]
+)
+missing_images = metrics.counter(
+    "cvtor_render_missing_images", "Images left out of a render, by where it was detected", ["stage"]
+)
+db_query_seconds = metrics.histogram(
+    "cvtor_db_query_seconds", "SQL statement execution time", ["operation"]
+)
+http_request_seconds = metrics.histogram(
+    "cvtor_http_request_seconds", "HTTP request latency by route template", ["method", "route", "status"]
+)
+
+
+def stage(name: str):
+    """Chronomètre une étape du rendu : `with stage("jinja_render"): ...`"""
+    return render_stage_seconds.time(stage=name)
+
+
+# --- Latence HTTP par route ---
+class MetricsMiddleware:
+    """Middleware ASGI : mesure chaque requête jusqu'au dernier octet de la réponse."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = ["500"]
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            http_request_seconds.observe(
+                time.perf_counter() - started,
+                method=scope.get("method", ""),
+                route=_route_template(scope),
+                status=status[0],
+            )
+
+
+_route_paths: Dict[int, str] = {}
+_mount_paths: Dict[int, List[str]] = {}
+
+
+def _route_template(scope) -> str:
+    # Gabarit de la route retenue (/resumes/{resume_id}) : le chemin brut ferait exploser la cardinalité
+    app = scope.get("app")
+    routes = getattr(getattr(app, "router", None), "routes", [])
+    # Montages (fichiers statiques) : reconnus au préfixe du chemin, l'endpoint n'étant
+    # pas toujours renseigné par Starlette ; un seul label pour tout le préfixe
+    mounts = _mount_paths.get(id(app))
+    if mounts is None:
+        mounts = _mount_paths[id(app)] = [route.path for route in routes if isinstance(route, Mount)]
+    request_path = scope.get("path", "")
+    for prefix in mounts:
+        if request_path == prefix or request_path.startswith(prefix + "/"):
+            return prefix + "/*"
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "<unmatched>"
+    path = _route_paths.get(id(endpoint))
+    if path is None:
+        path = "<unmatched>"
+        for route in routes:
+            if getattr(route, "endpoint", None) is endpoint:
+                path = route.path
+                break
+        _route_paths[id(endpoint)] = path
+    return path
+
+
+# --- Requêtes SQL ---
+def instrument_engine(engine) -> None:
+    """Chronomètre chaque requête SQL exécutée par `engine`."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("cvtor_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("cvtor_query_start")
+        if starts:
+            operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+            db_query_seconds.observe(time.perf_counter() - starts.pop(), operation=operation)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("cvtor_query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Prévisualisation incrémentale : ne renvoie que les sections modifiées.
+
+Chaque modèle découpe son HTML en `{% block <section> %}`. À partir de
+l'AST Jinja2 on sait quelles clés de `data` chaque bloc lit ; le serveur
+garde par session l'empreinte de ces tranches et ne re-rend que les blocs
+dont la tranche a changé. Le premier rendu (ou tout changement hors des
+blocs) renvoie le document complet, où chaque section est encadrée par
+des commentaires `<!--cv-section-<nom>-->` … `<!--/cv-section-<nom>-->`
+que le client remplace ensuite sur place.
+
+Configuration (variables d'environnement) :
+  PREVIEW_SESSIONS_MAX  sessions gardées en mémoire (défaut 1000)
+  PREVIEW_SESSION_TTL   durée de vie d'une session inactive en secondes (défaut 1800)
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, List, Optional, Tuple
+
+from services.render_cache import canonical_json
+from services.template_registry import TEMPLATE_FILE, CompiledTemplate, registry, wrap_document
+
+if TYPE_CHECKING:
+    from jinja2 import nodes
+
+PREVIEW_SESSIONS_MAX = int(os.getenv("PREVIEW_SESSIONS_MAX", "1000"))
+PREVIEW_SESSION_TTL = int(os.getenv("PREVIEW_SESSION_TTL", "1800"))
+
+# Variables qu'un bloc peut lire pour être rendu seul
+BLOCK_CONTEXT = {"data", "template"}
+
+
+def section_id(name: str) -> str:
+    return f"cv-section-{name}"
+
+
+def _data_keys(node: "nodes.Node", keys: set, skip_blocks: bool = False) -> bool:
+    """Ajoute à `keys` les clés data.<clé> lues sous `node` ; False si `data` est lu en entier."""
+    from jinja2 import nodes
+
+    if isinstance(node, nodes.Block) and skip_blocks:
+        return True
+    if isinstance(node, nodes.Getattr) and isinstance(node.node, nodes.Name) and node.node.name == "data":
+        keys.add(node.attr)
+        return True
+    if (isinstance(node, nodes.Getitem) and isinstance(node.node, nodes.Name) and node.node.name == "data"
+            and isinstance(node.arg, nodes.Const) and isinstance(node.arg.value, str)):
+        keys.add(node.arg.value)
+        return True
+    if isinstance(node, nodes.Name) and node.name == "data":
+        return False
+    sliced = True
+    for child in node.iter_child_nodes():
+        sliced = _data_keys(child, keys, skip_blocks) and sliced
+    return sliced
+
+
+class SectionPlan:
+    """Tranches de `data` lues par chaque bloc autonome et par le reste du modèle."""
+
+    def __init__(self, blocks: Dict[str, Optional[FrozenSet[str]]], rest: Optional[FrozenSet[str]]):
+        self.blocks = blocks
+        self.rest = rest
+
+    @classmethod
+    def analyse(cls, compiled: CompiledTemplate) -> "SectionPlan":
+        from jinja2 import meta, nodes
+
+        env = compiled.template.environment
+        source, _, _ = env.loader.get_source(env, TEMPLATE_FILE)
+        ast = env.parse(source)
+
+        rest: set = set()
+        rest_sliced = _data_keys(ast, rest, skip_blocks=True)
+        blocks: Dict[str, Optional[FrozenSet[str]]] = {}
+        for block in ast.find_all(nodes.Block):
+            keys: set = set()
+            sliced = _data_keys(block, keys)
+            body = nodes.Template(block.body)
+            body.set_environment(env)
+            standalone = meta.find_undeclared_variables(body) <= BLOCK_CONTEXT
+            if standalone and not any(True for _ in block.find_all(nodes.Block)):
+                blocks[block.name] = frozenset(keys) if sliced else None
+            else:
+                # Bloc dépendant de variables extérieures : il suit le document entier
+                rest |= keys
+                rest_sliced = rest_sliced and sliced
+        return cls(blocks, frozenset(rest) if rest_sliced else None)
+
+    @staticmethod
+    def digest(data: Dict[str, Any], keys: Optional[FrozenSet[str]]) -> str:
+        part = data if keys is None else {k: data.get(k) for k in sorted(keys)}
+        return hashlib.sha256(canonical_json(part).encode("utf-8")).hexdigest()
+
+    def digests(self, data: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
+        return self.digest(data, self.rest), {name: self.digest(data, keys) for name, keys in self.blocks.items()}
+
+
+def _context(compiled: CompiledTemplate, data: Dict[str, Any]):
+    return compiled.template.new_context({"data": compiled.context_data(data), "template": compiled.metadata})
+
+
+def render_section(compiled: CompiledTemplate, name: str, data: Dict[str, Any]) -> str:
+    render_block = compiled.template.blocks[name]
+    return "".join(render_block(_context(compiled, data)))
+
+
+def render_marked_document(compiled: CompiledTemplate, plan: SectionPlan, data: Dict[str, Any]) -> str:
+    """Document complet où chaque bloc autonome est encadré par ses commentaires repères."""
+    context = _context(compiled, data)
+
+    def _marked(name, render_block):
+        def _render(ctx):
+            yield f"<!--{section_id(name)}-->"
+            yield from render_block(ctx)
+            yield f"<!--/{section_id(name)}-->"
+        return _render
+
+    for name in plan.blocks:
+        context.blocks[name] = [_marked(name, context.blocks[name][0])]
+    return wrap_document(compiled, "".join(compiled.template.root_render_func(context)))
+
+
+class _Session:
+    def __init__(self, version: str, rest: str, sections: Dict[str, str]):
+        self.version = version
+        self.rest = rest
+        self.sections = sections
+        self.revision = 0
+        self.touched = time.time()
+
+
+class PreviewSessions:
+    def __init__(self, max_sessions: int = PREVIEW_SESSIONS_MAX, ttl: int = PREVIEW_SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._plans: Dict[str, SectionPlan] = {}
+        self._lock = threading.Lock()
+
+    def _plan(self, compiled: CompiledTemplate) -> SectionPlan:
+        plan = self._plans.get(compiled.version)
+        if plan is None:
+            plan = SectionPlan.analyse(compiled)
+            with self._lock:
+                self._plans = {v: p for v, p in self._plans.items() if not v.startswith(f"{compiled.folder}-")}
+                self._plans[compiled.version] = plan
+        return plan
+
+    def _take(self, session_id: Optional[str]) -> Optional[_Session]:
+        if not session_id:
+            return None
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and time.time() - session.touched > self.ttl:
+                del self._sessions[session_id]
+                return None
+            return session
+
+    def _keep(self, session_id: str, session: _Session) -> None:
+        with self._lock:
+            session.touched = time.time()
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def render(self, template_name: str, data: Dict[str, Any], session_id: Optional[str] = None,
+               revision: Optional[int] = None) -> Dict[str, Any]:
+        """Sections modifiées depuis `revision`, ou le document complet si la session ne peut pas suivre."""
+        compiled = registry.get(template_name)
+        plan = self._plan(compiled)
+        rest, sections = plan.digests(data)
+
+        session = self._take(session_id)
+        if (session is None or session.version != compiled.version or session.rest != rest
+                or revision != session.revision):
+            session_id = session_id if session is not None else uuid.uuid4().hex
+            session = _Session(compiled.version, rest, sections)
+            self._keep(session_id, session)
+            return {
+                "session_id": session_id,
+                "revision": session.revision,
+                "full": True,
+                "html": render_marked_document(compiled, plan, data),
+                "sections": [section_id(name) for name in plan.blocks],
+            }
+
+        changed: List[Dict[str, str]] = []
+        for name, digest in sections.items():
+            if session.sections.get(name) != digest:
+                changed.append({"id": section_id(name), "html": render_section(compiled, name, data)})
+        if changed:
+            session.revision += 1
+        session.sections = sections
+        self._keep(session_id, session)
+        return {
+            "session_id": session_id,
+            "revision": session.revision,
+            "full": False,
+            "sections": changed,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions}
+
+
+preview_sessions = PreviewSessions()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Cache des rendus (HTML, PDF, DOCX) adressé par contenu.
+
+La clé est un SHA-256 du type de rendu, du modèle, de sa version et des
+données JSON canonicalisées : deux requêtes identiques produisent la même
+clé, quel que soit l'ordre des champs. Deux niveaux :
+  - mémoire : LRU borné en octets
+  - disque (optionnel) : un fichier par clé, éviction des plus anciens
+
+Configuration (variables d'environnement) :
+  RENDER_CACHE_MAX_BYTES       taille du LRU mémoire (défaut 64 Mo, 0 = désactivé)
+  RENDER_CACHE_DIR             dossier du niveau disque (désactivé si vide)
+  RENDER_CACHE_DISK_MAX_BYTES  taille maximum du niveau disque (défaut 512 Mo)
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from services.metrics import metrics
+
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", "")
+RENDER_CACHE_DISK_MAX_BYTES = int(os.getenv("RENDER_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def canonical_json(data: Any) -> str:
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def cache_key(kind: str, data: Dict[str, Any], template_name: str = "", template_version: str = "") -> str:
+    h = hashlib.sha256()
+    for part in (kind, template_name.lower(), template_version):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    h.update(canonical_json(data).encode("utf-8"))
+    return f"{kind}-{h.hexdigest()}"
+
+
+class _DiskTier:
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.size = sum(p.stat().st_size for p in self.directory.glob("*/*.bin"))
+
+    def _path(self, key: str) -> Path:
+        digest = key.rsplit("-", 1)[-1]
+        return self.directory / digest[:2] / f"{key}.bin"
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            value = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # l'mtime sert d'horodatage LRU
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        previous = path.stat().st_size if path.exists() else 0
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(value)
+        os.replace(tmp, path)
+        self.size += len(value) - previous
+        if self.size > self.max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        files = sorted(self.directory.glob("*/*.bin"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            if self.size <= self.max_bytes * 0.9:
+                break
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                self.size -= size
+            except FileNotFoundError:
+                continue
+
+    def clear(self) -> None:
+        for path in self.directory.glob("*/*.bin"):
+            path.unlink(missing_ok=True)
+        self.size = 0
+
+
+class RenderCache:
+    def __init__(self, max_bytes: int = RENDER_CACHE_MAX_BYTES, disk_dir: str = RENDER_CACHE_DIR,
+                 disk_max_bytes: int = RENDER_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._disk = _DiskTier(Path(disk_dir), disk_max_bytes) if disk_dir else None
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "disk_hits": 0, "misses": 0})
+
+    def get(self, key: str) -> Optional[bytes]:
+        kind = key.split("-", 1)[0]
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._counters[kind]["hits"] += 1
+                return value
+            if self._disk is not None:
+                value = self._disk.get(key)
+                if value is not None:
+                    self._counters[kind]["disk_hits"] += 1
+                    self._remember(key, value)
+                    return value
+            self._counters[kind]["misses"] += 1
+            return None
+
+    def put(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._remember(key, value)
+            if self._disk is not None:
+                self._disk.put(key, value)
+
+    def _remember(self, key: str, value: bytes) -> None:
+        # Un seul gros document ne doit pas vider tout le LRU
+        if len(value) > self.max_bytes // 8:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous)
+        self._memory[key] = value
+        self._memory_size += len(value)
+        while self._memory_size > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            if self._disk is not None:
+                self._disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "memory": {"entries": len(self._memory), "bytes": self._memory_size, "max_bytes": self.max_bytes},
+                "disk": (
+                    {"bytes": self._disk.size, "max_bytes": self._disk.max_bytes, "dir": str(self._disk.directory)}
+                    if self._disk is not None else None
+                ),
+                "counters": {kind: dict(c) for kind, c in self._counters.items()},
+            }
+
+
+render_cache = RenderCache()
+
+
+@metrics.collector
+def _cache_metrics():
+    stats = render_cache.stats()
+    requests = [
+        ("cvtor_render_cache_requests_total", {"kind": kind, "result": result}, count)
+        for kind, counters in stats["counters"].items()
+        for result, count in (("hit", counters["hits"]), ("disk_hit", counters["disk_hits"]), ("miss", counters["misses"]))
+    ]
+    size = [("cvtor_render_cache_bytes", {"tier": "memory"}, stats["memory"]["bytes"])]
+    if stats["disk"] is not None:
+        size.append(("cvtor_render_cache_bytes", {"tier": "disk"}, stats["disk"]["bytes"]))
+    return [
+        ("cvtor_render_cache_requests", "counter", "Render cache lookups by kind and result", requests),
+        ("cvtor_render_cache_bytes", "gauge", "Bytes held by the render cache", size),
+    ]
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Ordonnanceur des rendus asynchrones (PDF, DOCX), par formule d'abonnement.
+
+Au plus max_concurrent rendus tournent en même temps ; les autres attendent
+dans une file par formule (lane). Les lanes sont servies en proportion de
+leur poids (ordonnancement par pas : premium passe 4 fois plus souvent que
+free par défaut), et à l'intérieur d'une lane les utilisateurs sont servis
+à tour de rôle, chacun limité à RENDER_MAX_PER_USER rendus simultanés.
+Quand la file d'une lane est pleine (ou que l'attente dépasse
+PDF_QUEUE_TIMEOUT), RenderQueueFull est levée avec une estimation de
+Retry-After basée sur la durée moyenne des rendus.
+
+Configuration (variables d'environnement) :
+  PDF_MAX_CONCURRENT_RENDERS   rendus PDF simultanés (défaut : slots du pool)
+  DOCX_MAX_CONCURRENT_RENDERS  rendus DOCX simultanés (défaut 4)
+  PDF_MAX_QUEUED_RENDERS       requêtes en attente maximum par lane (défaut 16)
+  PDF_QUEUE_TIMEOUT            attente maximum en secondes (défaut 30)
+  RENDER_PLAN_WEIGHTS          poids des lanes (défaut "premium:4,free:1")
+  RENDER_MAX_PER_USER          rendus simultanés par utilisateur (défaut 2)
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+from services.browser_pool import PDF_POOL_BROWSERS, PDF_POOL_PAGES_PER_BROWSER
+from services.metrics import metrics
+
+PDF_MAX_CONCURRENT_RENDERS = int(
+    os.getenv("PDF_MAX_CONCURRENT_RENDERS", str(PDF_POOL_BROWSERS * PDF_POOL_PAGES_PER_BROWSER))
+)
+DOCX_MAX_CONCURRENT_RENDERS = int(os.getenv("DOCX_MAX_CONCURRENT_RENDERS", "4"))
+PDF_MAX_QUEUED_RENDERS = int(os.getenv("PDF_MAX_QUEUED_RENDERS", "16"))
+PDF_QUEUE_TIMEOUT = float(os.getenv("PDF_QUEUE_TIMEOUT", "30"))
+RENDER_PLAN_WEIGHTS = {
+    name.strip(): float(weight)
+    for name, weight in (
+        item.split(":", 1) for item in os.getenv("RENDER_PLAN_WEIGHTS", "premium:4,free:1").split(",") if ":" in item
+    )
+}
+RENDER_MAX_PER_USER = int(os.getenv("RENDER_MAX_PER_USER", "2"))
+
+DEFAULT_LANE = "free"
+ANONYMOUS = "anonymous"
+
+
+class RenderQueueFull(Exception):
+    """La file de rendu est saturée ; réessayer après `retry_after` secondes."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Render queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, lane: "_Lane", user: str, future: asyncio.Future):
+        self.lane = lane
+        self.user = user
+        self.future = future
+
+
+class _Lane:
+    """File d'une formule : un tourniquet d'utilisateurs, chacun avec ses requêtes en attente."""
+
+    def __init__(self, name: str, weight: float):
+        self.name = name
+        self.weight = max(weight, 0.01)
+        self.users: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self.pass_value = 0.0
+        self.waiting = 0
+        self.in_flight = 0
+        self.dispatched = 0
+        self.rejected = 0
+
+
+class RenderLimiter:
+    def __init__(
+        self,
+        max_concurrent: int = PDF_MAX_CONCURRENT_RENDERS,
+        max_queued: int = PDF_MAX_QUEUED_RENDERS,
+        queue_timeout: float = PDF_QUEUE_TIMEOUT,
+        weights: Optional[Dict[str, float]] = None,
+        max_per_user: int = RENDER_MAX_PER_USER,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.queue_timeout = queue_timeout
+        self.max_per_user = max(1, max_per_user)
+        weights = dict(weights or RENDER_PLAN_WEIGHTS)
+        weights.setdefault(DEFAULT_LANE, 1.0)
+        self._lanes = {name: _Lane(name, weight) for name, weight in weights.items()}
+        self._user_in_flight: Dict[str, int] = {}
+        self._in_flight = 0
+        # Pas de la dernière lane servie : une lane qui se réveille repart de là
+        self._virtual_time = 0.0
+        # Moyenne glissante (EWMA) de la durée d'un rendu, en secondes
+        self._avg_duration = 1.0
+
+    @property
+    def waiting(self) -> int:
+        return sum(lane.waiting for lane in self._lanes.values())
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def retry_after(self) -> int:
+        batches = (self.waiting + 1) / self.max_concurrent
+        return max(1, math.ceil(self._avg_duration * batches))
+
+    def _lane(self, plan: Optional[str]) -> _Lane:
+        return self._lanes.get(plan or DEFAULT_LANE) or self._lanes[DEFAULT_LANE]
+
+    # --- File d'attente ---
+    def _enqueue(self, lane: _Lane, user: str) -> _Waiter:
+        if lane.waiting == 0:
+            lane.pass_value = max(lane.pass_value, self._virtual_time)
+        waiter = _Waiter(lane, user, asyncio.get_running_loop().create_future())
+        lane.users.setdefault(user, deque()).append(waiter)
+        lane.waiting += 1
+        return waiter
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = waiter.lane.users.get(waiter.user)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            waiter.lane.waiting -= 1
+            if not queue:
+                del waiter.lane.users[waiter.user]
+
+    def _eligible(self, lane: _Lane) -> Optional[str]:
+        for user in lane.users:
+            if self._user_in_flight.get(user, 0) < self.max_per_user:
+                return user
+        return None
+
+    def _dispatch(self) -> None:
+        while self._in_flight < self.max_concurrent:
+            candidates = [(lane, self._eligible(lane)) for lane in self._lanes.values() if lane.waiting]
+            candidates = [(lane, user) for lane, user in candidates if user is not None]
+            if not candidates:
+                return
+            lane, user = min(candidates, key=lambda c: (c[0].pass_value, -c[0].weight))
+            queue = lane.users[user]
+            waiter = queue.popleft()
+            # Tourniquet : l'utilisateur servi passe en fin de lane
+            del lane.users[user]
+            if queue:
+                lane.users[user] = queue
+            lane.waiting -= 1
+            lane.pass_value += 1.0 / lane.weight
+            self._virtual_time = lane.pass_value
+            self._start(waiter)
+            waiter.future.set_result(None)
+
+    def _start(self, waiter: _Waiter) -> None:
+        self._in_flight += 1
+        waiter.lane.in_flight += 1
+        waiter.lane.dispatched += 1
+        self._user_in_flight[waiter.user] = self._user_in_flight.get(waiter.user, 0) + 1
+
+    def _finish(self, waiter: _Waiter) -> None:
+        self._in_flight -= 1
+        waiter.lane.in_flight -= 1
+        remaining = self._user_in_flight.get(waiter.user, 1) - 1
+        if remaining:
+            self._user_in_flight[waiter.user] = remaining
+        else:
+            self._user_in_flight.pop(waiter.user, None)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, plan: Optional[str] = None, user: Optional[str] = None):
+        """Attend un créneau de rendu dans la lane de `plan`, à tour de rôle avec les autres utilisateurs."""
+        lane = self._lane(plan)
+        user = user or ANONYMOUS
+        if lane.waiting >= self.max_queued and self._in_flight >= self.max_concurrent:
+            lane.rejected += 1
+            raise RenderQueueFull(self.retry_after())
+
+        waiter = self._enqueue(lane, user)
+        self._dispatch()
+        try:
+            if not waiter.future.done():
+                await asyncio.wait({waiter.future}, timeout=self.queue_timeout)
+        except BaseException:
+            # Appelant annulé (client déconnecté) : rendre le créneau s'il avait été attribué
+            if waiter.future.done():
+                self._finish(waiter)
+            else:
+                self._remove(waiter)
+            raise
+        if not waiter.future.done():
+            self._remove(waiter)
+            lane.rejected += 1
+            raise RenderQueueFull(self.retry_after())
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * elapsed
+            self._finish(waiter)
+
+    # --- Observabilité ---
+    def position(self, user: str) -> Optional[int]:
+        """Rang estimé (1 = prochain servi) de la plus ancienne requête en attente de `user`."""
+        for lane in self._lanes.values():
+            if user not in lane.users:
+                continue
+            # Tourniquet : chaque utilisateur placé avant passe une requête avant la nôtre
+            rank = list(lane.users).index(user)
+            # Rejoue l'ordonnancement par pas jusqu'à notre tour (plafond par utilisateur ignoré)
+            passes = {other.name: other.pass_value for other in self._lanes.values() if other.waiting}
+            left = {other.name: other.waiting for other in self._lanes.values() if other.waiting}
+            served = 0
+            while True:
+                name = min(left, key=lambda n: (passes[n], -self._lanes[n].weight))
+                served += 1
+                if name == lane.name:
+                    if rank == 0:
+                        return served
+                    rank -= 1
+                passes[name] += 1.0 / self._lanes[name].weight
+                left[name] -= 1
+                if not left[name]:
+                    del left[name]
+        return None
+
+    def queue_info(self, user: str) -> Dict[str, Any]:
+        position = self.position(user)
+        return {
+            "position": position,
+            "eta_seconds": math.ceil(position / self.max_concurrent * self._avg_duration) if position else 0,
+            "in_flight": self._in_flight,
+            "waiting": self.waiting,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self._in_flight,
+            "waiting": self.waiting,
+            "avg_render_seconds": round(self._avg_duration, 3),
+            "lanes": {
+                lane.name: {
+                    "weight": lane.weight,
+                    "waiting": lane.waiting,
+                    "in_flight": lane.in_flight,
+                    "users_waiting": len(lane.users),
+                    "dispatched": lane.dispatched,
+                    "rejected": lane.rejected,
+                }
+                for lane in self._lanes.values()
+            },
+        }
+
+
+_limiters: Dict[str, RenderLimiter] = {}
+
+
+def get_render_limiter(kind: str = "pdf") -> RenderLimiter:
+    # Créés paresseusement pour être liés à la boucle asyncio de l'application
+    limiter = _limiters.get(kind)
+    if limiter is None:
+        concurrency = PDF_MAX_CONCURRENT_RENDERS if kind == "pdf" else DOCX_MAX_CONCURRENT_RENDERS
+        limiter = _limiters[kind] = RenderLimiter(max_concurrent=concurrency)
+    return limiter
+
+
+def render_limiters() -> Dict[str, RenderLimiter]:
+    return dict(_limiters)
+
+
+@metrics.collector
+def _queue_metrics():
+    waiting, in_flight, dispatched, rejected = [], [], [], []
+    for kind, limiter in render_limiters().items():
+        for lane, stats in limiter.stats()["lanes"].items():
+            labels = {"kind": kind, "lane": lane}
+            waiting.append(("cvtor_render_queue_waiting", labels, stats["waiting"]))
+            in_flight.append(("cvtor_render_queue_in_flight", labels, stats["in_flight"]))
+            dispatched.append(("cvtor_render_queue_dispatched_total", labels, stats["dispatched"]))
+            rejected.append(("cvtor_render_queue_rejected_total", labels, stats["rejected"]))
+    return [
+        ("cvtor_render_queue_waiting", "gauge", "Renders waiting for a slot", waiting),
+        ("cvtor_render_queue_in_flight", "gauge", "Renders currently running", in_flight),
+        ("cvtor_render_queue_dispatched", "counter", "Renders admitted by the scheduler", dispatched),
+        ("cvtor_render_queue_rejected", "counter", "Renders rejected because the queue was full", rejected),
+    ]
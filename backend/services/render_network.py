@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Réseau des pages de rendu PDF : tout passe par un gestionnaire de routes.
+
+Chaque requête émise par une page du pool est résolue ici, sans laisser
+Chromium accéder au réseau :
+  - polices vendorisées et images déjà en cache : lues sur disque hors de la boucle
+    (asyncio.to_thread) au premier passage, puis servies depuis la mémoire ;
+  - hôtes autorisés (RENDER_ALLOWED_HOSTS, ex. la feuille Font Awesome) :
+    téléchargés une fois avec un délai court puis servis depuis la mémoire ;
+  - images inconnues : remplacées par un pixel transparent, compté et
+    journalisé ; le PDF de la page est marqué dégradé (jamais mis en cache) ;
+  - tout le reste : bloqué.
+Un CV qui pointe vers une URL lente ne peut donc plus bloquer un rendu.
+
+Configuration (variables d'environnement) :
+  RENDER_ALLOWED_HOSTS       hôtes autorisés, séparés par des virgules
+                             (défaut cdnjs.cloudflare.com,fonts.googleapis.com,fonts.gstatic.com)
+  RENDER_FETCH_TIMEOUT       délai d'un téléchargement autorisé en secondes (défaut 3)
+  RENDER_ASSET_CACHE_BYTES   mémoire des ressources autorisées (défaut 32 Mo)
+  RENDER_ASSET_MAX_BYTES     taille maximum d'une ressource (défaut 5 Mo)
+  RENDER_RETRY_AFTER         délai avant de retenter une ressource en échec (défaut 300)
+"""
+import asyncio
+import base64
+import os
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from services.font_assets import FONT_FORMATS, FONTS_URL_PREFIX, font_library
+from services.image_cache import image_cache
+from services.metrics import metrics, missing_images
+
+RENDER_ALLOWED_HOSTS = {
+    h.strip().lower()
+    for h in os.getenv(
+        "RENDER_ALLOWED_HOSTS", "cdnjs.cloudflare.com,fonts.googleapis.com,fonts.gstatic.com"
+    ).split(",")
+    if h.strip()
+}
+RENDER_FETCH_TIMEOUT = float(os.getenv("RENDER_FETCH_TIMEOUT", "3"))
+RENDER_ASSET_CACHE_BYTES = int(os.getenv("RENDER_ASSET_CACHE_BYTES", str(32 * 1024 * 1024)))
+RENDER_ASSET_MAX_BYTES = int(os.getenv("RENDER_ASSET_MAX_BYTES", str(5 * 1024 * 1024)))
+RENDER_RETRY_AFTER = int(os.getenv("RENDER_RETRY_AFTER", "300"))
+
+# GIF 1x1 transparent servi à la place des images non autorisées
+BLANK_IMAGE = base64.b64decode("R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7")
+
+# Attente explicite après domcontentloaded : feuilles de style, images puis polices,
+# bornée par `timeout` (ms) pour que le rendu parte même si une ressource traîne.
+READY_SCRIPT = """
+async (timeout) => {
+  const settle = (el, done) => new Promise(r => {
+    if (done) return r();
+    el.addEventListener('load', r, { once: true });
+    el.addEventListener('error', r, { once: true });
+  });
+  const ready = (async () => {
+    const links = Array.from(document.querySelectorAll('link[rel="stylesheet"]'));
+    await Promise.all(links.map(l => settle(l, !!l.sheet)));
+    await Promise.all(Array.from(document.images).map(i => settle(i, i.complete)));
+    await document.fonts.ready;
+  })();
+  await Promise.race([ready, new Promise(r => setTimeout(r, timeout))]);
+  return true;
+}
+"""
+
+
+class RenderNetwork:
+    def __init__(
+        self,
+        allowed_hosts=RENDER_ALLOWED_HOSTS,
+        fetch_timeout: float = RENDER_FETCH_TIMEOUT,
+        cache_bytes: int = RENDER_ASSET_CACHE_BYTES,
+        max_asset_bytes: int = RENDER_ASSET_MAX_BYTES,
+    ):
+        self.allowed_hosts = set(allowed_hosts)
+        self.fetch_timeout = fetch_timeout
+        self.cache_bytes = cache_bytes
+        self.max_asset_bytes = max_asset_bytes
+        self._assets: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self._size = 0
+        self._failures: Dict[str, float] = {}
+        self._client = None
+        # Images remplacées par le pixel vide, par page, depuis le dernier take_stubbed
+        self._stubbed: "weakref.WeakKeyDictionary[Any, int]" = weakref.WeakKeyDictionary()
+        self.counters = {"local": 0, "memory": 0, "fetched": 0, "stubbed": 0, "blocked": 0}
+
+    async def install(self, page) -> None:
+        async def _handle(route) -> None:
+            await self.handle(route, page)
+        await page.route("**/*", _handle)
+
+    def take_stubbed(self, page) -> int:
+        """Nombre d'images remplacées dans `page` depuis l'appel précédent (remis à zéro)."""
+        return self._stubbed.pop(page, 0)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # --- Sources locales ---
+    @staticmethod
+    def _local_font(url: str) -> Optional[Tuple[bytes, str]]:
+        parsed = urlparse(url)
+        prefix = urlparse(FONTS_URL_PREFIX).path.rstrip("/") + "/"
+        if not parsed.path.startswith(prefix):
+            return None
+        path = (font_library.directory / parsed.path[len(prefix):]).resolve()
+        if font_library.directory.resolve() not in path.parents or not path.is_file():
+            return None
+        mime, _ = FONT_FORMATS.get(path.suffix, ("application/octet-stream", ""))
+        return path.read_bytes(), mime
+
+    def _read_local(self, url: str) -> Optional[Tuple[bytes, str]]:
+        # Lectures disque : exécuté dans un thread, jamais sur la boucle de Playwright
+        local = self._local_font(url)
+        if local is None:
+            local = image_cache.cached(url)
+        return local
+
+    def _remember(self, url: str, content: bytes, content_type: str) -> None:
+        if len(content) > self.cache_bytes:
+            return
+        self._assets[url] = (content, content_type)
+        self._size += len(content)
+        while self._size > self.cache_bytes:
+            _, (evicted, _) = self._assets.popitem(last=False)
+            self._size -= len(evicted)
+
+    async def _fetch(self, url: str) -> Optional[Tuple[bytes, str]]:
+        failed_at = self._failures.get(url)
+        if failed_at is not None and time.time() - failed_at < RENDER_RETRY_AFTER:
+            return None
+        import httpx
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.fetch_timeout, follow_redirects=False)
+        try:
+            response = await self._client.get(url)
+            if response.status_code != 200 or len(response.content) > self.max_asset_bytes:
+                raise ValueError(f"HTTP {response.status_code}, {len(response.content)} bytes")
+        except Exception as e:
+            print(f"[Render network] {url}: {e}")
+            self._failures[url] = time.time()
+            return None
+        content_type = response.headers.get("content-type", "application/octet-stream")
+        self._remember(url, response.content, content_type)
+        self.counters["fetched"] += 1
+        return response.content, content_type
+
+    # --- Gestionnaire de routes ---
+    async def handle(self, route, page=None) -> None:
+        request = route.request
+        url = request.url
+
+        cached = self._assets.get(url)
+        if cached is not None:
+            self._assets.move_to_end(url)
+            self.counters["memory"] += 1
+            return await route.fulfill(status=200, body=cached[0], content_type=cached[1])
+
+        parsed = urlparse(url)
+        if parsed.scheme in ("http", "https"):
+            local = await asyncio.to_thread(self._read_local, url)
+            if local is not None:
+                self._remember(url, *local)
+                self.counters["local"] += 1
+                return await route.fulfill(status=200, body=local[0], content_type=local[1])
+
+        if parsed.scheme in ("http", "https") and (parsed.hostname or "").lower() in self.allowed_hosts:
+            fetched = await self._fetch(url)
+            if fetched is not None:
+                return await route.fulfill(status=200, body=fetched[0], content_type=fetched[1])
+
+        if request.resource_type == "image":
+            # Image fournie par l'utilisateur mais indisponible : le PDF diffère de l'aperçu
+            self.counters["stubbed"] += 1
+            missing_images.inc(stage="network")
+            print(f"[Render network] Image unavailable, blank served: {url[:200]}")
+            if page is not None:
+                self._stubbed[page] = self._stubbed.get(page, 0) + 1
+            return await route.fulfill(status=200, body=BLANK_IMAGE, content_type="image/gif")
+        self.counters["blocked"] += 1
+        await route.abort("blockedbyclient")
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "cached_assets": len(self._assets), "cached_bytes": self._size}
+
+
+render_network = RenderNetwork()
+
+
+@metrics.collector
+def _network_metrics():
+    return [(
+        "cvtor_render_requests", "counter", "Sub-resource requests from render pages by resolution",
+        [("cvtor_render_requests_total", {"source": source}, count) for source, count in render_network.counters.items()],
+    )]
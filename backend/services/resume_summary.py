@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Aperçu d'un CV gardé dans la colonne resumes.summary.
+
+Calculé à chaque écriture de `data` (création, PUT, PATCH) et, pour les CV
+enregistrés avant la colonne, par la mise à niveau du schéma
+(database/migrations.py). La liste GET /resumes/?fields=summary le lit
+sans charger le document complet.
+"""
+from typing import Any, Dict
+
+SUMMARY_TEXT_MAX = 120
+
+
+def resume_summary(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Aperçu de quelques centaines d'octets : nom, intitulé et nombre d'entrées par section."""
+    if not isinstance(data, dict):
+        data = {}
+    profile = data.get("profile") if isinstance(data.get("profile"), dict) else {}
+    sections = {}
+    for key, value in data.items():
+        if isinstance(value, list):
+            sections[key] = len(value)
+        elif isinstance(value, dict) and isinstance(value.get("groups"), list):
+            sections[key] = len(value["groups"])
+    return {
+        "name": str(profile.get("name") or "")[:SUMMARY_TEXT_MAX] or None,
+        "headline": str(profile.get("title") or "")[:SUMMARY_TEXT_MAX] or None,
+        "sections": sections,
+    }
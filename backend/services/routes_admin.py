@@ -7,9 +7,15 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from database.database import get_db
+from database.database import get_db, pool_stats
 from models.models import Template, Category, User
-from auth.auth import get_current_user
+from auth.auth import get_current_active_db_user
+from auth.passwords import password_hasher
+from auth.rate_limit import auth_limiter
+from auth.user_cache import user_cache
+from services.template_registry import TemplateNotFound, registry as template_registry
+from services.render_cache import render_cache
+from services.render_limiter import render_limiters
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -68,7 +74,9 @@ class TemplateResponse(BaseModel):
     class Config:
         from_attributes = True
 
-def verify_admin(current_user: User = Depends(get_current_user)):
+# Relu en base : les drapeaux admin/actif changent hors de l'API (sans invalidate_user),
+# les claims du jeton ne suffisent pas à ouvrir l'administration
+def verify_admin(current_user: User = Depends(get_current_active_db_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Access forbidden: admin only")
     return current_user
@@ -153,8 +161,9 @@ def get_template(
         raise HTTPException(status_code=404, detail="Template not found")
     return template
 
+# Routes d'écriture synchrones : requêtes et fichier envoyé traités dans le threadpool
 @router.post("/templates", response_model=TemplateResponse)
-async def create_template(
+def create_template(
     title: str = Form(...),
     slug: str = Form(...),
     description: Optional[str] = Form(None),
@@ -175,7 +184,7 @@ async def create_template(
         file_ext = thumbnail.filename.split(".")[-1]
         file_path = UPLOAD_DIR / f"{slug}_thumbnail.{file_ext}"
         with open(file_path, "wb") as f:
-            content = await thumbnail.read()
+            content = thumbnail.file.read()
             f.write(content)
         thumbnail_url = f"/uploads/{file_path.name}"
     
@@ -195,7 +204,7 @@ async def create_template(
     return db_template
 
 @router.put("/templates/{template_id}", response_model=TemplateResponse)
-async def update_template(
+def update_template(
     template_id: int,
     title: Optional[str] = Form(None),
     slug: Optional[str] = Form(None),
@@ -231,7 +240,7 @@ async def update_template(
         file_ext = thumbnail.filename.split(".")[-1]
         file_path = UPLOAD_DIR / f"{db_template.slug}_thumbnail.{file_ext}"
         with open(file_path, "wb") as f:
-            content = await thumbnail.read()
+            content = thumbnail.file.read()
             f.write(content)
         db_template.thumbnail_url = f"/uploads/{file_path.name}"
     
@@ -259,7 +268,7 @@ def delete_template(
     return {"message": "Template deleted successfully"}
 
 @router.post("/templates/{template_id}/upload-thumbnail")
-async def upload_template_thumbnail(
+def upload_template_thumbnail(
     template_id: int,
     thumbnail: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -272,7 +281,7 @@ async def upload_template_thumbnail(
     file_ext = thumbnail.filename.split(".")[-1]
     file_path = UPLOAD_DIR / f"{db_template.slug}_thumbnail.{file_ext}"
     with open(file_path, "wb") as f:
-        content = await thumbnail.read()
+        content = thumbnail.file.read()
         f.write(content)
     
     db_template.thumbnail_url = f"/uploads/{file_path.name}"
@@ -280,3 +289,43 @@ async def upload_template_thumbnail(
     db.refresh(db_template)
     
     return {"thumbnail_url": db_template.thumbnail_url}
+
+@router.post("/cache/templates/reload")
+def reload_template_files(
+    name: Optional[str] = None,
+    admin: User = Depends(verify_admin)
+):
+    try:
+        reloaded = template_registry.reload(name)
+    except TemplateNotFound:
+        raise HTTPException(status_code=404, detail=f"Template '{name}' not found")
+    return {"reloaded": reloaded}
+
+@router.get("/cache/render")
+def get_render_cache_stats(admin: User = Depends(verify_admin)):
+    return render_cache.stats()
+
+@router.get("/cache/users")
+def get_user_cache_stats(admin: User = Depends(verify_admin)):
+    # Résolutions de l'utilisateur authentifié : claims du jeton, cache ou base
+    return user_cache.stats()
+
+@router.get("/auth/limits")
+def get_auth_limits(admin: User = Depends(verify_admin)):
+    # Pool de hachage bcrypt (file d'attente) et compteurs anti force brute
+    return {"password_hasher": password_hasher.stats(), "rate_limiter": auth_limiter.stats()}
+
+@router.delete("/cache/render")
+def clear_render_cache(admin: User = Depends(verify_admin)):
+    render_cache.clear()
+    return {"message": "Render cache cleared"}
+
+@router.get("/render/queues")
+def get_render_queue_stats(admin: User = Depends(verify_admin)):
+    # Profondeur des files de rendu par formule (PDF, DOCX)
+    return {kind: limiter.stats() for kind, limiter in render_limiters().items()}
+
+@router.get("/db/pool")
+def get_db_pool_stats(admin: User = Depends(verify_admin)):
+    # Connexions ouvertes, empruntées et en débordement par moteur (sync, async)
+    return pool_stats()
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from services.artifact_store import artifact_store
+from services.exports import MEDIA_TYPES
+
+router = APIRouter(prefix="/artifacts", tags=["Artifacts"])
+
+@router.get("/{owner}/{name}")
+def download_artifact(owner: str, name: str, expires: int, filename: str, sig: str):
+    path = artifact_store.resolve(owner, name, expires, filename, sig)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Artifact not found or link expired")
+    return FileResponse(
+        path,
+        media_type=MEDIA_TYPES.get(path.suffix.lstrip("."), "application/octet-stream"),
+        filename=filename,
+    )
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
+
+from database.database import get_db
+from models.models import User, Resume, ExportJob
+from auth.auth import get_current_active_user, get_current_user_optional
+from services.export_jobs import EXPORT_MAX_BATCH, enqueue_export, job_status
+from services.exports import render_priority
+from services.render_limiter import get_render_limiter
+
+router = APIRouter(prefix="/exports", tags=["Exports"])
+
+class ExportJobCreate(BaseModel):
+    format: Literal["pdf", "docx"] = "pdf"
+    resume_ids: List[int] = Field(min_length=1)
+
+@router.post("/", status_code=status.HTTP_202_ACCEPTED)
+def create_export_job(
+    job_data: ExportJobCreate,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    resume_ids = list(dict.fromkeys(job_data.resume_ids))
+    if len(resume_ids) > EXPORT_MAX_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {EXPORT_MAX_BATCH} resumes per export"
+        )
+    
+    owned = db.query(Resume.id).filter(
+        Resume.user_id == current_user.id,
+        Resume.id.in_(resume_ids)
+    ).count()
+    if owned != len(resume_ids):
+        raise HTTPException(status_code=404, detail="Resume not found")
+    
+    job = enqueue_export(db, current_user.id, job_data.format, resume_ids)
+    return job_status(job, db)
+
+@router.get("/queue")
+async def get_render_queue(request: Request, current_user: Optional[User] = Depends(get_current_user_optional)):
+    # Position du demandeur dans les files de rendu synchrones (PDF et DOCX).
+    # async : l'état des RenderLimiter n'est lu et modifié que sur la boucle,
+    # jamais depuis le threadpool pendant qu'un dispatch le change
+    plan, user = render_priority(current_user, request.client.host if request.client else None)
+    return {
+        "plan": plan,
+        "pdf": get_render_limiter("pdf").queue_info(user),
+        "docx": get_render_limiter("docx").queue_info(user),
+    }
+
+@router.get("/{job_id}")
+def get_export_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    job = db.query(ExportJob).filter(
+        ExportJob.id == job_id,
+        ExportJob.user_id == current_user.id
+    ).first()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    
+    return job_status(job, db)
@@ -1,21 +1,22 @@
 #!/usr/bin/env python3
 import os
-import fedapay
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from database.database import get_db
+from database.database import get_db, get_session, run_db
 from models.models import User, SubscriptionPlan
-from auth.auth import get_current_active_user
+from auth.auth import get_current_active_db_user, get_current_active_user, invalidate_user
 
 FEDAPAY_API_KEY = os.getenv("FEDAPAY_SECRET_KEY")
 FEDAPAY_ENVIRONMENT = os.getenv("FEDAPAY_ENVIRONMENT", "sandbox")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5000")
-
-if FEDAPAY_API_KEY:
-    fedapay.api_key = FEDAPAY_API_KEY
-    fedapay.environment = FEDAPAY_ENVIRONMENT
+# API REST FedaPay (surchargée par le faux FedaPay de loadtest/ pendant un test de charge)
+FEDAPAY_API_BASE = os.getenv(
+    "FEDAPAY_API_BASE",
+    "https://api.fedapay.com" if FEDAPAY_ENVIRONMENT == "live" else "https://sandbox-api.fedapay.com",
+)
+FEDAPAY_TIMEOUT = float(os.getenv("FEDAPAY_TIMEOUT", "15"))
 
 router = APIRouter(prefix="/fedapay", tags=["FedaPay"])
 
@@ -23,10 +24,23 @@ class CreateCheckoutSession(BaseModel):
     plan: str
     amount: int = 5000
 
+async def fedapay_request(method: str, path: str, payload: dict | None = None) -> dict:
+    # Le SDK fedapay installé ne fournit que les webhooks : appels REST directs.
+    # httpx n'est importé qu'au premier paiement.
+    import httpx
+
+    async with httpx.AsyncClient(base_url=FEDAPAY_API_BASE, timeout=FEDAPAY_TIMEOUT) as client:
+        response = await client.request(
+            method, path, json=payload, headers={"Authorization": f"Bearer {FEDAPAY_API_KEY}"}
+        )
+    if response.status_code >= 400:
+        raise ValueError(f"HTTP {response.status_code}: {response.text[:200]}")
+    return response.json()
+
 @router.post("/create-checkout-session")
 async def create_checkout_session(
     data: CreateCheckoutSession,
-    current_user: User = Depends(get_current_active_user),
+    current_user: User = Depends(get_current_active_db_user),
     db: Session = Depends(get_db)
 ):
     if not FEDAPAY_API_KEY:
@@ -36,9 +50,7 @@ async def create_checkout_session(
         )
     
     try:
-        from fedapay import Transaction
-        
-        transaction = Transaction.create({
+        created = await fedapay_request("POST", "/v1/transactions", {
             'amount': data.amount,
             'description': f'Abonnement {data.plan.upper()} - CVtor',
             'currency': {
@@ -55,13 +67,14 @@ async def create_checkout_session(
                 'plan': data.plan
             }
         })
+        transaction = created.get("v1/transaction", created)
         
-        token = transaction.generate_token()
+        token = await fedapay_request("POST", f"/v1/transactions/{transaction['id']}/token")
         
         return {
-            "checkout_url": token.url,
-            "transaction_id": transaction.id,
-            "token": token.token
+            "checkout_url": token["url"],
+            "transaction_id": transaction["id"],
+            "token": token["token"]
         }
     
     except Exception as e:
@@ -70,45 +83,50 @@ async def create_checkout_session(
             detail=f"FedaPay error: {str(e)}"
         )
 
-@router.post("/webhook")
-async def fedapay_webhook(request: Request, db: Session = Depends(get_db)):
-    try:
-        payload = await request.json()
+def _apply_event(db: Session, payload: dict) -> dict:
+    event_type = payload.get('type')
+    event_data = payload.get('data', {})
+    
+    if event_type == 'transaction.approved':
+        transaction_id = event_data.get('id')
+        metadata = event_data.get('metadata', {})
         
-        event_type = payload.get('type')
-        event_data = payload.get('data', {})
+        if not metadata.get('user_id'):
+            print(f"[FedaPay webhook] No user_id in metadata for transaction {transaction_id}")
+            return {"status": "ignored", "reason": "missing_user_id"}
         
-        if event_type == 'transaction.approved':
-            transaction_id = event_data.get('id')
-            metadata = event_data.get('metadata', {})
-            
-            if not metadata.get('user_id'):
-                print(f"[FedaPay webhook] No user_id in metadata for transaction {transaction_id}")
-                return {"status": "ignored", "reason": "missing_user_id"}
-            
-            try:
-                user_id = int(metadata['user_id'])
-            except (ValueError, TypeError) as e:
-                print(f"[FedaPay webhook] Invalid user_id in metadata: {metadata.get('user_id')}, error: {e}")
-                return {"status": "error", "reason": "invalid_user_id"}
-            
-            user = db.query(User).filter(User.id == user_id).first()
-            if user:
-                plan = metadata.get('plan', 'premium')
-                if plan.lower() == 'premium':
-                    user.subscription_plan = SubscriptionPlan.PREMIUM
-                    db.commit()
-                    print(f"[FedaPay webhook] User {user_id} upgraded to premium via FedaPay")
-                else:
-                    print(f"[FedaPay webhook] Unknown plan: {plan}")
-            else:
-                print(f"[FedaPay webhook] User {user_id} not found")
+        try:
+            user_id = int(metadata['user_id'])
+        except (ValueError, TypeError) as e:
+            print(f"[FedaPay webhook] Invalid user_id in metadata: {metadata.get('user_id')}, error: {e}")
+            return {"status": "error", "reason": "invalid_user_id"}
         
-        elif event_type == 'transaction.declined':
-            transaction_id = event_data.get('id')
-            print(f"[FedaPay webhook] Transaction {transaction_id} declined")
+        user = db.query(User).filter(User.id == user_id).first()
+        if user:
+            plan = metadata.get('plan', 'premium')
+            if plan.lower() == 'premium':
+                user.subscription_plan = SubscriptionPlan.PREMIUM
+                db.commit()
+                invalidate_user(user.email)
+                print(f"[FedaPay webhook] User {user_id} upgraded to premium via FedaPay")
+            else:
+                print(f"[FedaPay webhook] Unknown plan: {plan}")
+        else:
+            print(f"[FedaPay webhook] User {user_id} not found")
+    
+    elif event_type == 'transaction.declined':
+        transaction_id = event_data.get('id')
+        print(f"[FedaPay webhook] Transaction {transaction_id} declined")
+    
+    return {"status": "success"}
+
+@router.post("/webhook")
+async def fedapay_webhook(request: Request, db=Depends(get_session)):
+    try:
+        payload = await request.json()
         
-        return {"status": "success"}
+        # Mise à jour de l'abonnement hors de la boucle d'événements
+        return await run_db(db, _apply_event, payload)
     
     except Exception as e:
         print(f"[FedaPay webhook] Error processing webhook: {str(e)}")
@@ -129,15 +147,14 @@ async def get_transaction_status(
         )
     
     try:
-        from fedapay import Transaction
-        
-        transaction = Transaction.retrieve(transaction_id)
+        retrieved = await fedapay_request("GET", f"/v1/transactions/{transaction_id}")
+        transaction = retrieved.get("v1/transaction", retrieved)
         
         return {
-            "id": transaction.id,
-            "status": transaction.status,
-            "amount": transaction.amount,
-            "description": transaction.description
+            "id": transaction["id"],
+            "status": transaction["status"],
+            "amount": transaction["amount"],
+            "description": transaction["description"]
         }
     
     except Exception as e:
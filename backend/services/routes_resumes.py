@@ -1,13 +1,23 @@
 #!/usr/bin/env python3
-from typing import List, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Dict, Any, Literal
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from sqlalchemy.orm.exc import StaleDataError
+from pydantic import BaseModel, field_validator
 
-from database.database import get_db
+from database.database import get_db, get_session, run_db
 from models.models import User, Resume
-from auth.auth import get_current_active_user, check_quota
-import json
+from auth.auth import get_current_active_db_user, get_current_active_user, check_quota
+from services.etags import PRIVATE_CACHE_CONTROL, check_if_match, etag_of, none_match, not_modified
+from services.exports import ZIP_MEDIA_TYPE, render_priority, render_resume_entries
+from services.input_limits import check_resume_data
+from services.json_patch import (
+    JSON_PATCH_MEDIA_TYPE, MERGE_PATCH_MEDIA_TYPE, JsonPatchConflict, JsonPatchError, apply_json_patch,
+    apply_merge_patch,
+)
+from services.resume_summary import resume_summary
+from services.zip_stream import zip_stream
 
 router = APIRouter(prefix="/resumes", tags=["Resumes"])
 
@@ -16,11 +26,15 @@ class ResumeCreate(BaseModel):
     template_name: str
     data: Dict[str, Any]
 
+    _check_data = field_validator("data")(check_resume_data)
+
 class ResumeUpdate(BaseModel):
     title: str | None = None
     template_name: str | None = None
     data: Dict[str, Any] | None = None
 
+    _check_data = field_validator("data")(check_resume_data)
+
 class ResumeResponse(BaseModel):
     id: int
     user_id: int
@@ -28,35 +42,83 @@ class ResumeResponse(BaseModel):
     template_name: str
     data: Dict[str, Any]
     is_public: bool
+    version: int
     created_at: str
     updated_at: str | None
     
     class Config:
         from_attributes = True
 
-@router.get("/", response_model=List[ResumeResponse])
+class ResumeListItem(BaseModel):
+    id: int
+    user_id: int | None = None
+    title: str | None = None
+    template_name: str | None = None
+    is_public: bool | None = None
+    created_at: str | None = None
+    updated_at: str | None = None
+    summary: Dict[str, Any] | None = None
+    data: Dict[str, Any] | None = None
+
+# Liste : seules les colonnes demandées sont lues, `data` (le document
+# complet) uniquement si `fields` le contient ; `summary` est calculé à
+# l'écriture (services/resume_summary.py). Pagination par clé :
+# X-Next-Cursor donne l'`after` suivant.
+LIST_FIELDS = ("id", "user_id", "title", "template_name", "is_public", "created_at", "updated_at", "summary", "data")
+DEFAULT_LIST_FIELDS = ("id", "user_id", "title", "template_name", "is_public", "created_at", "updated_at")
+LIST_MAX_LIMIT = 100
+
+def _list_fields(fields: str | None) -> List[str]:
+    if fields is None:
+        return list(DEFAULT_LIST_FIELDS)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in LIST_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(LIST_FIELDS)}"
+        )
+    # id est toujours renvoyé : c'est le curseur
+    return ["id"] + [name for name in LIST_FIELDS if name in names and name != "id"]
+
+@router.get("/", response_model=List[ResumeListItem], response_model_exclude_unset=True)
 def list_my_resumes(
+    response: Response,
+    fields: str | None = Query(None, description="Comma-separated: " + ", ".join(LIST_FIELDS)),
+    limit: int | None = Query(None, ge=1, le=LIST_MAX_LIMIT),
+    after: int | None = Query(None, description="Cursor: X-Next-Cursor of the previous page"),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    resumes = db.query(Resume).filter(Resume.user_id == current_user.id).all()
-    return [
-        {
-            "id": r.id,
-            "user_id": r.user_id,
-            "title": r.title,
-            "template_name": r.template_name,
-            "data": json.loads(r.data),
-            "is_public": r.is_public,
-            "created_at": str(r.created_at),
-            "updated_at": str(r.updated_at) if r.updated_at else None
-        }
-        for r in resumes
-    ]
+    names = _list_fields(fields)
+    query = db.query(*[getattr(Resume, name) for name in names]).filter(Resume.user_id == current_user.id)
+    if after is not None:
+        query = query.filter(Resume.id > after)
+    query = query.order_by(Resume.id)
+    rows = query.limit(limit + 1).all() if limit is not None else query.all()
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    
+    items = []
+    for row in rows:
+        item = {}
+        for name in names:
+            value = getattr(row, name)
+            if name in ("created_at", "updated_at"):
+                value = str(value) if value else None
+            elif name == "summary" and value is None:
+                # Ligne écrite hors de l'API (SQL direct) : calculé sans être stocké,
+                # GET ne modifie rien (ni la version ni l'ETag du CV)
+                value = resume_summary(db.query(Resume.data).filter(Resume.id == row.id).scalar())
+            item[name] = value
+        items.append(item)
+    return items
 
+# Quota : formule relue en base, une mise à niveau compte immédiatement
 @router.get("/quota")
 def get_quota(
-    current_user: User = Depends(get_current_active_user),
+    current_user: User = Depends(get_current_active_db_user),
     db: Session = Depends(get_db)
 ):
     resume_count = db.query(Resume).filter(Resume.user_id == current_user.id).count()
@@ -70,10 +132,93 @@ def get_quota(
         "can_create_more": can_create
     }
 
+def _user_resumes(db: Session, user_id: int) -> List[Resume]:
+    return db.query(Resume).filter(Resume.user_id == user_id).order_by(Resume.id).all()
+
+@router.get("/export-all")
+async def export_all_resumes(
+    format: Literal["pdf", "docx", "both"] = "pdf",
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_session)
+):
+    resumes = await run_db(db, _user_resumes, current_user.id)
+    if not resumes:
+        raise HTTPException(status_code=404, detail="No resumes to export")
+    
+    items = [(r.id, r.title, r.template_name, r.data) for r in resumes]
+    formats = ["pdf", "docx"] if format == "both" else [format]
+    plan, user = render_priority(current_user)
+    
+    # Les entrées sont rendues en parallèle et écrites dans le ZIP dès qu'elles sont prêtes
+    return StreamingResponse(
+        zip_stream(render_resume_entries(items, formats, plan=plan, user=user)),
+        media_type=ZIP_MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="CVs.zip"'}
+    )
+
+def _resume_response(resume: Resume) -> Dict[str, Any]:
+    return {
+        "id": resume.id,
+        "user_id": resume.user_id,
+        "title": resume.title,
+        "template_name": resume.template_name,
+        "data": resume.data,
+        "is_public": resume.is_public,
+        "version": resume.version,
+        "created_at": str(resume.created_at),
+        "updated_at": str(resume.updated_at) if resume.updated_at else None
+    }
+
+def _owned_resume(db: Session, resume_id: int, user_id: int) -> Resume:
+    resume = db.query(Resume).filter(
+        Resume.id == resume_id,
+        Resume.user_id == user_id
+    ).first()
+    
+    if not resume:
+        raise HTTPException(status_code=404, detail="Resume not found")
+    return resume
+
+def _version_conflict(current_version: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={"message": "Resume was modified by another request", "version": current_version}
+    )
+
+def resume_etag(resume_id: int, version: int) -> str:
+    # version_id_col : toute écriture change la version, donc l'ETag
+    return etag_of(("resume", resume_id, version))
+
+def _set_etag(response: Response, resume: Resume) -> None:
+    response.headers["ETag"] = resume_etag(resume.id, resume.version)
+    response.headers["Cache-Control"] = PRIVATE_CACHE_CONTROL
+
+def _check_preconditions(request: Request, resume: Resume, expected: int | None) -> None:
+    # If-Match (ETag lu par le client) : 412 ; ?version= : 409
+    check_if_match(request, resume_etag(resume.id, resume.version), "resume")
+    _check_version(resume, expected)
+
+def _check_version(resume: Resume, expected: int | None) -> None:
+    # Verrou optimiste : le client envoie la version qu'il a lue
+    if expected is not None and expected != resume.version:
+        raise _version_conflict(resume.version)
+
+def _commit_resume(db: Session, resume: Resume) -> None:
+    resume_id = resume.id
+    try:
+        db.commit()
+    except StaleDataError:
+        # Écriture concurrente entre la lecture et l'UPDATE (WHERE version = ...)
+        db.rollback()
+        current = db.query(Resume.version).filter(Resume.id == resume_id).scalar()
+        raise _version_conflict(current)
+    db.refresh(resume)
+
 @router.post("/", response_model=ResumeResponse, status_code=status.HTTP_201_CREATED)
 def create_resume(
     resume_data: ResumeCreate,
-    current_user: User = Depends(get_current_active_user),
+    response: Response,
+    current_user: User = Depends(get_current_active_db_user),
     db: Session = Depends(get_db)
 ):
     resume_count = db.query(Resume).filter(Resume.user_id == current_user.id).count()
@@ -88,97 +233,132 @@ def create_resume(
         user_id=current_user.id,
         title=resume_data.title,
         template_name=resume_data.template_name,
-        data=json.dumps(resume_data.data)
+        data=resume_data.data,
+        summary=resume_summary(resume_data.data)
     )
     db.add(new_resume)
     db.commit()
     db.refresh(new_resume)
     
-    return {
-        "id": new_resume.id,
-        "user_id": new_resume.user_id,
-        "title": new_resume.title,
-        "template_name": new_resume.template_name,
-        "data": json.loads(new_resume.data),
-        "is_public": new_resume.is_public,
-        "created_at": str(new_resume.created_at),
-        "updated_at": str(new_resume.updated_at) if new_resume.updated_at else None
-    }
+    _set_etag(response, new_resume)
+    return _resume_response(new_resume)
 
 @router.get("/{resume_id}", response_model=ResumeResponse)
 def get_resume(
     resume_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    resume = db.query(Resume).filter(
-        Resume.id == resume_id,
-        Resume.user_id == current_user.id
-    ).first()
+    if request.headers.get("if-none-match"):
+        # Seule la version est lue : un CV inchangé n'est ni chargé ni resérialisé
+        version = db.query(Resume.version).filter(
+            Resume.id == resume_id,
+            Resume.user_id == current_user.id
+        ).scalar()
+        if version is None:
+            raise HTTPException(status_code=404, detail="Resume not found")
+        etag = resume_etag(resume_id, version)
+        if none_match(request, etag, "resume"):
+            return not_modified(etag, PRIVATE_CACHE_CONTROL)
     
-    if not resume:
-        raise HTTPException(status_code=404, detail="Resume not found")
-    
-    return {
-        "id": resume.id,
-        "user_id": resume.user_id,
-        "title": resume.title,
-        "template_name": resume.template_name,
-        "data": json.loads(resume.data),
-        "is_public": resume.is_public,
-        "created_at": str(resume.created_at),
-        "updated_at": str(resume.updated_at) if resume.updated_at else None
-    }
+    resume = _owned_resume(db, resume_id, current_user.id)
+    _set_etag(response, resume)
+    return _resume_response(resume)
 
 @router.put("/{resume_id}", response_model=ResumeResponse)
 def update_resume(
     resume_id: int,
     resume_data: ResumeUpdate,
+    request: Request,
+    response: Response,
+    version: int | None = Query(None, description="Version read by the client (409 if the resume changed since)"),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    resume = db.query(Resume).filter(
-        Resume.id == resume_id,
-        Resume.user_id == current_user.id
-    ).first()
-    
-    if not resume:
-        raise HTTPException(status_code=404, detail="Resume not found")
+    resume = _owned_resume(db, resume_id, current_user.id)
+    _check_preconditions(request, resume, version)
     
     if resume_data.title is not None:
         resume.title = resume_data.title
     if resume_data.template_name is not None:
         resume.template_name = resume_data.template_name
     if resume_data.data is not None:
-        resume.data = json.dumps(resume_data.data)
+        resume.data = resume_data.data
+        resume.summary = resume_summary(resume_data.data)
     
-    db.commit()
-    db.refresh(resume)
+    _commit_resume(db, resume)
     
-    return {
-        "id": resume.id,
-        "user_id": resume.user_id,
-        "title": resume.title,
-        "template_name": resume.template_name,
-        "data": json.loads(resume.data),
-        "is_public": resume.is_public,
-        "created_at": str(resume.created_at),
-        "updated_at": str(resume.updated_at) if resume.updated_at else None
-    }
+    _set_etag(response, resume)
+    return _resume_response(resume)
+
+# Sauvegarde automatique de l'éditeur : seul le delta de `data` est envoyé
+# (JSON Patch ou merge patch, services/json_patch.py) et appliqué ici.
+# `Prefer: return=minimal` : 204 et X-Resume-Version au lieu du document.
+@router.patch(
+    "/{resume_id}",
+    response_model=ResumeResponse,
+    openapi_extra={"requestBody": {"content": {
+        JSON_PATCH_MEDIA_TYPE: {"schema": {"type": "array", "items": {"type": "object"}}},
+        MERGE_PATCH_MEDIA_TYPE: {"schema": {"type": "object"}},
+    }}},
+)
+def patch_resume(
+    resume_id: int,
+    request: Request,
+    response: Response,
+    patch: List[Dict[str, Any]] | Dict[str, Any] = Body(...),
+    version: int | None = Query(None, description="Version read by the client (409 if the resume changed since)"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    json_patch = content_type == JSON_PATCH_MEDIA_TYPE or (
+        content_type != MERGE_PATCH_MEDIA_TYPE and isinstance(patch, list)
+    )
+    if json_patch != isinstance(patch, list):
+        raise HTTPException(
+            status_code=400,
+            detail="JSON Patch bodies are arrays of operations, merge patches are objects"
+        )
+    
+    resume = _owned_resume(db, resume_id, current_user.id)
+    _check_preconditions(request, resume, version)
+    
+    try:
+        data = apply_json_patch(resume.data, patch) if json_patch else apply_merge_patch(resume.data, patch)
+    except JsonPatchConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except JsonPatchError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Resume data must stay an object")
+    try:
+        check_resume_data(data)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    
+    resume.data = data
+    resume.summary = resume_summary(data)
+    _commit_resume(db, resume)
+    
+    _set_etag(response, resume)
+    if "return=minimal" in request.headers.get("prefer", ""):
+        return Response(status_code=status.HTTP_204_NO_CONTENT, headers={
+            "X-Resume-Version": str(resume.version), "ETag": response.headers["ETag"],
+        })
+    return _resume_response(resume)
 
 @router.delete("/{resume_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_resume(
     resume_id: int,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    resume = db.query(Resume).filter(
-        Resume.id == resume_id,
-        Resume.user_id == current_user.id
-    ).first()
-    
-    if not resume:
-        raise HTTPException(status_code=404, detail="Resume not found")
+    resume = _owned_resume(db, resume_id, current_user.id)
+    check_if_match(request, resume_etag(resume.id, resume.version), "resume")
     
     db.delete(resume)
     db.commit()
@@ -1,43 +1,65 @@
 #!/usr/bin/env python3
 import os
-import stripe
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from database.database import get_db
+from database.database import get_session, run_db
 from models.models import User, SubscriptionPlan
-from auth.auth import get_current_active_user
+from auth.auth import get_current_active_db_user, invalidate_user
 
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5000")
+# Base de l'API Stripe (ex. le faux Stripe de loadtest/ pendant un test de charge)
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE")
+
+_stripe_module = None
+
+def get_stripe():
+    """SDK Stripe configuré, importé au premier paiement (ou par le préchargement, services/warmup.py)."""
+    global _stripe_module
+    if _stripe_module is None:
+        import stripe
+        stripe.api_key = STRIPE_SECRET_KEY
+        if STRIPE_API_BASE:
+            stripe.api_base = STRIPE_API_BASE
+        _stripe_module = stripe
+    return _stripe_module
 
 router = APIRouter(prefix="/stripe", tags=["Stripe"])
 
 class CreateCheckoutSession(BaseModel):
     plan: str  # "premium"
 
+def _save_customer_id(db: Session, user: User, customer_id: str) -> None:
+    user.stripe_customer_id = customer_id
+    db.commit()
+    invalidate_user(user.email)
+
 @router.post("/create-checkout-session")
 async def create_checkout_session(
     data: CreateCheckoutSession,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_db_user),
+    db=Depends(get_session)
 ):
-    if not stripe.api_key:
+    if not STRIPE_SECRET_KEY:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Stripe is not configured"
         )
+    stripe = get_stripe()
     
     try:
         if not current_user.stripe_customer_id:
-            customer = stripe.Customer.create(
+            # Le SDK Stripe est synchrone : appels réseau dans le threadpool
+            customer = await run_in_threadpool(
+                stripe.Customer.create,
                 email=current_user.email,
                 metadata={"user_id": current_user.id}
             )
-            current_user.stripe_customer_id = customer.id
-            db.commit()
+            await run_db(db, _save_customer_id, current_user, customer.id)
         
         price_id = os.getenv("STRIPE_PREMIUM_PRICE_ID")
         if not price_id:
@@ -46,7 +68,8 @@ async def create_checkout_session(
                 detail="Stripe price ID not configured"
             )
         
-        session = stripe.checkout.Session.create(
+        session = await run_in_threadpool(
+            stripe.checkout.Session.create,
             customer=current_user.stripe_customer_id,
             payment_method_types=["card"],
             line_items=[
@@ -69,26 +92,7 @@ async def create_checkout_session(
             detail=str(e)
         )
 
-@router.post("/webhook")
-async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
-    payload = await request.body()
-    sig_header = request.headers.get("stripe-signature")
-    
-    if not STRIPE_WEBHOOK_SECRET:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Webhook secret not configured"
-        )
-    
-    try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, STRIPE_WEBHOOK_SECRET
-        )
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid payload")
-    except stripe.error.SignatureVerificationError:
-        raise HTTPException(status_code=400, detail="Invalid signature")
-    
+def _apply_event(db: Session, event) -> dict:
     if event["type"] == "checkout.session.completed":
         session = event["data"]["object"]
         metadata = session.get("metadata", {})
@@ -108,6 +112,7 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
             user.subscription_plan = SubscriptionPlan.PREMIUM
             user.stripe_subscription_id = session.get("subscription")
             db.commit()
+            invalidate_user(user.email)
             print(f"[Stripe webhook] User {user_id} upgraded to premium")
         else:
             print(f"[Stripe webhook] User {user_id} not found")
@@ -127,21 +132,47 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
             user.subscription_plan = SubscriptionPlan.FREE
             user.stripe_subscription_id = None
             db.commit()
+            invalidate_user(user.email)
             print(f"[Stripe webhook] User {user.id} downgraded to free")
         else:
             print(f"[Stripe webhook] User with subscription {subscription_id} not found")
     
     return {"status": "success"}
 
+@router.post("/webhook")
+async def stripe_webhook(request: Request, db=Depends(get_session)):
+    payload = await request.body()
+    sig_header = request.headers.get("stripe-signature")
+    
+    if not STRIPE_WEBHOOK_SECRET:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Webhook secret not configured"
+        )
+    
+    stripe = get_stripe()
+    try:
+        event = stripe.Webhook.construct_event(
+            payload, sig_header, STRIPE_WEBHOOK_SECRET
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid payload")
+    except stripe.error.SignatureVerificationError:
+        raise HTTPException(status_code=400, detail="Invalid signature")
+    
+    # Mise à jour des abonnements hors de la boucle d'événements
+    return await run_db(db, _apply_event, event)
+
 @router.post("/create-portal-session")
 async def create_portal_session(
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_db_user)
 ):
-    if not stripe.api_key:
+    if not STRIPE_SECRET_KEY:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Stripe is not configured"
         )
+    stripe = get_stripe()
     
     if not current_user.stripe_customer_id:
         raise HTTPException(
@@ -150,7 +181,8 @@ async def create_portal_session(
         )
     
     try:
-        session = stripe.billing_portal.Session.create(
+        session = await run_in_threadpool(
+            stripe.billing_portal.Session.create,
             customer=current_user.stripe_customer_id,
             return_url=f"{FRONTEND_URL}/dashboard",
         )
@@ -1,11 +1,34 @@
 #!/usr/bin/env python3
-from typing import List, Optional
-from fastapi import APIRouter, Depends
+"""
+Catalogue public : catégories et modèles actifs.
+
+Les réponses sont sérialisées une fois et gardées avec leur ETag. Chaque
+requête ne lit qu'une empreinte du catalogue (nombre de lignes, plus grand
+id, dernières dates de création et de modification des deux tables) : tant
+qu'elle ne change pas, la réponse gardée est renvoyée, ou 304 si le client
+l'a déjà (If-None-Match). Une modification que l'empreinte ne voit pas
+(SQL direct sans updated_at, deux mises à jour dans la même seconde) est
+vue au plus tard après CATALOG_CACHE_TTL secondes.
+
+Configuration (variables d'environnement) :
+  CATALOG_CACHE_TTL  durée maximum de réutilisation d'une réponse (défaut 60, 0 = désactivé)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
 from database.database import get_db
 from models.models import Template, Category
+from services.etags import cached_json, json_with_etag
+
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "60"))
+CATALOG_CACHE_SIZE = 256
 
 router = APIRouter(prefix="/api", tags=["public"])
 
@@ -30,42 +53,92 @@ class TemplatePublicResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class CatalogCache:
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL, max_entries: int = CATALOG_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[Tuple, float, bytes, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple, fingerprint: Tuple) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != fingerprint or entry[1] <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry[2], entry[3]
+
+    def put(self, key: Tuple, fingerprint: Tuple, body: bytes, etag: str) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (fingerprint, time.monotonic() + self.ttl, body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+catalog_cache = CatalogCache()
+
+def _fingerprint(db: Session) -> Tuple:
+    # Une seule requête d'agrégats ; change à chaque ajout, suppression ou mise à jour ORM
+    columns = []
+    for model in (Template, Category):
+        for aggregate in (func.count(model.id), func.max(model.id), func.max(model.created_at), func.max(model.updated_at)):
+            columns.append(select(aggregate).scalar_subquery())
+    return tuple(str(value) for value in db.execute(select(*columns)).one())
+
+def _catalog_response(request: Request, db: Session, key: Tuple, build: Callable[[], Any]) -> Response:
+    fingerprint = _fingerprint(db)
+    cached = catalog_cache.get(key, fingerprint)
+    if cached is None:
+        cached = json_with_etag(build())
+        catalog_cache.put(key, fingerprint, *cached)
+    body, etag = cached
+    return cached_json(request, body, etag, key[0])
+
+def _templates(templates: List[Template]) -> List[dict]:
+    return [TemplatePublicResponse.model_validate(t).model_dump() for t in templates]
+
 @router.get("/categories", response_model=List[CategoryResponse])
-def list_public_categories(db: Session = Depends(get_db)):
-    categories = db.query(Category).all()
-    return categories
+def list_public_categories(request: Request, db: Session = Depends(get_db)):
+    def build():
+        return [CategoryResponse.model_validate(c).model_dump() for c in db.query(Category).all()]
+    return _catalog_response(request, db, ("categories",), build)
 
 @router.get("/templates", response_model=List[TemplatePublicResponse])
 def list_public_templates(
+    request: Request,
     category_id: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(Template).filter(Template.is_active == True)
-    if category_id:
-        query = query.filter(Template.category_id == category_id)
-    templates = query.all()
-    return templates
+    def build():
+        query = db.query(Template).filter(Template.is_active == True)
+        if category_id:
+            query = query.filter(Template.category_id == category_id)
+        return _templates(query.all())
+    return _catalog_response(request, db, ("catalog_templates", category_id), build)
 
 @router.get("/templates/{slug}", response_model=TemplatePublicResponse)
-def get_template_by_slug(slug: str, db: Session = Depends(get_db)):
-    template = db.query(Template).filter(
-        Template.slug == slug,
-        Template.is_active == True
-    ).first()
-    if not template:
-        from fastapi import HTTPException
-        raise HTTPException(status_code=404, detail="Template not found")
-    return template
+def get_template_by_slug(slug: str, request: Request, db: Session = Depends(get_db)):
+    def build():
+        template = db.query(Template).filter(
+            Template.slug == slug,
+            Template.is_active == True
+        ).first()
+        if not template:
+            raise HTTPException(status_code=404, detail="Template not found")
+        return TemplatePublicResponse.model_validate(template).model_dump()
+    return _catalog_response(request, db, ("catalog_template", slug), build)
 
 @router.get("/templates/category/{category_slug}", response_model=List[TemplatePublicResponse])
-def list_templates_by_category(category_slug: str, db: Session = Depends(get_db)):
-    category = db.query(Category).filter(Category.slug == category_slug).first()
-    if not category:
-        from fastapi import HTTPException
-        raise HTTPException(status_code=404, detail="Category not found")
-    
-    templates = db.query(Template).filter(
-        Template.category_id == category.id,
-        Template.is_active == True
-    ).all()
-    return templates
+def list_templates_by_category(category_slug: str, request: Request, db: Session = Depends(get_db)):
+    def build():
+        category = db.query(Category).filter(Category.slug == category_slug).first()
+        if not category:
+            raise HTTPException(status_code=404, detail="Category not found")
+
+        return _templates(db.query(Template).filter(
+            Template.category_id == category.id,
+            Template.is_active == True
+        ).all())
+    return _catalog_response(request, db, ("catalog_category", category_slug), build)
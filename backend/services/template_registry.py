@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Registre des modèles de CV compilés, partagé par tout le processus.
+
+Pour chaque dossier de templates/ on garde en mémoire le template Jinja2
+compilé, le CSS prétraité (les @import déjà extraits en balises <link>) et
+les métadonnées de template.json. Une entrée est recompilée quand l'un de
+ses fichiers change (mtime) ou sur demande via `reload()`. Les polices
+Google Fonts vendorisées (services/font_assets.py) remplacent les liens
+distants par des @font-face locaux.
+"""
+import json
+import re
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from jinja2 import Template
+
+from services.font_assets import FONTS_DELIVERY, font_library, google_font_families
+from services.image_cache import image_cache
+from services.metrics import stage
+from services.render_cache import cache_key, render_cache
+
+TEMPLATES_DIR = Path(__file__).parent.parent.resolve() / "templates"
+TEMPLATE_FILE = "template.jinja2"
+STYLE_FILE = "style.css"
+META_FILE = "template.json"
+
+IMPORT_PATTERN = re.compile(r"@import\s+url\(['\"]?([^'\"]+)['\"]?\);")
+
+
+class TemplateNotFound(FileNotFoundError):
+    pass
+
+
+class CompiledTemplate:
+    """Un modèle prêt à rendre : template compilé, CSS et métadonnées."""
+
+    def __init__(self, folder: str, template: "Template", css: str, css_links: List[str],
+                 metadata: Dict[str, Any], mtimes: Tuple[float, ...], fonts: Optional[List[str]] = None):
+        self.folder = folder
+        self.template = template
+        self.css = css
+        self.css_links = css_links
+        self.metadata = metadata
+        self.mtimes = mtimes
+        self.fonts = fonts or []
+        # Version stable tant que les fichiers du modèle (et ses polices locales) ne changent pas
+        self.version = f"{folder}-{int(max(mtimes) * 1000) if mtimes else 0}"
+        if self.fonts:
+            self.version += "-" + "+".join(sorted(self.fonts)).replace(" ", "_")
+        self._metadata_json: Optional[Tuple[bytes, str]] = None
+
+    def metadata_json(self) -> Tuple[bytes, str]:
+        """template.json sérialisé une fois, avec son ETag (GET /templates/{name})."""
+        if self._metadata_json is None:
+            from services.etags import json_with_etag
+
+            self._metadata_json = json_with_etag(self.metadata)
+        return self._metadata_json
+
+    @property
+    def links_html(self) -> str:
+        return '\n  '.join(f'<link rel="stylesheet" href="{url}" />' for url in self.css_links)
+
+    def localized_data(self, data: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        # Images déclarées dans template.json ("images") : servies depuis le cache local
+        images = self.metadata.get("images")
+        return image_cache.localize(data, images) if images else (data, False)
+
+    def context_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return self.localized_data(data)[0]
+
+    def render_body(self, data: Dict[str, Any]) -> Tuple[str, bool]:
+        """(HTML du corps, dégradé) ; dégradé = une image n'a pas pu être mise en cache."""
+        with stage("images"):
+            data, degraded = self.localized_data(data)
+        with stage("jinja_render"):
+            return self.template.render(data=data, template=self.metadata), degraded
+
+    def font_css(self, inline: Optional[bool] = None, text: Optional[str] = None) -> str:
+        if not self.fonts:
+            return ""
+        if inline is None:
+            inline = FONTS_DELIVERY != "link"
+        return font_library.font_face_css(self.fonts, inline, text)
+
+
+class TemplateRegistry:
+    def __init__(self, templates_dir: Path = TEMPLATES_DIR):
+        self.templates_dir = templates_dir
+        self._entries: Dict[str, CompiledTemplate] = {}
+        self._lock = threading.Lock()
+
+    def _folder(self, template_name: str) -> Path:
+        # Normalize to lowercase for folder lookup
+        folder = template_name.lower()
+        tpl_dir = (self.templates_dir / folder).resolve()
+        if tpl_dir.parent != self.templates_dir or not (tpl_dir / TEMPLATE_FILE).exists():
+            raise TemplateNotFound(f"Template '{template_name}' introuvable")
+        return tpl_dir
+
+    @staticmethod
+    def _mtimes(tpl_dir: Path) -> Tuple[float, ...]:
+        mtimes = []
+        for filename in (TEMPLATE_FILE, STYLE_FILE, META_FILE):
+            try:
+                mtimes.append((tpl_dir / filename).stat().st_mtime)
+            except FileNotFoundError:
+                mtimes.append(0.0)
+        return tuple(mtimes)
+
+    def _compile(self, tpl_dir: Path, mtimes: Tuple[float, ...]) -> CompiledTemplate:
+        # Jinja2 n'est importé qu'à la première compilation d'un modèle
+        from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+        env = Environment(
+            loader=FileSystemLoader(str(tpl_dir)),
+            autoescape=select_autoescape(["html", "jinja2"]),
+            auto_reload=False,
+        )
+        template = env.get_template(TEMPLATE_FILE)
+
+        css_path = tpl_dir / STYLE_FILE
+        css_content = css_path.read_text(encoding="utf-8") if css_path.exists() else ""
+        # Les @import url(...) deviennent des balises <link> dans le <head>
+        css_links = IMPORT_PATTERN.findall(css_content)
+        css_without_imports = IMPORT_PATTERN.sub('', css_content)
+
+        meta_path = tpl_dir / META_FILE
+        metadata = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {}
+
+        css_links, fonts = self._local_fonts(css_links, metadata)
+
+        print(f"[Templates] Compiled '{tpl_dir.name}'" + (f" (local fonts: {', '.join(fonts)})" if fonts else ""))
+        return CompiledTemplate(tpl_dir.name, template, css_without_imports, css_links, metadata, mtimes, fonts)
+
+    @staticmethod
+    def _local_fonts(css_links: List[str], metadata: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+        """Retire les liens Google Fonts dont toutes les familles sont vendorisées ; renvoie (liens, familles locales)."""
+        links, fonts = [], []
+        for url in css_links:
+            families = google_font_families(url)
+            if families and all(font_library.has(family) for family in families):
+                fonts.extend(f for f in families if f not in fonts)
+            else:
+                links.append(url)
+        for family in (metadata.get("fonts") or {}).values():
+            if family not in fonts and font_library.has(family):
+                fonts.append(family)
+        return links, fonts
+
+    def get(self, template_name: str) -> CompiledTemplate:
+        tpl_dir = self._folder(template_name)
+        mtimes = self._mtimes(tpl_dir)
+        entry = self._entries.get(tpl_dir.name)
+        if entry is not None and entry.mtimes == mtimes:
+            return entry
+        with self._lock:
+            entry = self._entries.get(tpl_dir.name)
+            if entry is None or entry.mtimes != mtimes:
+                with stage("template_load"):
+                    entry = self._compile(tpl_dir, mtimes)
+                self._entries[tpl_dir.name] = entry
+            return entry
+
+    def reload(self, template_name: Optional[str] = None) -> List[str]:
+        """Vide le cache (un modèle ou tous) ; renvoie les modèles recompilés."""
+        font_library.clear()
+        with self._lock:
+            if template_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(template_name.lower(), None)
+        names = [template_name.lower()] if template_name else self.names()
+        for name in names:
+            self.get(name)
+        return names
+
+    def names(self) -> List[str]:
+        return sorted(
+            d.name for d in self.templates_dir.iterdir()
+            if d.is_dir() and (d / META_FILE).exists()
+        )
+
+
+registry = TemplateRegistry()
+
+
+def wrap_document(compiled: CompiledTemplate, html_body: str, for_print: bool = False) -> str:
+    # Pour un PDF les polices sont toujours embarquées (et réduites aux glyphes du document si FONTS_SUBSET=1) ;
+    # un aperçu les référence (FONTS_DELIVERY=link) : le navigateur les garde d'une frappe à l'autre
+    with stage("css"):
+        font_css = compiled.font_css(inline=True, text=html_body + compiled.css) if for_print else compiled.font_css()
+    font_style = f"<style>{font_css}</style>\n  " if font_css else ""
+    return f"""<!DOCTYPE html>
+<html lang="fr">
+<head>
+  <meta charset="UTF-8" />
+  <title>CV Preview</title>
+  {font_style}{compiled.links_html}
+  <style>{compiled.css}</style>
+</head>
+<body>
+{html_body}
+</body>
+</html>"""
+
+
+def render_html_checked(template_name: str, data: Dict[str, Any], for_print: bool = False) -> Tuple[str, bool]:
+    """(HTML, dégradé) ; un rendu dégradé (image restée distante) n'est pas mis en cache."""
+    compiled = registry.get(template_name)
+    key = cache_key("print" if for_print else "html", data, compiled.folder, compiled.version)
+    cached = render_cache.get(key)
+    if cached is not None:
+        return cached.decode("utf-8"), False
+
+    body, degraded = compiled.render_body(data)
+    html_full = wrap_document(compiled, body, for_print)
+    if not degraded:
+        render_cache.put(key, html_full.encode("utf-8"))
+    return html_full, degraded
+
+
+def render_html(template_name: str, data: Dict[str, Any], for_print: bool = False) -> str:
+    return render_html_checked(template_name, data, for_print)[0]
+
+
+BATCH_PAGE_CSS = """
+.cv-batch-page { break-after: page; }
+.cv-batch-page:last-child { break-after: auto; }
+"""
+
+
+def render_batch_html(items: List[Tuple[str, Dict[str, Any]]]) -> Tuple[List[str], bool]:
+    """Regroupe les CV consécutifs d'un même modèle en un seul document, un CV par page ;
+    dégradé si une image de l'un d'eux n'a pas pu être mise en cache."""
+    documents = []
+    run: List[str] = []
+    run_template: Optional[CompiledTemplate] = None
+    degraded = False
+
+    def _flush():
+        if run_template is not None and run:
+            body = "\n".join(f'<section class="cv-batch-page">\n{b}\n</section>' for b in run)
+            html = wrap_document(run_template, body, for_print=True)
+            documents.append(html.replace("</style>", f"{BATCH_PAGE_CSS}</style>", 1))
+
+    for template_name, data in items:
+        compiled = registry.get(template_name)
+        if run_template is not None and compiled.folder != run_template.folder:
+            _flush()
+            run = []
+        run_template = compiled
+        body, body_degraded = compiled.render_body(data)
+        run.append(body)
+        degraded = degraded or body_degraded
+    _flush()
+    return documents, degraded
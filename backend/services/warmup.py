@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Préchargement optionnel des dépendances lourdes au démarrage.
+
+L'import de l'application ne charge ni les moteurs d'export (Playwright,
+python-docx, Jinja2), ni les SDK de paiement, ni passlib/jose, ni le pilote
+de base de données : chacun est importé à sa première utilisation. Sur un
+serveur long, on peut préférer payer ce coût au démarrage plutôt qu'à la
+première requête ; c'est le rôle de `warm_up()`, appelé par api.py au
+démarrage. Par défaut il tourne en arrière-plan : /healthz répond dès
+que l'application est importée.
+
+Composants :
+  templates  compile tous les modèles de templates/ (Jinja2)
+  pdf        démarre le pool de navigateurs (Playwright + Chromium)
+  docx       python-docx
+  payments   SDK Stripe configuré et httpx (FedaPay)
+  auth       jose, et les workers de hachage des mots de passe (passlib/bcrypt)
+  db         crée les moteurs SQLAlchemy et ouvre une première connexion
+
+Configuration (variables d'environnement) :
+  STARTUP_WARMUP           composants à précharger, séparés par des virgules,
+                           ou "all" (défaut "pdf" si PDF_POOL_WARM=1, sinon aucun)
+  STARTUP_WARMUP_BLOCKING  1 = le démarrage attend la fin du préchargement (défaut 0)
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+from services.metrics import metrics
+
+PDF_POOL_WARM = os.getenv("PDF_POOL_WARM", "1") == "1"
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "pdf" if PDF_POOL_WARM else "")
+STARTUP_WARMUP_BLOCKING = os.getenv("STARTUP_WARMUP_BLOCKING", "0") == "1"
+
+warmup_seconds = metrics.histogram(
+    "cvtor_startup_warmup_seconds", "Time spent pre-loading each component at startup", ["component"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+def _templates() -> None:
+    from services.template_registry import registry
+
+    for name in registry.names():
+        registry.get(name)
+
+
+def _pdf() -> None:
+    from services.browser_pool import get_browser_pool
+
+    get_browser_pool().start()
+
+
+def _docx() -> None:
+    import services.export_docx  # noqa: F401
+
+
+def _payments() -> None:
+    import httpx  # noqa: F401
+
+    from services.routes_stripe import get_stripe
+
+    get_stripe()
+
+
+def _auth() -> None:
+    import jose.jwt  # noqa: F401
+
+    from auth.passwords import password_hasher
+
+    password_hasher.start()
+
+
+def _db() -> None:
+    from database.database import DB_ASYNC, get_async_engine, get_engine
+
+    with get_engine().connect():
+        pass
+    if DB_ASYNC:
+        # Importe le pilote async ; ses connexions s'ouvrent sur la boucle de l'application
+        get_async_engine()
+
+
+COMPONENTS: Dict[str, Callable[[], None]] = {
+    "templates": _templates,
+    "pdf": _pdf,
+    "docx": _docx,
+    "payments": _payments,
+    "auth": _auth,
+    "db": _db,
+}
+
+
+def parse_components(value: str) -> List[str]:
+    names = [name.strip().lower() for name in value.split(",") if name.strip()]
+    if "all" in names:
+        return list(COMPONENTS)
+    unknown = [name for name in names if name not in COMPONENTS]
+    if unknown:
+        print(f"[Warmup] Unknown component(s) ignored: {', '.join(unknown)}")
+    return [name for name in names if name in COMPONENTS]
+
+
+def warm_up(components: List[str]) -> Dict[str, float]:
+    """Précharge `components` dans l'ordre ; renvoie la durée de chacun (un échec n'arrête pas les suivants)."""
+    durations: Dict[str, float] = {}
+    for name in components:
+        started = time.perf_counter()
+        try:
+            COMPONENTS[name]()
+        except Exception as e:
+            # Le composant sera chargé (ou échouera) à sa première utilisation
+            print(f"[Warmup] {name} failed: {e}")
+            continue
+        durations[name] = time.perf_counter() - started
+        warmup_seconds.observe(durations[name], component=name)
+    if durations:
+        print("[Warmup] " + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in durations.items()))
+    return durations
+
+
+def start_warmup(value: str = STARTUP_WARMUP, blocking: bool = STARTUP_WARMUP_BLOCKING) -> None:
+    components = parse_components(value)
+    if not components:
+        return
+    if blocking:
+        warm_up(components)
+    else:
+        threading.Thread(target=warm_up, args=(components,), name="startup-warmup", daemon=True).start()
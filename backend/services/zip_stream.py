@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Écriture d'une archive ZIP en flux.
+
+zipfile sait écrire vers un flux non « seekable » (descripteurs de données
+après chaque entrée) : on lui donne un tampon que l'on vide après chaque
+entrée, si bien que l'archive complète n'est jamais gardée en mémoire.
+"""
+import zipfile
+from typing import AsyncIterator, List, Tuple
+
+
+class _StreamBuffer:
+    """Flux en écriture seule, sans tell()/seek(), vidé au fur et à mesure."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+async def zip_stream(entries: AsyncIterator[Tuple[str, bytes]]) -> AsyncIterator[bytes]:
+    """Transforme un flux de (nom, contenu) en morceaux d'archive ZIP."""
+    buffer = _StreamBuffer()
+    # PDF et DOCX sont déjà compressés : ZIP_STORED évite de payer la compression deux fois
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        async for name, content in entries:
+            archive.writestr(name, content)
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
+    # Répertoire central, écrit à la fermeture
+    yield buffer.drain()
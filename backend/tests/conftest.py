@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Configuration commune des tests (depuis backend/ : python -m pytest -q).
+
+Les variables d'environnement sont fixées avant tout import de l'application :
+base SQLite et artefacts temporaires, pas de workers d'export ni de navigateurs préchauffés.
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_db_dir = tempfile.mkdtemp(prefix="cvtor-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'tests.db')}"
+os.environ["ARTIFACTS_DIR"] = os.path.join(_db_dir, "artifacts")
+os.environ["EXPORT_WORKERS"] = "0"
+os.environ["PDF_POOL_WARM"] = "0"
+os.environ["PASSWORD_HASH_EXECUTOR"] = "thread"
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    from api import app
+    from database.database import Base, get_engine
+    Base.metadata.create_all(get_engine())
+    # Sans `with` : le lifespan (préchauffage, workers) n'est pas lancé
+    return TestClient(app)
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    response = client.post("/auth/register", json={
+        "email": "tests@cvtor.io", "password": "pw-tests-123", "full_name": "Tests"
+    })
+    assert response.status_code == 200, response.text
+    return {"Authorization": "Bearer " + response.json()["access_token"]}
+
+
+@pytest.fixture
+def resume(client, auth_headers):
+    """CV neuf de l'utilisateur de test, supprimé après le test."""
+    response = client.post("/resumes/", headers=auth_headers, json={
+        "title": "CV", "template_name": "moderne",
+        "data": {"profile": {"name": "Jean Dupont", "title": "Dev"}, "skills": ["Python", "SQL"]},
+    })
+    assert response.status_code == 201, response.text
+    yield response.json()
+    client.delete(f"/resumes/{response.json()['id']}", headers=auth_headers)
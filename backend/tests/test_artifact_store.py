@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import time
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import pytest
+
+import services.routes_artifacts as routes_artifacts
+from services.artifact_store import ArtifactStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ArtifactStore(directory=tmp_path / "artifacts", signing_key="test-key")
+    monkeypatch.setattr(routes_artifacts, "artifact_store", store)
+    return store
+
+
+def _parts(url: str):
+    """(owner, name, paramètres) d'une URL signée /artifacts/<owner>/<name>?..."""
+    parsed = urlparse(url)
+    _, _, owner, name = parsed.path.split("/")
+    query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+    return owner, name, query
+
+
+def _resolve(store, owner, name, query):
+    return store.resolve(owner, name, int(query["expires"]), query["filename"], query["sig"])
+
+
+def test_directory_is_prepared_on_first_use(tmp_path):
+    (tmp_path / "artifacts" / "user-1").mkdir(parents=True)
+    (tmp_path / "artifacts" / "user-1" / ("a" * 32 + ".pdf")).write_bytes(b"x" * 10)
+    store = ArtifactStore(directory=tmp_path / "artifacts")
+    assert store._usage == {}
+    assert store.stats()["bytes"] == 10
+
+    fresh = ArtifactStore(directory=tmp_path / "fresh")
+    assert not (tmp_path / "fresh").exists()
+    fresh.put("user-1", b"pdf", "pdf")
+    assert (tmp_path / "fresh" / "user-1").is_dir()
+
+
+def test_signed_url_resolves_until_it_expires(store, monkeypatch):
+    artifact = store.put("user-1", b"%PDF", "pdf")
+    url, expires = store.signed_url(artifact, "cv.pdf", ttl=60)
+    owner, name, query = _parts(url)
+    assert _resolve(store, owner, name, query) == artifact.path
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert _resolve(store, owner, name, query) is None
+
+
+@pytest.mark.parametrize("field, value", [
+    ("expires", None),
+    ("filename", "other.pdf"),
+    ("sig", "A" * 43),
+])
+def test_tampered_signed_url_is_rejected(store, field, value):
+    artifact = store.put("user-1", b"%PDF", "pdf")
+    owner, name, query = _parts(store.signed_url(artifact, "cv.pdf")[0])
+    # Repousser l'expiration invalide la signature
+    query[field] = value if value is not None else str(int(query["expires"]) + 3600)
+    assert _resolve(store, owner, name, query) is None
+
+
+def test_signature_does_not_open_another_owners_artifact(store):
+    mine = store.put("user-1", b"mine", "pdf")
+    theirs = store.put("user-2", b"theirs", "pdf")
+    _, _, query = _parts(store.signed_url(mine, "cv.pdf")[0])
+    assert _resolve(store, "user-2", theirs.name, query) is None
+    assert _resolve(store, "user-2", mine.name, query) is None
+    assert _resolve(store, "../user-2", theirs.name, query) is None
+
+
+def test_download_route_checks_the_signature(client, store):
+    artifact = store.put("user-1", b"%PDF-1.7", "pdf")
+    url, _ = store.signed_url(artifact, "cv.pdf")
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == b"%PDF-1.7"
+    assert 'filename="cv.pdf"' in response.headers["content-disposition"]
+
+    owner, name, query = _parts(url)
+    tampered = urlencode({**query, "filename": "x.pdf"})
+    assert client.get(f"/artifacts/{owner}/{name}?{tampered}").status_code == 404
+    expired = store.signed_url(artifact, "cv.pdf", ttl=-1)[0]
+    assert client.get(expired).status_code == 404
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.database import SessionLocal
+from models.models import ExportJob, ExportJobStatus
+import services.export_jobs as export_jobs
+import services.exports as exports
+from services.artifact_store import artifact_store
+from services.browser_pool import RenderTimeout
+from services.export_jobs import EXPORT_JOB_TIMEOUT, EXPORT_MAX_ATTEMPTS, ExportWorkerPool, enqueue_export
+from services.render_limiter import get_render_limiter
+from services.template_registry import TemplateNotFound
+
+
+@pytest.fixture
+def pool():
+    return ExportWorkerPool(workers=0)
+
+
+@pytest.fixture
+def job_id(resume):
+    db = SessionLocal()
+    try:
+        job = enqueue_export(db, resume["user_id"], "pdf", [resume["id"]])
+        yield job.id
+        db.query(ExportJob).filter(ExportJob.id == job.id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def _job(job_id: str) -> ExportJob:
+    db = SessionLocal()
+    try:
+        return db.query(ExportJob).filter(ExportJob.id == job_id).one()
+    finally:
+        db.close()
+
+
+def _set(job_id: str, **values) -> None:
+    db = SessionLocal()
+    try:
+        db.query(ExportJob).filter(ExportJob.id == job_id).update(values)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _claim_job(pool: ExportWorkerPool, job_id: str):
+    claimed = pool._claim()
+    assert claimed is not None and claimed[0] == job_id
+    return claimed
+
+
+def test_job_runs_to_completion(pool, job_id, monkeypatch):
+    monkeypatch.setattr(export_jobs, "render_resume", lambda resume, fmt, *priority: b"%PDF-fake")
+    pool._execute(*_claim_job(pool, job_id))
+    job = _job(job_id)
+    assert job.status == ExportJobStatus.DONE
+    assert (job.progress, job.total, job.attempts) == (1, 1, 1)
+    assert artifact_store.get(job.artifact_owner, job.artifact_name).path.read_bytes() == b"%PDF-fake"
+
+
+def test_stale_check_uses_the_heartbeat(pool, job_id):
+    _claim_job(pool, job_id)
+    long_ago = datetime.utcnow() - timedelta(seconds=EXPORT_JOB_TIMEOUT * 3)
+    # Job long mais vivant : démarré il y a longtemps, signe de vie récent
+    _set(job_id, started_at=long_ago, heartbeat_at=datetime.utcnow())
+    assert pool._claim() is None
+    assert _job(job_id).status == ExportJobStatus.RUNNING
+
+    _set(job_id, heartbeat_at=long_ago)
+    assert pool._claim() == (job_id, 2)
+
+
+def _take_over(pool: ExportWorkerPool, job_id: str):
+    # Le job est jugé mort et repris par un autre worker
+    _set(job_id, heartbeat_at=datetime.utcnow() - timedelta(seconds=EXPORT_JOB_TIMEOUT + 1))
+    return _claim_job(pool, job_id)
+
+
+def test_worker_that_lost_its_job_stops_rendering(pool, job_id, monkeypatch):
+    first = _claim_job(pool, job_id)
+    taken_over = []
+
+    def render_while_taken_over(resume, fmt, *priority):
+        taken_over.append(_take_over(pool, job_id))
+        return b"%PDF-late"
+
+    monkeypatch.setattr(export_jobs, "render_resume", render_while_taken_over)
+    pool._execute(*first)
+    job = _job(job_id)
+    assert taken_over == [(job_id, 2)]
+    assert (job.status, job.progress, job.artifact_name) == (ExportJobStatus.RUNNING, 0, None)
+
+
+def test_worker_that_lost_its_job_deletes_its_artifact(pool, job_id, monkeypatch):
+    first = _claim_job(pool, job_id)
+    monkeypatch.setattr(export_jobs, "render_resume", lambda resume, fmt, *priority: b"%PDF-late")
+    stored = []
+    put = artifact_store.put
+
+    def put_after_takeover(*args):
+        _take_over(pool, job_id)
+        stored.append(put(*args))
+        return stored[-1]
+
+    monkeypatch.setattr(artifact_store, "put", put_after_takeover)
+    pool._execute(*first)
+    job = _job(job_id)
+    assert (job.status, job.attempts, job.artifact_name) == (ExportJobStatus.RUNNING, 2, None)
+    assert len(stored) == 1
+    assert artifact_store.get(stored[0].owner, stored[0].name) is None
+
+
+def test_transient_failures_are_retried_up_to_max_attempts(pool, job_id, monkeypatch):
+    def crash(resume, fmt, *priority):
+        raise RenderTimeout("PDF render exceeded 30s")
+
+    monkeypatch.setattr(export_jobs, "render_resume", crash)
+    for attempt in range(1, EXPORT_MAX_ATTEMPTS):
+        pool._execute(*_claim_job(pool, job_id))
+        job = _job(job_id)
+        assert (job.status, job.attempts, job.error) == (ExportJobStatus.QUEUED, attempt, None)
+
+    pool._execute(*_claim_job(pool, job_id))
+    job = _job(job_id)
+    assert (job.status, job.attempts) == (ExportJobStatus.FAILED, EXPORT_MAX_ATTEMPTS)
+    assert "30s" in job.error
+
+
+def test_permanent_failures_are_not_retried(pool, job_id, monkeypatch):
+    def missing_template(resume, fmt, *priority):
+        raise TemplateNotFound(resume.template_name)
+
+    monkeypatch.setattr(export_jobs, "render_resume", missing_template)
+    pool._execute(*_claim_job(pool, job_id))
+    job = _job(job_id)
+    assert (job.status, job.attempts) == (ExportJobStatus.FAILED, 1)
+
+
+def test_job_renders_take_a_render_limiter_slot(pool, job_id, monkeypatch):
+    seen = []
+
+    async def print_pdf(html):
+        limiter = get_render_limiter()
+        seen.append((limiter.in_flight, limiter.stats()["lanes"]["free"]["in_flight"]))
+        return b"%PDF-scheduled"
+
+    monkeypatch.setattr(exports, "render_html_checked", lambda *args: ("<html></html>", False))
+    monkeypatch.setattr(exports, "html_to_pdf_bytes_async", print_pdf)
+    monkeypatch.setattr(exports.render_cache, "get", lambda key: None)
+    # Boucle de l'application : celle où vit l'ordonnanceur
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    pool._loop = loop
+    try:
+        pool._execute(*_claim_job(pool, job_id))
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+    assert seen == [(1, 1)]
+    assert _job(job_id).status == ExportJobStatus.DONE
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import services.image_cache as image_cache_module
+from services.image_cache import ImageCache, ImageFetchError
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 16
+
+
+@pytest.fixture
+def resolve(monkeypatch):
+    """Table DNS de test : nom -> adresse ; les autres noms passent au vrai résolveur."""
+    table = {}
+    real_getaddrinfo = socket.getaddrinfo
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        if host in table:
+            family = socket.AF_INET6 if ":" in table[host] else socket.AF_INET
+            return [(family, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", (table[host], port))]
+        return real_getaddrinfo(host, port, *args, **kwargs)
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    return table
+
+
+@pytest.fixture
+def server():
+    """Serveur HTTP local : /photo.png renvoie une image, /redirect?to=<url> redirige."""
+    seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            seen.append((self.path, self.headers["Host"]))
+            if self.path.startswith("/redirect?to="):
+                self.send_response(302)
+                self.send_header("Location", self.path.split("=", 1)[1])
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.end_headers()
+            self.wfile.write(PNG)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address[1], seen
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/photo.png",
+    "http://localhost/photo.png",
+    "http://10.0.0.8/photo.png",
+    "http://192.168.1.1/photo.png",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/photo.png",
+    "file:///etc/passwd",
+])
+def test_private_and_loopback_addresses_are_refused(tmp_path, url):
+    with pytest.raises(ImageFetchError):
+        ImageCache(directory=tmp_path)._pin(url)
+
+
+def test_name_resolving_to_a_private_address_is_refused(tmp_path, resolve):
+    resolve["photos.example"] = "10.1.2.3"
+    with pytest.raises(ImageFetchError):
+        ImageCache(directory=tmp_path)._pin("https://photos.example/me.jpg")
+
+
+def test_connection_is_pinned_to_the_checked_address(tmp_path, resolve):
+    resolve["photos.example"] = "93.184.216.34"
+    pinned, headers, extensions = ImageCache(directory=tmp_path)._pin("https://photos.example:8443/me.jpg?s=2")
+    assert pinned == "https://93.184.216.34:8443/me.jpg?s=2"
+    assert headers == {"Host": "photos.example:8443"}
+    assert extensions == {"sni_hostname": "photos.example"}
+
+    resolve["photos.example"] = "2606:2800:220:1::1"
+    pinned, headers, extensions = ImageCache(directory=tmp_path)._pin("http://photos.example/me.jpg")
+    assert pinned == "http://[2606:2800:220:1::1]/me.jpg"
+    assert headers == {"Host": "photos.example"}
+    assert extensions == {}
+
+
+def test_fetch_connects_to_the_pinned_address_with_the_original_host(tmp_path, resolve, server, monkeypatch):
+    port, seen = server
+    monkeypatch.setattr(image_cache_module, "IMAGES_ALLOW_PRIVATE", True)
+    resolve["photos.example"] = "127.0.0.1"
+    assert ImageCache(directory=tmp_path)._fetch(f"http://photos.example:{port}/photo.png") == PNG
+    assert seen == [("/photo.png", f"photos.example:{port}")]
+
+
+class PublicTestHost(ImageCache):
+    # Le serveur local tient lieu d'hôte public ; toute autre adresse passe par la vraie vérification
+    def _pin(self, url):
+        if url.startswith("http://photos.example:"):
+            return url.replace("photos.example", "127.0.0.1", 1), {}, {}
+        return super()._pin(url)
+
+
+def test_redirect_to_a_private_address_is_refused(tmp_path, resolve, server):
+    port, seen = server
+    resolve["intranet.example"] = "10.0.0.5"
+    cache = PublicTestHost(directory=tmp_path)
+    for target in ("http://intranet.example/photo.png", f"http://127.0.0.1:{port}/photo.png"):
+        with pytest.raises(ImageFetchError, match="non-public"):
+            cache._fetch(f"http://photos.example:{port}/redirect?to={target}")
+    # Seule la première requête de chaque chaîne a atteint le serveur
+    assert [path for path, _ in seen] == [f"/redirect?to={target}" for target in (
+        "http://intranet.example/photo.png", f"http://127.0.0.1:{port}/photo.png")]
+
+
+def test_redirects_are_followed_to_public_hosts_up_to_a_limit(tmp_path, server):
+    port, seen = server
+    cache = PublicTestHost(directory=tmp_path)
+    base = f"http://photos.example:{port}"
+    assert cache._fetch(f"{base}/redirect?to={base}/photo.png") == PNG
+    loop = f"{base}/redirect?to={base}/redirect?to={base}/redirect?to={base}/redirect?to={base}/photo.png"
+    with pytest.raises(ImageFetchError, match="Too many redirects"):
+        cache._fetch(loop)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import pytest
+
+from services.json_patch import (
+    MAX_OPERATIONS, JsonPatchConflict, JsonPatchError, apply_json_patch, apply_merge_patch,
+)
+
+DOC = {
+    "profile": {"name": "Jean", "title": "Dev"},
+    "skills": ["Python", "SQL"],
+    "flags": {"remote": True, "years": 5, "score": 4.5},
+}
+
+
+def test_add_member_and_array_end():
+    result = apply_json_patch(DOC, [
+        {"op": "add", "path": "/profile/email", "value": "jean@example.com"},
+        {"op": "add", "path": "/skills/-", "value": "Go"},
+        {"op": "add", "path": "/skills/0", "value": "C"},
+    ])
+    assert result["profile"]["email"] == "jean@example.com"
+    assert result["skills"] == ["C", "Python", "SQL", "Go"]
+
+
+def test_remove():
+    result = apply_json_patch(DOC, [{"op": "remove", "path": "/skills/0"}, {"op": "remove", "path": "/flags"}])
+    assert result["skills"] == ["SQL"]
+    assert "flags" not in result
+
+
+def test_replace():
+    result = apply_json_patch(DOC, [{"op": "replace", "path": "/profile/name", "value": "Jeanne"}])
+    assert result["profile"] == {"name": "Jeanne", "title": "Dev"}
+    with pytest.raises(JsonPatchError):
+        apply_json_patch(DOC, [{"op": "replace", "path": "/profile/missing", "value": 1}])
+
+
+def test_move():
+    result = apply_json_patch(DOC, [{"op": "move", "from": "/profile/title", "path": "/headline"}])
+    assert result["headline"] == "Dev"
+    assert "title" not in result["profile"]
+    with pytest.raises(JsonPatchError):
+        apply_json_patch(DOC, [{"op": "move", "from": "/profile", "path": "/profile/inner"}])
+
+
+def test_copy():
+    result = apply_json_patch(DOC, [{"op": "copy", "from": "/skills", "path": "/languages"}])
+    assert result["languages"] == result["skills"]
+    result["languages"].append("Rust")
+    assert result["skills"] == ["Python", "SQL"]
+
+
+def test_test_passes_and_fails():
+    apply_json_patch(DOC, [{"op": "test", "path": "/skills", "value": ["Python", "SQL"]}])
+    with pytest.raises(JsonPatchConflict):
+        apply_json_patch(DOC, [{"op": "test", "path": "/profile/name", "value": "Paul"}])
+
+
+@pytest.mark.parametrize("path, value", [
+    ("/flags/remote", 1),
+    ("/flags/years", True),
+    ("/flags/years", 5.0),
+    ("/flags/score", "4.5"),
+    ("/flags", {"remote": 1, "years": 5, "score": 4.5}),
+    ("/skills", ["Python"]),
+])
+def test_test_compares_json_types(path, value):
+    with pytest.raises(JsonPatchConflict):
+        apply_json_patch(DOC, [{"op": "test", "path": path, "value": value}])
+
+
+def test_patch_is_all_or_nothing():
+    with pytest.raises(JsonPatchError):
+        apply_json_patch(DOC, [
+            {"op": "replace", "path": "/profile/name", "value": "Jeanne"},
+            {"op": "remove", "path": "/nope"},
+        ])
+    assert DOC["profile"]["name"] == "Jean"
+
+
+@pytest.mark.parametrize("operations", [
+    {"op": "add"},
+    [{"op": "add", "path": "/x"}],
+    [{"op": "copy", "path": "/x"}],
+    [{"op": "frobnicate", "path": "/x"}],
+    [{"op": "remove", "path": "profile"}],
+    [{"op": "add", "path": "/skills/07", "value": 1}],
+    [{"op": "test", "path": "/x", "value": 1}] * (MAX_OPERATIONS + 1),
+])
+def test_invalid_patches(operations):
+    with pytest.raises(JsonPatchError):
+        apply_json_patch(DOC, operations)
+
+
+def test_merge_patch_null_deletes():
+    result = apply_merge_patch(DOC, {"profile": {"title": None, "email": "j@example.com"}, "flags": None})
+    assert result["profile"] == {"name": "Jean", "email": "j@example.com"}
+    assert "flags" not in result
+    assert DOC["profile"]["title"] == "Dev"
+
+
+def test_merge_patch_replaces_arrays_and_scalars():
+    result = apply_merge_patch(DOC, {"skills": ["Go"], "profile": "anonymous"})
+    assert result["skills"] == ["Go"]
+    assert result["profile"] == "anonymous"
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+import pytest
+
+import api
+from services.metrics import _route_template, metrics
+
+
+@pytest.mark.parametrize("token, public, authorization, status", [
+    ("", False, None, 403),
+    ("", True, None, 200),
+    ("s3cret", False, None, 401),
+    ("s3cret", False, "Bearer wrong", 401),
+    ("s3cret", False, "Bearer s3cret", 200),
+    ("s3cret", True, None, 401),
+])
+def test_metrics_access(client, monkeypatch, token, public, authorization, status):
+    monkeypatch.setattr(api, "METRICS_TOKEN", token)
+    monkeypatch.setattr(api, "METRICS_PUBLIC", public)
+    headers = {"Authorization": authorization} if authorization else {}
+    assert client.get("/metrics", headers=headers).status_code == status
+
+
+def test_mounted_static_routes_are_labelled_by_prefix(client):
+    client.get("/static/data/missing.json")
+    client.get("/no/such/route")
+    exposition = metrics.exposition()
+    assert 'route="/static/data/*",status="404"' in exposition
+    assert 'route="<unmatched>",status="404"' in exposition
+
+
+def test_mounts_are_matched_without_an_endpoint():
+    # Selon la version de Starlette, un montage ne renseigne pas toujours scope["endpoint"]
+    scope = {"type": "http", "app": api.app, "path": "/uploads/avatar.png"}
+    assert _route_template(scope) == "/uploads/*"
+    assert _route_template({**scope, "path": "/uploadsx"}) == "<unmatched>"
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+import asyncio
+
+import pytest
+
+from services.render_limiter import RenderLimiter, RenderQueueFull
+
+
+async def _settle():
+    # Laisse les tâches créées atteindre leur point d'attente
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def _hold(limiter: RenderLimiter, release: asyncio.Event, plan: str = "free", user: str = "holder"):
+    async with limiter.slot(plan, user):
+        await release.wait()
+
+
+async def _served_order(limiter: RenderLimiter, requests):
+    """Occupe l'unique créneau, met `requests` en file dans l'ordre, puis renvoie l'ordre de service."""
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(limiter, release))
+    await _settle()
+    order = []
+
+    async def render(plan, user):
+        async with limiter.slot(plan, user):
+            order.append((plan, user))
+
+    tasks = []
+    for plan, user in requests:
+        tasks.append(asyncio.create_task(render(plan, user)))
+        await _settle()
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+def test_lanes_are_served_in_proportion_to_their_weight():
+    limiter = RenderLimiter(max_concurrent=1, max_queued=100, weights={"premium": 4, "free": 1})
+    requests = [("free", f"f{i}") for i in range(10)] + [("premium", f"p{i}") for i in range(10)]
+    order = asyncio.run(_served_order(limiter, requests))
+    first = [plan for plan, _ in order[:10]]
+    assert first.count("premium") == 8
+    assert first.count("free") == 2
+    # Une lane de faible poids n'est pas affamée
+    assert "free" in first[:5]
+    assert len(order) == 20
+
+
+def test_users_of_a_lane_take_turns():
+    limiter = RenderLimiter(max_concurrent=1, max_queued=100, max_per_user=1)
+    requests = [("free", "a")] * 4 + [("free", "b")] * 2 + [("free", "c")] * 2
+    order = asyncio.run(_served_order(limiter, requests))
+    assert [user for _, user in order] == ["a", "b", "c", "a", "b", "c", "a", "a"]
+
+
+def test_position_follows_the_round_robin():
+    async def scenario():
+        limiter = RenderLimiter(max_concurrent=1, max_queued=100)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(_hold(limiter, release, user=user)) for user in ("holder", "a", "a", "b")]
+        await _settle()
+        positions = limiter.position("a"), limiter.position("b"), limiter.position("holder")
+        release.set()
+        await asyncio.gather(*tasks)
+        return positions
+
+    assert asyncio.run(scenario()) == (1, 2, None)
+
+
+def test_max_per_user_leaves_slots_to_others():
+    async def scenario():
+        limiter = RenderLimiter(max_concurrent=3, max_queued=100, max_per_user=1)
+        release_a = asyncio.Event()
+        release_b = asyncio.Event()
+        tasks = [asyncio.create_task(_hold(limiter, release_a, user="a")) for _ in range(3)]
+        tasks.append(asyncio.create_task(_hold(limiter, release_b, user="b")))
+        await _settle()
+        # Un créneau reste libre : les autres requêtes de "a" attendent la fin de la sienne
+        blocked = limiter.in_flight, limiter.waiting
+        release_b.set()
+        await _settle()
+        still_blocked = limiter.in_flight, limiter.waiting
+        release_a.set()
+        await asyncio.gather(*tasks)
+        return blocked, still_blocked, limiter.in_flight, limiter.waiting
+
+    assert asyncio.run(scenario()) == ((2, 2), (1, 2), 0, 0)
+
+
+def test_full_lane_raises_queue_full():
+    async def scenario():
+        limiter = RenderLimiter(max_concurrent=1, max_queued=2, weights={"premium": 4, "free": 1})
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(_hold(limiter, release, user=f"u{i}")) for i in range(3)]
+        await _settle()
+        with pytest.raises(RenderQueueFull) as excinfo:
+            async with limiter.slot("free", "late"):
+                pass
+        # La file est par lane : premium accepte encore
+        premium = asyncio.create_task(_hold(limiter, release, plan="premium", user="p"))
+        await _settle()
+        stats = limiter.stats()["lanes"]
+        release.set()
+        await asyncio.gather(premium, *tasks)
+        return excinfo.value.retry_after, stats
+
+    retry_after, stats = asyncio.run(scenario())
+    assert retry_after >= 1
+    assert stats["free"]["rejected"] == 1
+    assert stats["free"]["waiting"] == 2
+    assert stats["premium"]["waiting"] == 1
+
+
+def test_queue_timeout_raises_queue_full_and_leaves_the_queue():
+    async def scenario():
+        limiter = RenderLimiter(max_concurrent=1, max_queued=10, queue_timeout=0.05)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(limiter, release))
+        await _settle()
+        with pytest.raises(RenderQueueFull):
+            async with limiter.slot("free", "late"):
+                pass
+        waiting = limiter.waiting
+        release.set()
+        await holder
+        return waiting, limiter.stats()["lanes"]["free"]["rejected"]
+
+    assert asyncio.run(scenario()) == (0, 1)
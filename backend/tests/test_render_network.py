@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import asyncio
+import threading
+
+import services.render_network as render_network_module
+from services.render_network import RenderNetwork
+
+
+class FakeRoute:
+    def __init__(self, url: str, resource_type: str = "image"):
+        self.request = type("Request", (), {"url": url, "resource_type": resource_type})()
+        self.fulfilled = None
+
+    async def fulfill(self, status, body, content_type):
+        self.fulfilled = (status, body, content_type)
+
+    async def abort(self, reason):
+        self.fulfilled = ("aborted", reason)
+
+
+def test_cached_images_are_read_off_the_loop_then_kept_in_memory(monkeypatch):
+    reads = []
+
+    def cached(url):
+        reads.append(threading.current_thread())
+        return b"\x89PNG\r\n\x1a\n", "image/png"
+
+    monkeypatch.setattr(render_network_module.image_cache, "cached", cached)
+    network = RenderNetwork(allowed_hosts=())
+
+    async def scenario():
+        routes = [FakeRoute("https://img.example/photo.png") for _ in range(2)]
+        for route in routes:
+            await network.handle(route)
+        return threading.current_thread(), routes
+
+    loop_thread, routes = asyncio.run(scenario())
+    assert [route.fulfilled for route in routes] == [(200, b"\x89PNG\r\n\x1a\n", "image/png")] * 2
+    assert len(reads) == 1 and reads[0] is not loop_thread
+    assert network.counters["local"] == 1 and network.counters["memory"] == 1
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+from sqlalchemy import null, update
+
+from database.database import get_engine
+from database.migrations import upgrade_schema
+from models.models import Resume
+import services.routes_resumes as routes_resumes
+
+JSON_PATCH = {"Content-Type": "application/json-patch+json"}
+MERGE_PATCH = {"Content-Type": "application/merge-patch+json"}
+
+
+def _bump_version(resume_id: int) -> None:
+    # Écriture d'un autre processus : la version change sous la requête en cours
+    table = Resume.__table__
+    with get_engine().begin() as conn:
+        conn.execute(update(table).where(table.c.id == resume_id).values(version=table.c.version + 1))
+
+
+def test_json_patch_route(client, auth_headers, resume):
+    response = client.patch(f"/resumes/{resume['id']}", headers={**auth_headers, **JSON_PATCH}, json=[
+        {"op": "test", "path": "/profile/name", "value": "Jean Dupont"},
+        {"op": "add", "path": "/skills/-", "value": "Go"},
+    ])
+    assert response.status_code == 200, response.text
+    assert response.json()["data"]["skills"] == ["Python", "SQL", "Go"]
+    assert response.json()["version"] == resume["version"] + 1
+
+
+def test_merge_patch_route_deletes_null_members(client, auth_headers, resume):
+    headers = {**auth_headers, **MERGE_PATCH, "Prefer": "return=minimal"}
+    response = client.patch(f"/resumes/{resume['id']}", headers=headers, json={"profile": {"title": None}})
+    assert response.status_code == 204
+    assert response.headers["X-Resume-Version"] == str(resume["version"] + 1)
+    data = client.get(f"/resumes/{resume['id']}", headers=auth_headers).json()["data"]
+    assert data["profile"] == {"name": "Jean Dupont"}
+
+
+def test_failed_test_operation_is_a_conflict(client, auth_headers, resume):
+    response = client.patch(f"/resumes/{resume['id']}", headers={**auth_headers, **JSON_PATCH}, json=[
+        {"op": "test", "path": "/skills", "value": ["Python"]},
+    ])
+    assert response.status_code == 409
+
+
+def test_stale_if_match_is_412(client, auth_headers, resume):
+    url = f"/resumes/{resume['id']}"
+    etag = client.get(url, headers=auth_headers).headers["ETag"]
+    assert client.put(url, headers={**auth_headers, "If-Match": etag}, json={"title": "v2"}).status_code == 200
+
+    for method, kwargs in (
+        ("PUT", {"json": {"title": "v3"}}),
+        ("PATCH", {"json": {"title": "v3"}, "headers": MERGE_PATCH}),
+        ("DELETE", {}),
+    ):
+        headers = {**auth_headers, **kwargs.pop("headers", {}), "If-Match": etag}
+        response = client.request(method, url, headers=headers, **kwargs)
+        assert response.status_code == 412, method
+        assert response.headers["ETag"] != etag
+    assert client.get(url, headers=auth_headers).json()["title"] == "v2"
+
+
+def test_if_none_match_is_304_until_the_resume_changes(client, auth_headers, resume):
+    url = f"/resumes/{resume['id']}"
+    etag = client.get(url, headers=auth_headers).headers["ETag"]
+    assert client.get(url, headers={**auth_headers, "If-None-Match": etag}).status_code == 304
+    client.put(url, headers=auth_headers, json={"title": "v2"})
+    assert client.get(url, headers={**auth_headers, "If-None-Match": etag}).status_code == 200
+
+
+def test_stale_version_query_is_409(client, auth_headers, resume):
+    url = f"/resumes/{resume['id']}"
+    assert client.put(f"{url}?version={resume['version']}", headers=auth_headers, json={"title": "v2"}).status_code == 200
+    response = client.put(f"{url}?version={resume['version']}", headers=auth_headers, json={"title": "v3"})
+    assert response.status_code == 409
+    assert response.json()["detail"]["version"] == resume["version"] + 1
+
+
+def test_concurrent_write_stale_data_error_is_409(client, auth_headers, resume, monkeypatch):
+    check_preconditions = routes_resumes._check_preconditions
+
+    def check_then_concurrent_write(request, row, expected):
+        check_preconditions(request, row, expected)
+        _bump_version(row.id)
+
+    monkeypatch.setattr(routes_resumes, "_check_preconditions", check_then_concurrent_write)
+    response = client.put(f"/resumes/{resume['id']}", headers=auth_headers, json={"title": "lost update"})
+    assert response.status_code == 409
+    assert response.json()["detail"]["version"] == resume["version"] + 1
+
+    monkeypatch.undo()
+    current = client.get(f"/resumes/{resume['id']}", headers=auth_headers).json()
+    assert current["title"] == "CV"
+    assert current["version"] == resume["version"] + 1
+
+
+def _clear_summary(resume_id: int) -> None:
+    # NULL SQL (et non le JSON null de `None`) : comme une ligne antérieure à la colonne
+    table = Resume.__table__
+    with get_engine().begin() as conn:
+        conn.execute(update(table).where(table.c.id == resume_id).values(summary=null()))
+
+
+def test_list_does_not_change_versions(client, auth_headers, resume):
+    _clear_summary(resume["id"])
+    items = client.get("/resumes/?fields=summary", headers=auth_headers).json()
+    assert [item["summary"]["name"] for item in items if item["id"] == resume["id"]] == ["Jean Dupont"]
+    assert client.get(f"/resumes/{resume['id']}", headers=auth_headers).json()["version"] == resume["version"]
+
+
+def test_schema_upgrade_backfills_summaries_without_new_version(client, auth_headers, resume):
+    _clear_summary(resume["id"])
+    assert any("resumes.summary" in change for change in upgrade_schema(get_engine()))
+    items = client.get("/resumes/?fields=summary", headers=auth_headers).json()
+    assert [item["summary"]["headline"] for item in items if item["id"] == resume["id"]] == ["Dev"]
+    assert client.get(f"/resumes/{resume['id']}", headers=auth_headers).json()["version"] == resume["version"]
+
+
+def test_resume_data_limits_apply_to_create_and_update(client, auth_headers, resume):
+    data = {"skills": ["x"] * 1000}
+    response = client.post("/resumes/", headers=auth_headers, json={"title": "t", "template_name": "modern", "data": data})
+    assert response.status_code == 422
+    assert client.put(f"/resumes/{resume['id']}", headers=auth_headers, json={"data": data}).status_code == 422
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+import pytest
+
+import auth.user_cache as user_cache_module
+from auth.auth import invalidate_user
+from auth.user_cache import UserCache, user_cache
+from database.database import SessionLocal
+from models.models import User
+
+
+class FakeClock:
+    """Remplace le module time de auth.user_cache : horloges avancées à la main."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(user_cache_module, "time", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = UserCache(ttl=60, max_entries=10, claims_max_age=300)
+    cache.put("a@x.io", {"id": 1})
+    clock.advance(59)
+    assert cache.get("a@x.io") == {"id": 1}
+    clock.advance(1)
+    assert cache.get("a@x.io") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_zero_ttl_disables_the_cache(clock):
+    cache = UserCache(ttl=0, max_entries=10, claims_max_age=300)
+    cache.put("a@x.io", {"id": 1})
+    assert cache.get("a@x.io") is None
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = UserCache(ttl=60, max_entries=2, claims_max_age=300)
+    cache.put("a@x.io", {"id": 1})
+    cache.put("b@x.io", {"id": 2})
+    cache.get("a@x.io")
+    cache.put("c@x.io", {"id": 3})
+    assert cache.get("b@x.io") is None
+    assert cache.get("a@x.io") == {"id": 1}
+
+
+def test_claims_usable_until_max_age(clock):
+    cache = UserCache(ttl=60, max_entries=10, claims_max_age=300)
+    issued_at = clock.now
+    assert cache.claims_usable("a@x.io", issued_at)
+    clock.advance(301)
+    assert not cache.claims_usable("a@x.io", issued_at)
+    assert not cache.claims_usable("a@x.io", None)
+    assert not UserCache(ttl=60, max_entries=10, claims_max_age=0).claims_usable("a@x.io", clock.now)
+
+
+def test_invalidate_rejects_claims_issued_before_the_change(clock):
+    cache = UserCache(ttl=60, max_entries=10, claims_max_age=300)
+    cache.put("a@x.io", {"id": 1})
+    issued_before = clock.now - 10
+    cache.invalidate("a@x.io")
+    assert cache.get("a@x.io") is None
+    assert not cache.claims_usable("a@x.io", issued_before)
+    # iat est à la seconde : un jeton émis dans la même seconde n'est pas fiable non plus
+    assert not cache.claims_usable("a@x.io", clock.now)
+    clock.advance(1)
+    assert cache.claims_usable("a@x.io", clock.now)
+    # Les autres utilisateurs ne sont pas touchés
+    assert cache.claims_usable("b@x.io", issued_before)
+
+
+def test_changes_older_than_claims_max_age_are_forgotten(clock):
+    cache = UserCache(ttl=60, max_entries=10, claims_max_age=300)
+    cache.invalidate("a@x.io")
+    clock.advance(301)
+    cache.invalidate("b@x.io")
+    assert set(cache._changed) == {"b@x.io"}
+
+
+def test_invalidate_user_forces_a_database_read(client, auth_headers):
+    def resolutions():
+        return dict(user_cache.stats()["resolutions"])
+
+    before = resolutions()
+    assert client.get("/resumes/", headers=auth_headers).status_code == 200
+    after_claims = resolutions()
+    assert after_claims["claims"] == before["claims"] + 1
+
+    invalidate_user("tests@cvtor.io")
+    assert client.get("/resumes/", headers=auth_headers).status_code == 200
+    after_invalidate = resolutions()
+    assert after_invalidate["db"] == after_claims["db"] + 1
+    assert after_invalidate["claims"] == after_claims["claims"]
+
+    # Relu en base puis gardé en cache jusqu'au prochain changement
+    assert client.get("/resumes/", headers=auth_headers).status_code == 200
+    assert resolutions()["cache"] == after_invalidate["cache"] + 1
+
+
+def _set_user_flags(**values) -> None:
+    # Modification hors de l'API (SQL, console) : invalidate_user n'est pas appelé
+    db = SessionLocal()
+    try:
+        db.query(User).filter(User.email == "tests@cvtor.io").update(values)
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_admin_routes_read_the_flags_from_the_database(client, auth_headers):
+    # Le jeton porte adm=false : une promotion est vue sans nouveau jeton...
+    _set_user_flags(is_admin=True)
+    try:
+        assert client.get("/api/admin/categories", headers=auth_headers).status_code == 200
+        # ... et une désactivation aussi, même si le jeton porte encore act=true
+        _set_user_flags(is_active=False)
+        assert client.get("/api/admin/categories", headers=auth_headers).status_code == 400
+    finally:
+        _set_user_flags(is_admin=False, is_active=True)
+    assert client.get("/api/admin/categories", headers=auth_headers).status_code == 403
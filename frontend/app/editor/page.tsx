@@ -1,6 +1,6 @@
 "use client"
 
-import React, { useEffect, useState } from 'react'
+import React, { useEffect, useRef, useState } from 'react'
 import Link from 'next/link'
 import { useRouter } from 'next/navigation'
 import { useEditorStore } from '../../store/editor'
@@ -8,7 +8,7 @@ import DndList from '../../components/editor/DndList'
 import Selectors from '../../components/editor/Selectors'
 import StylePanel from '../../components/editor/StylePanel'
 import ContentEditor from '../../components/editor/ContentEditor'
-import { exportPdf, exportDocx, generateContent, previewHtml } from '../../lib/api'
+import { exportPdf, exportDocx, generateContent, getRenderQueue, previewSections, applyPreviewSections } from '../../lib/api'
 import supabase from '../../lib/supabaseClient'
 
 export default function EditorPage() {
@@ -48,8 +48,11 @@ export default function EditorPage() {
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
   const [exporting, setExporting] = useState<'pdf'|'docx'|null>(null)
+  const [queuePosition, setQueuePosition] = useState<number | null>(null)
   const [genLoading, setGenLoading] = useState(false)
   const [previewHtmlContent, setPreviewHtmlContent] = useState<string>("")
+  const previewFrame = useRef<HTMLIFrameElement>(null)
+  const previewSession = useRef<{ session_id: string; revision: number } | undefined>(undefined)
   const [aiPrompt, setAiPrompt] = useState("")
   const [sidebarOpen, setSidebarOpen] = useState(false)
   const [mobileMenuOpen, setMobileMenuOpen] = useState(false)
@@ -66,8 +69,14 @@ export default function EditorPage() {
     async function refreshPreview() {
       if (!template || !data) return
       try {
-        const res = await previewHtml(template, data)
-        setPreviewHtmlContent(res.html)
+        let res = await previewSections(template, data, previewSession.current)
+        const doc = previewFrame.current?.contentDocument
+        if (!res.full && !(doc && applyPreviewSections(doc, res.sections))) {
+          // Aperçu désynchronisé : on redemande le document complet
+          res = await previewSections(template, data)
+        }
+        previewSession.current = { session_id: res.session_id, revision: res.revision }
+        if (res.full && res.html) setPreviewHtmlContent(res.html)
       } catch (e) { console.error("[preview] Erreur:", e) }
     }
     refreshPreview()
@@ -104,14 +113,23 @@ export default function EditorPage() {
 
   const handleExport = async (format: 'pdf' | 'docx') => {
     if (!template || !data) return
+    let poll: ReturnType<typeof setInterval> | undefined
     try {
       setExporting(format)
       const token = await getToken()
+      // Pendant l'attente, on affiche la position dans la file de rendu
+      poll = setInterval(async () => {
+        try { setQueuePosition((await getRenderQueue(token))[format].position) } catch {}
+      }, 1000)
       const res = format === 'pdf'
         ? await exportPdf(template, data, `CV_preview.pdf`, token)
         : await exportDocx(template, data, `CV_preview.docx`, token)
       if (res?.url) window.open(res.url, '_blank')
-    } finally { setExporting(null) }
+    } finally {
+      if (poll) clearInterval(poll)
+      setQueuePosition(null)
+      setExporting(null)
+    }
   }
 
 
@@ -133,7 +151,7 @@ export default function EditorPage() {
                 disabled={!template || !data || exporting!==null}
                 onClick={() => handleExport('pdf')}
               >
-                {exporting==='pdf'? '⏳' : '📄'} <span className="hidden sm:inline">Exporter PDF</span>
+                {exporting==='pdf'? '⏳' : '📄'} <span className="hidden sm:inline">{exporting==='pdf' && queuePosition ? `File d'attente : ${queuePosition}` : 'Exporter PDF'}</span>
               </button>
 
               <button
@@ -141,7 +159,7 @@ export default function EditorPage() {
                 disabled={!template || !data || exporting!==null}
                 onClick={() => handleExport('docx')}
               >
-                {exporting==='docx'? '⏳' : '📝'} <span className="hidden sm:inline">Exporter DOCX</span>
+                {exporting==='docx'? '⏳' : '📝'} <span className="hidden sm:inline">{exporting==='docx' && queuePosition ? `File d'attente : ${queuePosition}` : 'Exporter DOCX'}</span>
               </button>
             </div>
 
@@ -195,6 +213,7 @@ export default function EditorPage() {
               <div className="w-full max-w-[210mm] bg-white rounded-lg shadow-xl">
                 {previewHtmlContent ? (
                   <iframe
+                    ref={previewFrame}
                     title="Preview"
                     srcDoc={previewHtmlContent}
                     className="w-full border-0 rounded-lg"
@@ -14,6 +14,21 @@ interface PreviewResponse {
   html: string;
 }
 
+export interface PreviewSectionsResponse {
+  session_id: string;
+  revision: number;
+  full: boolean;
+  html?: string;
+  sections: any[];
+}
+
+export interface RenderQueueInfo {
+  position: number | null;
+  eta_seconds: number;
+  in_flight: number;
+  waiting: number;
+}
+
 interface ExportResponse {
   file: string;
   url?: string;
@@ -43,6 +58,55 @@ export async function previewHtml(template: Template, data: ResumeData): Promise
   return res.json();
 }
 
+// === Prévisualisation incrémentale : seules les sections modifiées reviennent ===
+export async function previewSections(
+  template: Template,
+  data: ResumeData,
+  session?: { session_id: string; revision: number }
+): Promise<PreviewSectionsResponse> {
+  const res = await fetch(`${API_BASE}/preview/sections`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({
+      template_name: template.templateName,
+      data,
+      session_id: session?.session_id,
+      revision: session?.revision
+    })
+  });
+  if (!res.ok) throw new Error(`Preview failed: ${await res.text()}`);
+  return res.json();
+}
+
+// Remplace dans le document de l'aperçu le contenu entre <!--cv-section-x--> et <!--/cv-section-x-->
+export function applyPreviewSections(doc: Document, sections: { id: string; html: string }[]): boolean {
+  for (const section of sections) {
+    const walker = doc.createTreeWalker(doc.body, NodeFilter.SHOW_COMMENT);
+    let start: Comment | null = null;
+    let end: Comment | null = null;
+    while (walker.nextNode()) {
+      const node = walker.currentNode as Comment;
+      if (node.data === section.id) start = node;
+      else if (node.data === `/${section.id}`) { end = node; break; }
+    }
+    if (!start || !end || start.parentNode !== end.parentNode) return false;
+    const range = doc.createRange();
+    range.setStartAfter(start);
+    range.setEndBefore(end);
+    range.deleteContents();
+    range.insertNode(range.createContextualFragment(section.html));
+  }
+  return true;
+}
+
+// Les exports renvoient directement le fichier : on l'expose via une URL blob
+async function toExportResponse(res: Response, fallbackName: string): Promise<ExportResponse> {
+  const disposition = res.headers.get('Content-Disposition') || '';
+  const match = disposition.match(/filename="([^"]+)"/);
+  const blob = await res.blob();
+  return { file: match ? match[1] : fallbackName, url: URL.createObjectURL(blob) };
+}
+
 // === Export PDF ===
 export async function exportPdf(template: Template, data: ResumeData, out?: string, token?: string): Promise<ExportResponse> {
   const res = await fetch(`${API_BASE}/export/pdf`, {
@@ -54,7 +118,7 @@ export async function exportPdf(template: Template, data: ResumeData, out?: stri
     body: JSON.stringify({ template_name: template.templateName, data, out })
   });
   if (!res.ok) throw new Error(`Export PDF failed: ${await res.text()}`);
-  return res.json();
+  return toExportResponse(res, out || 'CV.pdf');
 }
 
 // === Export DOCX ===
@@ -68,6 +132,15 @@ export async function exportDocx(template: Template, data: ResumeData, out?: str
     body: JSON.stringify({ template_name: template.templateName, data, out })
   });
   if (!res.ok) throw new Error(`Export DOCX failed: ${await res.text()}`);
+  return toExportResponse(res, out || 'CV.docx');
+}
+
+// === Position dans la file de rendu (affichée pendant un export) ===
+export async function getRenderQueue(token?: string): Promise<{ plan: string; pdf: RenderQueueInfo; docx: RenderQueueInfo }> {
+  const res = await fetch(`${API_BASE}/exports/queue`, {
+    headers: token ? { Authorization: `Bearer ${token}` } : {}
+  });
+  if (!res.ok) throw new Error(`Render queue failed: ${await res.text()}`);
   return res.json();
 }
 